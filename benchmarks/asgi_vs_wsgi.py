@@ -0,0 +1,97 @@
+"""
+Compare the WSGI and ASGI deployment profiles under concurrent reads.
+
+    python -m benchmarks.asgi_vs_wsgi --phone +22200000000 --password secret
+
+Starts gunicorn with deploy/gunicorn_wsgi.py and then deploy/gunicorn_asgi.py
+on a local port, and runs benchmarks.loadtest against the fund list and the
+fund transaction list at each client count: the DRF endpoints for WSGI,
+the /api/async/ ones for ASGI. The environment (DATABASE_URL, SECRET_KEY,
+...) is passed through to the servers; the user must already exist.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from benchmarks import loadtest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROFILES = {
+    "wsgi": ("deploy/gunicorn_wsgi.py", "elkiss_project.wsgi:application", "/api"),
+    "asgi": ("deploy/gunicorn_asgi.py", "elkiss_project.asgi:application", "/api/async"),
+}
+
+
+def start_server(profile, port, workers, root=ROOT, environ=None):
+    """Start the `profile` server of the checkout at `root` and wait until it answers."""
+    config, app, _ = PROFILES[profile]
+    env = dict(environ or os.environ, GUNICORN_BIND=f"127.0.0.1:{port}")
+    if workers:
+        env["WEB_CONCURRENCY"] = str(workers)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", str(ROOT / config), app],
+        cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/schema/", timeout=1)
+            return server
+        except urllib.error.HTTPError:
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"{profile} server did not start on port {port}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, help="Override WEB_CONCURRENCY for both profiles")
+    parser.add_argument("--fund", required=True, help="Fund id whose transactions are listed")
+    parser.add_argument("--phone", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'profile':<6} {'endpoint':<13} {'clients':>7} {'rps':>8} {'p50 ms':>8} {'p99 ms':>9} errors")
+    for profile, (_, _, prefix) in PROFILES.items():
+        server = start_server(profile, args.port, args.workers)
+        try:
+            base = f"http://127.0.0.1:{args.port}"
+            token = loadtest.login(base, args.phone, args.password)
+            endpoints = {
+                "funds": f"{base}{prefix}/cagnottes/",
+                "transactions": f"{base}{prefix}/transactions/cagnottes/{args.fund}/",
+            }
+            for name, url in endpoints.items():
+                for clients in args.clients:
+                    result = asyncio.run(loadtest.run(url, clients, args.duration, token))
+                    result.update(profile=profile, endpoint=name)
+                    results.append(result)
+                    print(
+                        f"{profile:<6} {name:<13} {clients:>7} {result['rps']:>8} "
+                        f"{result['p50_ms'] or '-':>8} {result['p99_ms'] or '-':>9} {result['errors'] or ''}"
+                    )
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Generate a benchmark dataset in the configured database.
+
+    python -m benchmarks.dataset --users 10000 --funds 1000 --transactions 1000000 \
+        --output dataset.json
+
+Users get the phone numbers PHONE_PREFIX + a 9-digit index and all share
+one password (hashed once). Funds are owned by random users; the first one
+is the hot fund. Transactions go to the funds with a skewed distribution,
+the hot fund taking `--hot-share` of them, and are spread over the last
+`--days` days: PostgreSQL loads them with COPY, other databases with
+batched INSERTs. Fund totals and the stats rollups are then recomputed
+from them, and the users' ledger accounts opened when BALANCE_BACKEND is
+"ledger". The same --seed gives the same owners, amounts and dates.
+
+The manifest written to --output is what benchmarks.suite reads. --reset
+first deletes the rows of a previous run (the users it created and the
+ones benchmarks.scenarios registered, and with them their funds and
+transactions).
+
+Only Django and the project are imported, so the script also runs against
+an older checkout: PYTHONPATH=<checkout> python benchmarks/dataset.py ...
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+PHONE_PREFIX = "+888"
+# Registrations are validated, so they need real numbers: Mauritanian +2223xxxxxxx
+REGISTER_PREFIX = "+2223"
+REGISTER_NAME = "Bench registration"
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "elkiss_project.settings")
+    import django
+
+    django.setup()
+
+
+def phone_number(index):
+    return f"{PHONE_PREFIX}{index:09d}"
+
+
+def chunks(count, size):
+    while count > 0:
+        yield min(size, count)
+        count -= size
+
+
+def create_users(count, password, batch_size):
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+
+    User = get_user_model()
+    hashed = make_password(password)
+    ids, created = [], 0
+    for batch in chunks(count, batch_size):
+        users = User.objects.bulk_create(
+            User(phone_number=phone_number(created + i), name=f"Bench user {created + i}",
+                 password=hashed, solde=Decimal("1000000"))
+            for i in range(batch)
+        )
+        ids += [user.pk for user in users]
+        created += batch
+    return ids
+
+
+def create_funds(count, owner_ids, rng, batch_size):
+    from django.utils import timezone
+
+    from funds.models import Fund
+
+    today = timezone.now().date()
+    ids, created = [], 0
+    for batch in chunks(count, batch_size):
+        funds = Fund.objects.bulk_create(
+            Fund(
+                owner_id=rng.choice(owner_ids),
+                name=f"Bench fund {created + i}",
+                phone_beneficiary=0,
+                # The hot fund never reaches its target, so donation floods keep it open
+                target_amount=Decimal("99999999") if created + i == 0 else Decimal(rng.randrange(1000, 100000)),
+                description="Benchmark cagnotte " * rng.randrange(1, 40),
+                deadline=today + timedelta(days=rng.randrange(30, 365)),
+            )
+            for i in range(batch)
+        )
+        ids += [fund.pk for fund in funds]
+        created += batch
+    return ids
+
+
+def transaction_rows(count, user_ids, fund_ids, hot_share, days, rng):
+    from django.utils import timezone
+
+    from transactions.models import Transaction
+
+    # The model's own default: the checkouts of older revisions have their own id format
+    generate_id = Transaction._meta.pk.get_default
+
+    # The hot fund takes hot_share of the donations, the others a Zipf-like tail
+    tail = [1 / rank for rank in range(1, len(fund_ids))]
+    weights = [hot_share * sum(tail) / (1 - hot_share) if tail else 1] + tail
+    cum_weights = list(accumulate(weights))
+    now = timezone.now()
+    span = days * 86400
+    for cagnotte_id in rng.choices(fund_ids, cum_weights=cum_weights, k=count):
+        yield (
+            generate_id(),
+            rng.choice(user_ids),
+            cagnotte_id,
+            Decimal(rng.randrange(5, 51)),
+            "",
+            now - timedelta(seconds=rng.randrange(span)),
+            Decimal(0),
+        )
+
+
+def insert_transactions(rows, count, batch_size, report):
+    from django.db import connection, transaction
+
+    from transactions.models import Transaction
+
+    names = ("id", "user", "cagnotte", "amount", "note", "created_at", "tax")
+    fields = [Transaction._meta.get_field(name) for name in names]
+    table = connection.ops.quote_name(Transaction._meta.db_table)
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    inserted = 0
+    for batch in chunks(count, batch_size):
+        chunk = [next(rows) for _ in range(batch)]
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                buffer = io.StringIO()
+                for row in chunk:
+                    buffer.write("\t".join(
+                        value.isoformat() if isinstance(value, datetime) else str(value) for value in row
+                    ) + "\n")
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", buffer)
+            else:
+                placeholders = ", ".join(["%s"] * len(fields))
+                cursor.executemany(
+                    f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+                    [
+                        [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)]
+                        for row in chunk
+                    ],
+                )
+        inserted += batch
+        report(f"Inserted {inserted}/{count} transactions...")
+
+
+def refresh_funds(fund_ids):
+    from django.conf import settings
+    from django.core.management import call_command, get_commands
+    from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum, Value
+    from django.db.models.functions import Coalesce
+
+    from funds.models import Fund
+    from transactions.models import Transaction
+
+    donations = Transaction.objects.filter(cagnotte=OuterRef("pk")).order_by().values("cagnotte")
+    Fund.objects.filter(pk__in=fund_ids).update(
+        current_amount=Coalesce(
+            Subquery(donations.annotate(total=Sum("amount")).values("total")),
+            Value(Decimal(0)),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ),
+        total_participants=Coalesce(Subquery(donations.annotate(count=Count("pk")).values("count")), Value(0)),
+    )
+    # Older checkouts have no stats rollups
+    if "rebuild_fund_stats" in get_commands():
+        call_command("rebuild_fund_stats", verbosity=0)
+    if getattr(settings, "BALANCE_BACKEND", "solde") == "ledger":
+        call_command("backfill_ledger", verbosity=0)
+
+
+def reset():
+    from django.contrib.auth import get_user_model
+    from django.db.models import Q
+
+    User = get_user_model()
+    User.objects.filter(
+        Q(phone_number__startswith=PHONE_PREFIX) | Q(phone_number__startswith=REGISTER_PREFIX, name=REGISTER_NAME)
+    ).delete()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--funds", type=int, default=1_000)
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--hot-share", type=float, default=0.1, help="Fraction of the transactions on the hot fund")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--reset", action="store_true", help="Delete the rows of a previous run first")
+    parser.add_argument("--output", default="dataset.json")
+    args = parser.parse_args(argv)
+    if not 0 <= args.hot_share < 1:
+        parser.error("--hot-share must be in [0, 1)")
+    if args.users < 1 or args.funds < 1:
+        parser.error("--users and --funds must be positive")
+
+    setup_django()
+    from django.db import connection
+
+    def report(message):
+        print(message, file=sys.stderr)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    if args.reset:
+        reset()
+        report("Deleted the previous dataset")
+    user_ids = create_users(args.users, args.password, args.batch_size)
+    report(f"Created {len(user_ids)} users")
+    fund_ids = create_funds(args.funds, user_ids, rng, args.batch_size)
+    report(f"Created {len(fund_ids)} funds")
+    rows = transaction_rows(args.transactions, user_ids, fund_ids, args.hot_share, args.days, rng)
+    insert_transactions(rows, args.transactions, args.batch_size, report)
+    refresh_funds(fund_ids)
+    report(f"Dataset ready in {time.perf_counter() - started:.1f}s")
+
+    manifest = {
+        "database": connection.vendor,
+        "seed": args.seed,
+        "password": args.password,
+        "phone_prefix": PHONE_PREFIX,
+        "register_prefix": REGISTER_PREFIX,
+        "register_name": REGISTER_NAME,
+        "users": args.users,
+        "transactions": args.transactions,
+        "hot_fund": fund_ids[0],
+        "funds": fund_ids,
+    }
+    with open(args.output, "w") as output:
+        json.dump(manifest, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Closed-loop HTTP load generator.
+
+    python -m benchmarks.loadtest http://127.0.0.1:8000/api/async/cagnottes/ \
+        --clients 200 --duration 20 --phone +22200000000 --password secret
+
+Each client keeps one HTTP/1.1 keep-alive connection open and sends its
+next GET as soon as the previous answer is read. Only the standard library
+is used, so it runs from any checkout.
+"""
+import argparse
+import asyncio
+import json
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+
+class Connection:
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, path, headers, method="GET", body=b""):
+        """Send one request and return its status and body."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        if body:
+            lines.append(f"Content-Length: {len(body)}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by server")
+        status = int(status_line.split()[1])
+        length, chunked, close = 0, False, False
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "transfer-encoding" and "chunked" in value:
+                chunked = True
+            elif name == "connection" and value == "close":
+                close = True
+        payload = b""
+        if chunked:
+            while size := int((await self.reader.readline()).split(b";")[0], 16):
+                payload += (await self.reader.readexactly(size + 2))[:-2]
+            await self.reader.readline()
+        elif length:
+            payload = await self.reader.readexactly(length)
+        if close:
+            self.close()
+        return status, payload
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def login(base_url, phone, password):
+    """Return an access token from POST /api/auth/login/."""
+    parts = urlsplit(base_url)
+    request = urllib.request.Request(
+        f"{parts.scheme}://{parts.netloc}/api/auth/login/",
+        data=json.dumps({"phone_number": phone, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())["access_token"]
+
+
+async def run(url, clients, duration, token=None, warmup=2.0):
+    """
+    Drive `url` with `clients` concurrent connections for `duration` seconds
+    after `warmup`. Returns rps, latency percentiles (ms) and error counts.
+    """
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    headers = {"Accept": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    timings, errors = [], {}
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    async def client():
+        connection = Connection(parts.hostname, parts.port or 80)
+        try:
+            while (now := time.perf_counter()) < stop_at:
+                try:
+                    status, _ = await connection.request(path, headers)
+                except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+                    status = type(exc).__name__
+                    connection.close()
+                done = time.perf_counter()
+                if now < measure_from:
+                    continue
+                if status == 200:
+                    timings.append(done - now)
+                else:
+                    errors[status] = errors.get(status, 0) + 1
+        finally:
+            connection.close()
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    timings.sort()
+
+    def percentile(fraction):
+        if not timings:
+            return None
+        return round(timings[min(len(timings) - 1, int(len(timings) * fraction))] * 1000, 2)
+
+    return {
+        "url": url,
+        "clients": clients,
+        "requests": len(timings),
+        "rps": round(len(timings) / duration, 1),
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "errors": {str(key): value for key, value in errors.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("url")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--token", help="Access token; or log in with --phone/--password")
+    parser.add_argument("--phone")
+    parser.add_argument("--password")
+    args = parser.parse_args(argv)
+
+    token = args.token
+    if token is None and args.phone:
+        token = login(args.url, args.phone, args.password)
+    result = asyncio.run(run(args.url, args.clients, args.duration, token, args.warmup))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Scripted traffic against a running server, for benchmarks.suite.
+
+Each scenario is played by `clients` concurrent keep-alive connections
+(benchmarks.loadtest.Connection). Clients that need a token log in as a
+dataset user before the measurement starts; each then sends its next
+request as soon as the previous answer is read. Requests are grouped by
+operation ("register", "donate", ...) for the latency percentiles.
+
+- auth_storm: registrations of new users and logins of dataset users.
+- browse: walk the fund list with its cursor, open fund details and the
+  fund transaction lists.
+- donate_flood: every client donates to the hot fund.
+- mixed: browsing with donations and logins sprinkled in.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.loadtest import Connection
+
+registrations = itertools.count()
+
+
+class Client:
+    def __init__(self, index):
+        self.index = index
+        self.rng = random.Random(index)
+        self.token = None
+        self.next_page = None
+
+
+class Scenario:
+    """One kind of traffic; `next_request` picks what a client sends next."""
+    authenticated = True
+
+    def __init__(self, dataset, run_id):
+        self.dataset = dataset
+        self.run_id = run_id
+
+    def user_phone(self, index):
+        return f"{self.dataset['phone_prefix']}{index % self.dataset['users']:09d}"
+
+    def credentials(self, phone):
+        return {"phone_number": phone, "password": self.dataset["password"]}
+
+    def next_request(self, client):
+        """(operation, method, path, body) of the next request of `client`."""
+        raise NotImplementedError
+
+    def handle(self, client, operation, status, payload):
+        """Look at an answer, e.g. to remember the next page."""
+
+    # Requests shared by the scenarios
+
+    def login(self, client):
+        phone = self.user_phone(client.rng.randrange(self.dataset["users"]))
+        return "login", "POST", "/api/auth/login/", self.credentials(phone)
+
+    def register(self, client):
+        # REGISTER_PREFIX + 2-digit run id + a counter shared by all the scenarios of the run
+        phone = f"{self.dataset['register_prefix']}{self.run_id:02d}{next(registrations):05d}"
+        body = dict(self.credentials(phone), confirm_password=self.dataset["password"], name=self.dataset["register_name"])
+        return "register", "POST", "/api/auth/register/", body
+
+    def donate(self, client, fund_id):
+        return "donate", "POST", "/api/donate/", {"cagnotte_id": fund_id, "amount": "5.00"}
+
+    def browse(self, client):
+        choice = client.rng.random()
+        if client.next_page and choice < 0.3:
+            return "fund_list_next", "GET", client.next_page, None
+        if choice < 0.5:
+            return "fund_list", "GET", "/api/cagnottes/", None
+        fund_id = client.rng.choice(self.dataset["funds"])
+        if choice < 0.8:
+            return "fund_detail", "GET", f"/api/cagnottes/{fund_id}/", None
+        return "fund_transactions", "GET", f"/api/transactions/cagnottes/{fund_id}/", None
+
+    def handle_browse(self, client, operation, status, payload):
+        if operation.startswith("fund_list") and status == 200:
+            next_url = json.loads(payload).get("next")
+            if next_url:
+                parts = urlsplit(next_url)
+                client.next_page = f"{parts.path}?{parts.query}"
+            else:
+                client.next_page = None
+
+
+class AuthStorm(Scenario):
+    authenticated = False
+
+    def next_request(self, client):
+        if client.rng.random() < 0.5:
+            return self.register(client)
+        return self.login(client)
+
+
+class Browse(Scenario):
+    def next_request(self, client):
+        return self.browse(client)
+
+    def handle(self, client, operation, status, payload):
+        self.handle_browse(client, operation, status, payload)
+
+
+class DonateFlood(Scenario):
+    def next_request(self, client):
+        return self.donate(client, self.dataset["hot_fund"])
+
+
+class Mixed(Scenario):
+    def next_request(self, client):
+        choice = client.rng.random()
+        if choice < 0.15:
+            fund_id = self.dataset["hot_fund"] if client.rng.random() < 0.5 else client.rng.choice(self.dataset["funds"])
+            return self.donate(client, fund_id)
+        if choice < 0.19:
+            return self.login(client)
+        if choice < 0.20:
+            return self.register(client)
+        return self.browse(client)
+
+    def handle(self, client, operation, status, payload):
+        self.handle_browse(client, operation, status, payload)
+
+
+SCENARIOS = {
+    "auth_storm": AuthStorm,
+    "browse": Browse,
+    "donate_flood": DonateFlood,
+    "mixed": Mixed,
+}
+
+
+def percentile(timings, fraction):
+    if not timings:
+        return None
+    return round(timings[min(len(timings) - 1, int(len(timings) * fraction))] * 1000, 2)
+
+
+def summarize(timings, errors, duration):
+    timings = sorted(timings)
+    return {
+        "requests": len(timings),
+        "rps": round(len(timings) / duration, 1),
+        "p50_ms": percentile(timings, 0.50),
+        "p99_ms": percentile(timings, 0.99),
+        "errors": errors,
+    }
+
+
+async def send(connection, client, method, path, body):
+    headers = {"Accept": "application/json"}
+    if client.token:
+        headers["Authorization"] = f"Bearer {client.token}"
+    data = b""
+    if body is not None:
+        headers["Content-Type"] = "application/json"
+        data = json.dumps(body).encode()
+    return await connection.request(path, headers, method, data)
+
+
+async def run(scenario, base_url, clients, duration, warmup=2.0):
+    """
+    Play `scenario` against `base_url` with `clients` connections for
+    `duration` seconds after `warmup`. Returns the overall rps, latency
+    percentiles (ms) and errors, and the same per operation.
+    """
+    parts = urlsplit(base_url)
+    states = [Client(index) for index in range(clients)]
+    connections = [Connection(parts.hostname, parts.port or 80) for _ in states]
+
+    async def log_in(client, connection):
+        status, payload = await send(
+            connection, client, "POST", "/api/auth/login/", scenario.credentials(scenario.user_phone(client.index))
+        )
+        if status != 200:
+            raise RuntimeError(f"login of benchmark user {client.index} answered {status}")
+        client.token = json.loads(payload)["access_token"]
+
+    timings, errors = {}, {}
+
+    async def play(client, connection):
+        while (now := time.perf_counter()) < stop_at:
+            operation, method, path, body = scenario.next_request(client)
+            try:
+                status, payload = await send(connection, client, method, path, body)
+            except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+                status, payload = type(exc).__name__, b""
+                connection.close()
+            done = time.perf_counter()
+            if isinstance(status, int):
+                scenario.handle(client, operation, status, payload)
+            if now < measure_from:
+                continue
+            if isinstance(status, int) and 200 <= status < 300:
+                timings.setdefault(operation, []).append(done - now)
+            else:
+                counts = errors.setdefault(operation, {})
+                counts[str(status)] = counts.get(str(status), 0) + 1
+
+    try:
+        if scenario.authenticated:
+            await asyncio.gather(*(log_in(client, connection) for client, connection in zip(states, connections)))
+        measure_from = time.perf_counter() + warmup
+        stop_at = measure_from + duration
+        await asyncio.gather(*(play(client, connection) for client, connection in zip(states, connections)))
+    finally:
+        for connection in connections:
+            connection.close()
+
+    operations = sorted(set(timings) | set(errors))
+    all_errors = {}
+    for counts in errors.values():
+        for status, count in counts.items():
+            all_errors[status] = all_errors.get(status, 0) + count
+    result = summarize([t for values in timings.values() for t in values], all_errors, duration)
+    result.update(
+        clients=clients,
+        operations={
+            operation: summarize(timings.get(operation, []), errors.get(operation, {}), duration)
+            for operation in operations
+        },
+    )
+    return result
@@ -0,0 +1,219 @@
+"""
+Run the benchmark scenarios and compare their results.
+
+    python -m benchmarks.dataset --reset --output dataset.json
+    python -m benchmarks.suite run --dataset dataset.json --url http://127.0.0.1:8000 --output head.json
+    python -m benchmarks.suite compare base.json head.json
+    python -m benchmarks.suite revisions main HEAD --output-dir bench-results
+
+`run` plays the scenarios of benchmarks.scenarios against a running server
+(or, without --url, the WSGI profile of this checkout started on a local
+port) and writes the results, tagged with this checkout's git revision,
+as JSON.
+
+`compare` flags every scenario, client count and operation whose
+throughput dropped or whose p99 rose by more than the thresholds, and
+exits with status 1 if there is one.
+
+`revisions` benchmarks two git revisions in turn: each is checked out in a
+temporary worktree, migrated into its own database (--database-url, where
+{rev} is replaced by the revision and {dir} by a scratch directory; a
+SQLite file by default; create PostgreSQL databases beforehand), seeded by
+benchmarks.dataset and served by the WSGI profile. The two results are
+then compared. The environment (SECRET_KEY, ...) and this checkout's .env
+are passed to every revision.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks import scenarios
+from benchmarks.asgi_vs_wsgi import ROOT, start_server
+
+
+def git_revision(root=ROOT):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(dataset, url, names, client_counts, duration, warmup, revision):
+    run_id = random.randrange(100)
+    report = {
+        "revision": revision,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "url": url,
+        "database": dataset["database"],
+        "dataset": {
+            "users": dataset["users"],
+            "funds": len(dataset["funds"]),
+            "transactions": dataset["transactions"],
+        },
+        "duration": duration,
+        "results": [],
+    }
+    print(f"{'scenario':<13} {'clients':>7} {'rps':>8} {'p50 ms':>8} {'p99 ms':>9} errors")
+    for name in names:
+        scenario = scenarios.SCENARIOS[name](dataset, run_id)
+        for clients in client_counts:
+            result = asyncio.run(scenarios.run(scenario, url, clients, duration, warmup))
+            result["scenario"] = name
+            report["results"].append(result)
+            print(
+                f"{name:<13} {clients:>7} {result['rps']:>8} "
+                f"{result['p50_ms'] or '-':>8} {result['p99_ms'] or '-':>9} {result['errors'] or ''}"
+            )
+    return report
+
+
+def regressions(base, head, rps_drop, p99_rise):
+    """(label, metric, base value, head value) of every regression from `base` to `head`."""
+    found = []
+
+    def check(label, before, after):
+        if before["rps"] and after["rps"] < before["rps"] * (1 - rps_drop):
+            found.append((label, "rps", before["rps"], after["rps"]))
+        if before["p99_ms"] and (after["p99_ms"] is None or after["p99_ms"] > before["p99_ms"] * (1 + p99_rise)):
+            found.append((label, "p99_ms", before["p99_ms"], after["p99_ms"]))
+
+    previous = {(result["scenario"], result["clients"]): result for result in base["results"]}
+    for result in head["results"]:
+        before = previous.get((result["scenario"], result["clients"]))
+        if before is None:
+            continue
+        label = f"{result['scenario']}@{result['clients']}"
+        check(label, before, result)
+        for operation, after in result["operations"].items():
+            if operation in before["operations"]:
+                check(f"{label} {operation}", before["operations"][operation], after)
+    return found
+
+
+def compare(base, head, rps_drop, p99_rise):
+    print(f"base {base.get('revision') or '?'} -> head {head.get('revision') or '?'}")
+    found = regressions(base, head, rps_drop, p99_rise)
+    for label, metric, before, after in found:
+        print(f"REGRESSION {label:<40} {metric:<7} {before} -> {after}")
+    if not found:
+        print(f"No regression (rps drop > {rps_drop:.0%} or p99 rise > {p99_rise:.0%}).")
+    return found
+
+
+def benchmark_revision(rev, args, port):
+    workdir = Path(tempfile.mkdtemp(prefix="elkiss-bench-"))
+    checkout = workdir / "tree"
+    subprocess.run(["git", "worktree", "add", "--detach", str(checkout), rev], cwd=ROOT, check=True)
+    try:
+        if (ROOT / ".env").exists():
+            shutil.copy(ROOT / ".env", checkout / ".env")
+        revision = git_revision(checkout)
+        env = dict(
+            os.environ,
+            DATABASE_URL=args.database_url.format(rev=revision[:12], dir=workdir),
+            PYTHONPATH=str(checkout),
+        )
+        subprocess.run([sys.executable, "manage.py", "migrate", "--noinput"], cwd=checkout, env=env, check=True)
+        manifest = workdir / "dataset.json"
+        subprocess.run(
+            [sys.executable, str(ROOT / "benchmarks" / "dataset.py"), "--reset", "--output", str(manifest)]
+            + shlex.split(args.dataset_args),
+            cwd=checkout, env=env, check=True,
+        )
+        dataset = json.loads(manifest.read_text())
+        server = start_server("wsgi", port, args.workers, root=checkout, environ=env)
+        try:
+            return run_suite(
+                dataset, f"http://127.0.0.1:{port}", args.scenarios, args.clients,
+                args.duration, args.warmup, revision,
+            )
+        finally:
+            server.terminate()
+            server.wait()
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", str(checkout)], cwd=ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_run_arguments(command):
+        command.add_argument("--scenarios", nargs="+", choices=sorted(scenarios.SCENARIOS), default=list(scenarios.SCENARIOS))
+        command.add_argument("--clients", type=int, nargs="+", default=[50])
+        command.add_argument("--duration", type=float, default=15.0)
+        command.add_argument("--warmup", type=float, default=2.0)
+        command.add_argument("--port", type=int, default=8765)
+        command.add_argument("--workers", type=int, help="Override WEB_CONCURRENCY of the started server")
+
+    def add_threshold_arguments(command):
+        command.add_argument("--rps-drop", type=float, default=0.10, help="Flag a throughput drop above this fraction")
+        command.add_argument("--p99-rise", type=float, default=0.20, help="Flag a p99 rise above this fraction")
+
+    run = commands.add_parser("run", help="Benchmark one server")
+    run.add_argument("--dataset", required=True, help="Manifest written by benchmarks.dataset")
+    run.add_argument("--url", help="Base URL of a running server; default: start this checkout's WSGI profile")
+    run.add_argument("--output", help="Write the results as JSON to this file")
+    add_run_arguments(run)
+
+    compare_command = commands.add_parser("compare", help="Flag regressions between two result files")
+    compare_command.add_argument("base")
+    compare_command.add_argument("head")
+    add_threshold_arguments(compare_command)
+
+    revisions = commands.add_parser("revisions", help="Benchmark and compare two git revisions")
+    revisions.add_argument("base")
+    revisions.add_argument("head")
+    revisions.add_argument("--database-url", default="sqlite:///{dir}/bench.sqlite3")
+    revisions.add_argument("--dataset-args", default="--users 2000 --funds 500 --transactions 100000")
+    revisions.add_argument("--output-dir", default=".")
+    add_run_arguments(revisions)
+    add_threshold_arguments(revisions)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        dataset = json.loads(Path(args.dataset).read_text())
+        server = None
+        if args.url is None:
+            server = start_server("wsgi", args.port, args.workers)
+            args.url = f"http://127.0.0.1:{args.port}"
+        try:
+            report = run_suite(
+                dataset, args.url, args.scenarios, args.clients, args.duration, args.warmup, git_revision()
+            )
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, indent=2))
+    elif args.command == "compare":
+        base = json.loads(Path(args.base).read_text())
+        head = json.loads(Path(args.head).read_text())
+        if compare(base, head, args.rps_drop, args.p99_rise):
+            sys.exit(1)
+    else:
+        reports = [benchmark_revision(rev, args, args.port) for rev in (args.base, args.head)]
+        output_dir = Path(args.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for report in reports:
+            (output_dir / f"bench-{report['revision'][:12]}.json").write_text(json.dumps(report, indent=2))
+        if compare(*reports, args.rps_drop, args.p99_rise):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
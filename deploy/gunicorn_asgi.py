@@ -0,0 +1,18 @@
+"""
+Gunicorn profile for the ASGI deployment.
+
+    gunicorn -c deploy/gunicorn_asgi.py elkiss_project.asgi:application
+
+One uvicorn event loop per core. The endpoints under /api/async/ keep
+serving other requests while they wait on the database or the cache; the
+DRF endpoints still work, each one running in a worker thread.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+timeout = 30
+keepalive = 5
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG") or None
@@ -0,0 +1,16 @@
+"""
+Gunicorn profile for the synchronous WSGI deployment.
+
+    gunicorn -c deploy/gunicorn_wsgi.py elkiss_project.wsgi:application
+
+Every worker serves one request at a time, so concurrency is bounded by
+the worker count.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "sync"
+timeout = 30
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG") or None
@@ -0,0 +1,81 @@
+import asyncio
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+
+def json_response(data, status=200):
+    # Same renderer as the DRF views, so both paths return identical bytes.
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type="application/json")
+
+
+class AsyncAPIView(View):
+    """
+    Base class of the endpoints served under /api/async/.
+
+    DRF views only run synchronously, so these are plain async Django views
+    that reuse the DRF pieces: the configured authentication classes (run
+    in a worker thread, since they may query the user; skipped when
+    authentication_required is False), a DRF Request for query parameter
+    and body parsing, and the same serializers and pagination.
+    Handlers must only touch the database through the async ORM.
+
+    Under ASGI every in-flight request holds its own database connection,
+    so at most ASYNC_DB_CONCURRENCY requests per worker process run at
+    once; the rest wait their turn instead of failing to connect.
+    """
+    http_method_names = ["get"]
+    authentication_required = True
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token authenticated like the DRF views, which are CSRF exempt too
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        parsers = [parser() for parser in api_settings.DEFAULT_PARSER_CLASSES]
+        async with _db_slots():
+            return await self.handle(Request(request, parsers=parsers), *args, **kwargs)
+
+    async def handle(self, request, *args, **kwargs):
+        try:
+            if self.authentication_required:
+                user = await self.authenticate(request)
+                if user is None or not user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                request.user = user
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            response = json_response({"detail": exc.detail}, status=exc.status_code)
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                response.status_code = 401
+                response["WWW-Authenticate"] = 'Bearer realm="api"'
+            return response
+        except Http404:
+            return json_response({"detail": "Not found."}, status=404)
+
+    async def authenticate(self, request):
+        for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            result = await sync_to_async(authentication_class().authenticate)(request)
+            if result is not None:
+                return result[0]
+        return None
+
+
+_slots = weakref.WeakKeyDictionary()
+
+
+def _db_slots():
+    # One semaphore per event loop: a semaphore is bound to the loop it is first used on.
+    loop = asyncio.get_running_loop()
+    if loop not in _slots:
+        _slots[loop] = asyncio.Semaphore(getattr(settings, "ASYNC_DB_CONCURRENCY", 20))
+    return _slots[loop]
@@ -0,0 +1,50 @@
+def parse_expand(request):
+    """Names passed in ?expand=a,b as a set (empty without a request)."""
+    if request is None:
+        return set()
+    raw = request.query_params.get("expand", "")
+    return {name.strip() for name in raw.split(",") if name.strip()}
+
+
+class ExpandableFieldsMixin:
+    """
+    ModelSerializer mixin inlining related objects on demand (?expand=owner).
+
+    `expandable_fields` maps a relation name to the serializer used when the
+    client expands it; otherwise the raw primary key is returned as before.
+    Views call `setup_queryset()` so the expanded relations are fetched with
+    select_related()/only() in the same query as the page.
+    """
+    expandable_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expand = parse_expand(self.context.get("request"))
+        for name, serializer_class in self.expandable_fields.items():
+            if name in expand:
+                fields[name] = serializer_class(read_only=True)
+        return fields
+
+    @classmethod
+    def setup_queryset(cls, queryset, request):
+        related, loaded = cls.loaded_fields(parse_expand(request))
+        if not related:
+            return queryset
+        return queryset.select_related(*related).only(*loaded)
+
+    @classmethod
+    def loaded_fields(cls, expand, prefix=""):
+        """select_related() paths and only() fields needed for `expand`."""
+        related = []
+        loaded = [prefix + field.name for field in cls.Meta.model._meta.concrete_fields]
+        for name, serializer_class in cls.expandable_fields.items():
+            if name not in expand:
+                continue
+            related.append(prefix + name)
+            if issubclass(serializer_class, ExpandableFieldsMixin):
+                nested_related, nested_loaded = serializer_class.loaded_fields(expand, f"{prefix}{name}__")
+                related.extend(nested_related)
+                loaded.extend(nested_loaded)
+            else:
+                loaded.extend(f"{prefix}{name}__{field}" for field in serializer_class.Meta.fields)
+        return related, loaded
@@ -0,0 +1,305 @@
+"""
+Per-request performance metrics.
+
+MetricsMiddleware times every request and aggregates, per endpoint (URL
+route and method), histograms of the wall time and the response size and
+a count of the responses by status. A fraction METRICS_SAMPLE_RATE of the
+requests is measured in detail: the number and duration of their queries,
+the time spent decoding the JWT (users.authentication), in DRF serializers
+(validation and representation, their queries excluded) and rendering the
+response, and the rest ("app": view code, middleware). Sampled responses
+carry these phases in a Server-Timing header.
+
+Queries are timed by an execute wrapper installed on every connection. It
+only reads a ContextVar when the request is not sampled; the ContextVar
+also reaches the threads sync_to_async runs queries in, so async views
+are measured too. Serializers opt in with TimedSerializerMixin.
+
+The counters live in the worker process, like funds.cache.stats: each
+worker serves its own /metrics in the Prometheus text format, to staff
+users or to scrapers sending METRICS_TOKEN.
+"""
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from funds.cache import stats as fund_cache_stats
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+QUERY_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+PHASES = ("auth", "db", "serialize", "render", "app")
+
+current_sample = ContextVar("metrics_sample", default=None)
+
+
+class Sample:
+    """Detailed measurements of one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.serializing = False
+
+    def add(self, phase, seconds):
+        self.durations[phase] += seconds
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Histograms and counters of this process, keyed by metric name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, labels, value, buckets):
+        with self._lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, labels, value=1):
+        with self._lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self):
+        with self._lock:
+            histograms = {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in self.histograms.items()}
+            counters = dict(self.counters)
+        lines = []
+        for name in sorted({name for name, _ in histograms}):
+            lines += [f"# HELP {name} {HELP[name]}", f"# TYPE {name} histogram"]
+            for (_, labels), (buckets, counts, total, count) in sorted(
+                (key, value) for key, value in histograms.items() if key[0] == name
+            ):
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {total}")
+                lines.append(f"{name}_count{format_labels(labels)} {count}")
+        for name in sorted({name for name, _ in counters}):
+            lines += [f"# HELP {name} {HELP[name]}", f"# TYPE {name} counter"]
+            for (_, labels), value in sorted((key, value) for key, value in counters.items() if key[0] == name):
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+HELP = {
+    "elkiss_http_request_duration_seconds": "Wall time of the requests.",
+    "elkiss_http_response_size_bytes": "Size of the response bodies (streamed responses excluded).",
+    "elkiss_http_responses_total": "Responses by status code.",
+    "elkiss_http_phase_duration_seconds": "Time of sampled requests spent in each phase.",
+    "elkiss_http_queries": "Database queries made by sampled requests.",
+    "elkiss_fund_cache_requests_total": "Lookups of the fund payload cache by outcome.",
+}
+
+registry = Registry()
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def sample_rate():
+    return getattr(settings, "METRICS_SAMPLE_RATE", 0.01)
+
+
+@contextmanager
+def phase(name):
+    """Attribute the enclosed time of a sampled request to `name`."""
+    sample = current_sample.get()
+    if sample is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        sample.add(name, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    sample = current_sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.add("db", time.perf_counter() - started)
+
+
+def install_query_wrapper(sender=None, connection=None, **kwargs):
+    # Outermost, so connection.execute_wrapper() blocks still pop their own wrapper
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+connection_created.connect(install_query_wrapper)
+
+
+def timed_serializer_call(method, *args, **kwargs):
+    """Call `method`, timed as the "serialize" phase of sampled requests."""
+    sample = current_sample.get()
+    # Nested serializers and the items of many=True ones are already within
+    # the outer call
+    if sample is None or sample.serializing:
+        return method(*args, **kwargs)
+    sample.serializing = True
+    started, db = time.perf_counter(), sample.durations["db"]
+    try:
+        return method(*args, **kwargs)
+    finally:
+        sample.serializing = False
+        # Queries of validators and related fields stay in "db"
+        sample.add("serialize", time.perf_counter() - started - (sample.durations["db"] - db))
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin timing validation and representation as "serialize".
+
+    Put it first in the bases. With many=True each item is timed, as the
+    ListSerializer delegates to the child's methods.
+    """
+
+    def run_validation(self, *args, **kwargs):
+        return timed_serializer_call(super().run_validation, *args, **kwargs)
+
+    def to_representation(self, *args, **kwargs):
+        return timed_serializer_call(super().to_representation, *args, **kwargs)
+
+
+class MetricsMiddleware:
+    """Records the metrics of every request; put it first in MIDDLEWARE."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Connections opened before the middleware was loaded
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection=connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sample = current_sample.get()
+            current_sample.reset(token)
+        return self.finish(request, response, started, sample)
+
+    async def __acall__(self, request):
+        started, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            sample = current_sample.get()
+            current_sample.reset(token)
+        return self.finish(request, response, started, sample)
+
+    def start(self):
+        sample = Sample() if random.random() < sample_rate() else None
+        return time.perf_counter(), current_sample.set(sample)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns
+        sample = current_sample.get()
+        if sample is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                sample.add("render", time.perf_counter() - started)
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, started, sample):
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        labels = (("route", match.route if match else "unmatched"), ("method", request.method))
+        registry.observe("elkiss_http_request_duration_seconds", labels, elapsed, DURATION_BUCKETS)
+        registry.increment("elkiss_http_responses_total", labels + (("status", response.status_code),))
+        if not response.streaming:
+            registry.observe("elkiss_http_response_size_bytes", labels, len(response.content), SIZE_BUCKETS)
+        if sample is not None:
+            durations = sample.durations
+            durations["app"] = max(0.0, elapsed - sum(durations[name] for name in PHASES if name != "app"))
+            for name, seconds in durations.items():
+                registry.observe(
+                    "elkiss_http_phase_duration_seconds", labels + (("phase", name),), seconds, DURATION_BUCKETS
+                )
+            registry.observe("elkiss_http_queries", labels, sample.queries, QUERY_BUCKETS)
+            response["Server-Timing"] = ", ".join(
+                [f"{name};dur={seconds * 1000:.2f}" for name, seconds in durations.items()]
+                + [f'total;dur={elapsed * 1000:.2f};desc="{sample.queries} queries"']
+            )
+        return response
+
+
+def metrics_view(request):
+    """
+    GET /metrics -> Prometheus text format (this worker only).
+
+    Served to staff sessions and to `Authorization: Bearer <METRICS_TOKEN>`;
+    without a METRICS_TOKEN only staff can read it.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    user = getattr(request, "user", None)
+    scraper = bool(token) and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}")
+    if not (scraper or (user is not None and user.is_staff)):
+        return HttpResponse(status=401 if token else 403)
+    cache = fund_cache_stats.as_dict()
+    name = "elkiss_fund_cache_requests_total"
+    lines = [
+        f"# HELP {name} {HELP[name]}",
+        f"# TYPE {name} counter",
+        f'{name}{{outcome="hit"}} {cache["hits"]}',
+        f'{name}{{outcome="miss"}} {cache["misses"]}',
+    ]
+    body = registry.render() + "\n".join(lines) + "\n"
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,172 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def flip_ordering(ordering):
+    return tuple(field[1:] if field.startswith("-") else f"-{field}" for field in ordering)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor (keyset) pagination over a unique ordering such as
+    ("-created_at", "-id").
+
+    The cursor holds the ordering values of the last row served, and the
+    next page is fetched with `WHERE (created_at, id) < (...) LIMIT n`. That
+    is a range scan on the matching composite index, so a deep page costs
+    the same as the first one. Views can override the ordering with a
+    `keyset_ordering` attribute; the last field must be unique.
+    """
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    ordering = ("-created_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, fetching through the async ORM."""
+        queryset = self.page_queryset(queryset, request, view)
+        return self.set_page([row async for row in queryset])
+
+    def page_queryset(self, queryset, request, view=None):
+        """The queryset of the requested page, with one extra row to detect more."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(getattr(view, "keyset_ordering", self.ordering))
+
+        cursor = self.decode_cursor(request)
+        self.has_cursor = cursor is not None
+        self.reverse = bool(cursor and cursor.get("r"))
+        ordering = flip_ordering(self.ordering) if self.reverse else self.ordering
+
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            try:
+                queryset = queryset.filter(self.keyset_filter(ordering, cursor["v"]))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.has_cursor
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def keyset_filter(self, ordering, values):
+        fields = [field.lstrip("-") for field in ordering]
+        lookups = ["lt" if field.startswith("-") else "gt" for field in ordering]
+        if len(values) != len(fields):
+            raise ValueError("cursor does not match ordering")
+
+        # (a, b) < (x, y)  <=>  a < x OR (a = x AND b < y)
+        condition = Q()
+        for index, (field, lookup, value) in enumerate(zip(fields, lookups, values)):
+            equal = dict(zip(fields[:index], values[:index]))
+            condition |= Q(**equal, **{f"{field}__{lookup}": value})
+
+        # Redundant bound on the leading column so it is used as the index range start.
+        bound = "lte" if lookups[0] == "lt" else "gte"
+        return Q(**{f"{fields[0]}__{bound}": values[0]}) & condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            if not isinstance(cursor.get("v"), list):
+                raise ValueError("cursor without values")
+        except (AttributeError, UnicodeEncodeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, row, reverse=False):
+        values = [str(getattr(row, field.lstrip("-"))) for field in self.ordering]
+        payload = {"v": values, "r": 1} if reverse else {"v": values}
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode())
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded.decode("ascii"))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # Walked back past the first row: the next page starts from the top.
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Renderer of row exports. stream() turns a header and an iterator of
+    rows into text chunks for a StreamingHttpResponse, holding one chunk of
+    rows in memory at a time. render() only serves error responses.
+    """
+    charset = "utf-8"
+    rows_per_chunk = 500
+
+    def stream(self, header, rows):
+        # The header goes out before the first row is fetched.
+        yield self.encode_rows(header, [])
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == self.rows_per_chunk:
+                yield self.encode_rows(header, chunk, with_header=False)
+                chunk = []
+        if chunk:
+            yield self.encode_rows(header, chunk, with_header=False)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if not isinstance(data, dict):
+            data = {"detail": data}
+        return self.encode_rows(list(data), [list(data.values())]).encode(self.charset)
+
+    def encode_rows(self, header, rows, with_header=True):
+        raise NotImplementedError
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def encode_rows(self, header, rows, with_header=True):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if with_header:
+            writer.writerow(header)
+        writer.writerows(rows)
+        return buffer.getvalue()
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """Newline-delimited JSON: one object per row, no header line."""
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def encode_rows(self, header, rows, with_header=True):
+        return "".join(json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + "\n" for row in rows)
@@ -14,6 +14,7 @@ from datetime import timedelta
 from pathlib import Path
 import os
 import environ
+from django.core.exceptions import ImproperlyConfigured
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -34,12 +35,7 @@ SECRET_KEY = env('SECRET_KEY')
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = env('DEBUG')
 
-print(f"Raw ALLOWED_HOSTS from .env: '{env('ALLOWED_HOSTS')}'")
-print(f"Type: {type(env('ALLOWED_HOSTS'))}")
-
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS')
-print(f"ALLOWED_HOSTS after env.list(): {ALLOWED_HOSTS}")
-print(f"Length: {len(ALLOWED_HOSTS)}")
 
 # Application definition
 
@@ -60,9 +56,13 @@ INSTALLED_APPS = [
     'users',
     'funds',
     'transactions',
+    'idempotency',
+    'ledger',
+    'outbox',
 ]
 
 MIDDLEWARE = [
+    "elkiss_project.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -109,6 +109,83 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Local memory by default; point CACHE_URL at a shared backend
+# (e.g. redis://... or pymemcache://...) when running several workers.
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    # Token revocations (users.authentication.revoke_user_tokens) must reach
+    # every worker: a system check refuses a local-memory cache here. Without
+    # AUTH_REVOCATION_CACHE_URL they go to the CACHE_URL cache, or when that is
+    # unset to a table that migrate creates. Requests never read it: each
+    # worker copies the list of recent revocations from it once a second.
+    'revocation': env.cache(
+        'AUTH_REVOCATION_CACHE_URL',
+        default=env.str('CACHE_URL', default='dbcache://auth_revocation_cache'),
+    ),
+}
+AUTH_REVOCATION_CACHE_ALIAS = 'revocation'
+AUTH_REVOCATION_POLL_SECONDS = env.float('AUTH_REVOCATION_POLL_SECONDS', default=1)
+
+# Seconds a serialized cagnotte payload or list page is kept (0 disables)
+FUND_CACHE_ALIAS = 'default'
+FUND_CACHE_TIMEOUT = env.int('FUND_CACHE_TIMEOUT', default=60)
+
+# Where user balances live: "solde" (the CustomUser.solde column) or "ledger"
+# (append-only ledger.LedgerEntry rows). Run backfill_ledger before switching.
+BALANCE_BACKEND = env.str('BALANCE_BACKEND', default='solde')
+
+# Hours a stored Idempotency-Key response is replayed (purge_idempotency_keys removes older ones)
+IDEMPOTENCY_KEY_TTL_HOURS = env.int('IDEMPOTENCY_KEY_TTL_HOURS', default=24)
+
+# Where relay_outbox delivers outbox events: file:PATH (newline-delimited
+# JSON), an http(s):// URL receiving JSON arrays, or "queue" (in-process).
+OUTBOX_SINK = env.str('OUTBOX_SINK', default='file:' + os.path.join(BASE_DIR, 'outbox.ndjson'))
+
+# Fraction of the requests MetricsMiddleware measures in detail (queries,
+# phases, Server-Timing header); every request is still timed and counted.
+METRICS_SAMPLE_RATE = env.float('METRICS_SAMPLE_RATE', default=0.01)
+# Bearer token scrapers send to /metrics. Empty: only staff sessions can read it.
+METRICS_TOKEN = env.str('METRICS_TOKEN', default='')
+
+# Half-life of a donation in the trending ranking: a donation counts twice as
+# much as one made this many hours earlier. Run rebuild_fund_stats after a change.
+TRENDING_HALF_LIFE_HOURS = env.float('TRENDING_HALF_LIFE_HOURS', default=24)
+
+# Requests served concurrently by the /api/async/ views of one ASGI worker.
+# Each holds a database connection: keep workers * this below max_connections.
+ASYNC_DB_CONCURRENCY = env.int('ASYNC_DB_CONCURRENCY', default=20)
+
+
+# Password hashing (see users/hashers.py): "pbkdf2", "scrypt" or "argon2".
+# Existing hashes of another policy or cost are rewritten at their next login.
+PASSWORD_HASH_POLICY = env.str('PASSWORD_HASH_POLICY', default='pbkdf2')
+PASSWORD_HASH_POLICIES = {
+    'pbkdf2': 'users.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'users.hashers.ScryptPasswordHasher',
+    'argon2': 'users.hashers.Argon2PasswordHasher',
+}
+if PASSWORD_HASH_POLICY not in PASSWORD_HASH_POLICIES:
+    raise ImproperlyConfigured(f"Unknown PASSWORD_HASH_POLICY {PASSWORD_HASH_POLICY!r}")
+# The policy's hasher makes new hashes; the others only verify existing ones.
+PASSWORD_HASHERS = [PASSWORD_HASH_POLICIES[PASSWORD_HASH_POLICY]] + [
+    hasher for policy, hasher in PASSWORD_HASH_POLICIES.items() if policy != PASSWORD_HASH_POLICY
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+PASSWORD_PBKDF2_ITERATIONS = env.int('PASSWORD_PBKDF2_ITERATIONS', default=720000)
+PASSWORD_SCRYPT_WORK_FACTOR = env.int('PASSWORD_SCRYPT_WORK_FACTOR', default=2 ** 14)
+PASSWORD_ARGON2_TIME_COST = env.int('PASSWORD_ARGON2_TIME_COST', default=2)
+PASSWORD_ARGON2_MEMORY_COST = env.int('PASSWORD_ARGON2_MEMORY_COST', default=19456)  # KiB
+PASSWORD_ARGON2_PARALLELISM = env.int('PASSWORD_ARGON2_PARALLELISM', default=1)
+# Threads per process hashing passwords for the async login and register endpoints
+PASSWORD_HASH_THREADS = env.int('PASSWORD_HASH_THREADS', default=os.cpu_count() or 1)
+
+
+# Country whose numbers may be given without their prefix; phone numbers are stored in E.164
+PHONE_DEFAULT_REGION = env.str('PHONE_DEFAULT_REGION', default='MR')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -150,14 +227,24 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Authenticate from the access token claims instead of loading the user row
+# on every request (see users/authentication.py). Access tokens then live
+# JWT_ACCESS_TOKEN_MINUTES, which bounds how long a stale claim can be used.
+JWT_STATELESS_AUTH = env.bool('JWT_STATELESS_AUTH', default=True)
+JWT_ACCESS_TOKEN_MINUTES = env.int('JWT_ACCESS_TOKEN_MINUTES', default=15 if JWT_STATELESS_AUTH else 24 * 60)
+
 REST_FRAMEWORK = {
     # 'DEFAULT_PERMISSION_CLASSES': [
     #     'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly',
     # ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication'
+        if JWT_STATELESS_AUTH
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'elkiss_project.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
 }
 
 SPECTACULAR_SETTINGS = {
@@ -171,11 +258,12 @@ AUTH_USER_MODEL = "users.CustomUser"
 
 
 SIMPLE_JWT = {
-    "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=JWT_ACCESS_TOKEN_MINUTES),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "ROTATE_REFRESH_TOKENS": True,  # Generate a new refresh token on every refresh
     "BLACKLIST_AFTER_ROTATION": True,  # Blacklist old refresh tokens
     "AUTH_HEADER_TYPES": ("Bearer",),  # Use 'Bearer <token>' in headers
+    "TOKEN_USER_CLASS": "users.authentication.ClaimsUser",
 }
 
 # Static files configuration
@@ -0,0 +1,94 @@
+import re
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+UPDATE_RE = re.compile(r'^UPDATE\s+[`"]?(\w+)[`"]?\s+SET\s+(.*?)\s+WHERE\s', re.IGNORECASE | re.DOTALL)
+SET_COLUMN_RE = re.compile(r'(?:^|,\s*)[`"]?(\w+)[`"]?\s*=')
+
+
+def full_row_updates(queries):
+    """
+    UPDATE statements among captured `queries` that write every column of
+    a model's table: the SQL of Model.save() without update_fields.
+    """
+    columns = {
+        model._meta.db_table: {field.column for field in model._meta.concrete_fields if not field.primary_key}
+        for model in apps.get_models()
+    }
+    offending = []
+    for query in queries:
+        match = UPDATE_RE.match(query["sql"])
+        if not match or match.group(1) not in columns:
+            continue
+        table_columns = columns[match.group(1)]
+        written = set(SET_COLUMN_RE.findall(match.group(2)))
+        if len(table_columns) > 1 and table_columns <= written:
+            offending.append(query["sql"])
+    return offending
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin that fails when an endpoint issues more queries than it
+    declares, e.g. because a serializer started lazily loading a relation
+    for every row of the page (N+1).
+
+    Call assertQueryBudget() with page sizes of 1 and N: a list endpoint is
+    within budget only if both pages fit the same constant number.
+    """
+
+    def assertQueryBudget(self, budget, url, items=None, client=None):
+        client = client or self.client
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.content[:200])
+
+        if items is not None:
+            results = response.data["results"] if "results" in response.data else response.data
+            self.assertEqual(len(results), items, f"{url} returned an unexpected number of items")
+
+        if len(captured) > budget:
+            queries = "\n".join(f"{i}. {query['sql']}" for i, query in enumerate(captured, start=1))
+            self.fail(
+                f"{url} ran {len(captured)} queries for a page of {items} item(s), "
+                f"budget is {budget}:\n{queries}"
+            )
+        return response
+
+
+class NarrowWritesMixin:
+    """
+    TestCase mixin that fails when code writes whole rows: on PostgreSQL a
+    full-row UPDATE rewrites every column (large TEXT included) into the
+    WAL. Wrap hot paths in assertNoFullRowUpdates().
+    """
+
+    @contextmanager
+    def assertNoFullRowUpdates(self):
+        with CaptureQueriesContext(connection) as captured:
+            yield captured
+        offending = full_row_updates(captured)
+        if offending:
+            self.fail("Full-row UPDATE issued, pass update_fields or use queryset.update():\n" + "\n".join(offending))
+
+
+def make_fund(owner, **kwargs):
+    """An open cagnotte of `owner` closing in 30 days; `kwargs` override the fields."""
+    from funds.models import Fund
+
+    defaults = {
+        "name": "Birthday",
+        "phone_beneficiary": 22222222,
+        "target_amount": Decimal("1000.00"),
+        "description": "A cagnotte",
+        "deadline": timezone.now().date() + timedelta(days=30),
+        "status": "open",
+    }
+    defaults.update(kwargs)
+    return Fund.objects.create(owner=owner, **defaults)
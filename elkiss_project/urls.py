@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.urls import path,include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
+from .metrics import metrics_view
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -9,6 +11,14 @@ urlpatterns = [
     path("api/", include("funds.urls")),
     path("api/transactions/", include("transactions.urls")),
 
+    # Async (ASGI) variants of the read endpoints, login and register
+    path("api/async/", include("funds.async_urls")),
+    path("api/async/transactions/", include("transactions.async_urls")),
+    path("api/async/auth/", include("users.async_urls")),
+
+    # Prometheus scrape endpoint (per worker)
+    path("metrics", metrics_view, name="metrics"),
+
     # API schema and documentation
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
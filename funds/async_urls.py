@@ -0,0 +1,7 @@
+from django.urls import path
+from .async_views import AsyncFundDetailView, AsyncFundListView
+
+urlpatterns = [
+    path("cagnottes/", AsyncFundListView.as_view(), name="async-cagnotte-list"),
+    path("cagnottes/<str:pk>/", AsyncFundDetailView.as_view(), name="async-cagnotte-detail"),
+]
@@ -0,0 +1,47 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404
+
+from elkiss_project.async_api import AsyncAPIView, json_response
+from elkiss_project.pagination import KeysetPagination
+from . import cache as fund_cache
+from .counters import current_totals
+from .models import Fund
+from .serializers import FundSerializer
+from .views import fund_detail_payloads, fund_list_queryset
+
+
+class AsyncFundListView(AsyncAPIView):
+    """
+    GET /api/async/cagnottes -> same payload as GET /api/cagnottes, on the async path
+    """
+
+    async def get(self, request):
+        async def build():
+            paginator = KeysetPagination()
+            page = await paginator.apaginate_queryset(fund_list_queryset(request), request, self)
+            data = FundSerializer(page, many=True, context={"request": request}).data
+            return paginator.get_paginated_data(data)
+
+        return json_response(await fund_cache.acached_list_payload(
+            fund_cache.list_keys(request), build, sync_to_async(fund_detail_payloads)
+        ))
+
+
+class AsyncFundDetailView(AsyncAPIView):
+    """
+    GET /api/async/cagnottes/{id} -> same payload as GET /api/cagnottes/{id}, on the async path
+    """
+
+    async def get(self, request, pk):
+        async def build():
+            queryset = FundSerializer.setup_queryset(Fund.objects.all(), request)
+            try:
+                cagnotte = await queryset.aget(pk=pk)
+            except Fund.DoesNotExist:
+                raise Http404
+            # Add the pending sharded counters; fold_fund_counters writes them back
+            if cagnotte.shard_count:
+                cagnotte.current_amount, cagnotte.total_participants = await sync_to_async(current_totals)(pk)
+            return FundSerializer(cagnotte, context={"request": request}).data
+
+        return json_response(await fund_cache.acached_payload(fund_cache.detail_keys(pk, request), build))
@@ -0,0 +1,261 @@
+"""
+Read-through cache for serialized cagnotte detail payloads and list pages.
+
+Each payload is stored with the version token it was built under: one per
+cagnotte for its detail payloads, one shared by every list page. A write
+replaces the token, again once it has committed, which retires the
+payloads built before with a single set(). A reader reads the token before the
+database, so a payload it built from rows older than the write carries
+the old token and is never served, even if it is stored after the
+invalidation ran.
+
+Donations retire the detail payloads of their cagnotte only. A list page
+served from the cache has the totals of each of its rows (TOTAL_FIELDS)
+filled in from the current plain detail payload of that cagnotte, built
+for the rows that have none, so it never shows an amount older than the
+last donation (a page just built only needs it for its sharded rows,
+whose pending counters the list query leaves out). Its order is kept
+until the page expires. Changes to which cagnottes a list holds or how they read
+(create, edit, close, delete) retire every list page.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from elkiss_project.expand import parse_expand
+
+LIST_VERSION_KEY = "funds:list-version"
+# Fields of a list row that donations change
+TOTAL_FIELDS = ("current_amount", "total_participants", "status", "updated_at")
+
+
+class CacheStats:
+    """Hit/miss counters of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    return caches[getattr(settings, "FUND_CACHE_ALIAS", "default")]
+
+
+def cache_timeout():
+    return getattr(settings, "FUND_CACHE_TIMEOUT", 60)
+
+
+def detail_keys(fund_id, request):
+    """(payload key, version key) of a cagnotte detail payload."""
+    variant = "owner" if "owner" in parse_expand(request) else "plain"
+    return f"funds:detail:{fund_id}:{variant}", _detail_version_key(fund_id)
+
+
+def _detail_version_key(fund_id):
+    return f"funds:version:{fund_id}"
+
+
+def list_keys(request):
+    """(payload key, version key) of a list page."""
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f"funds:list:{url}", LIST_VERSION_KEY
+
+
+def _fresh_version(cache, version_key, version):
+    if version is None:
+        cache.add(version_key, time.time_ns(), timeout=None)
+        version = cache.get(version_key)
+    return version
+
+
+async def _afresh_version(cache, version_key, version):
+    if version is None:
+        await cache.aadd(version_key, time.time_ns(), timeout=None)
+        version = await cache.aget(version_key)
+    return version
+
+
+def _cached(keys, build):
+    """(payload, whether it came from the cache) for cached_payload()."""
+    key, version_key = keys
+    cache = get_cache()
+    entries = cache.get_many([key, version_key])
+    version = _fresh_version(cache, version_key, entries.get(version_key))
+    cached = entries.get(key)
+    hit = cached is not None and cached[0] == version
+    stats.record(hit=hit)
+    if hit:
+        return cached[1], True
+    payload = build()
+    cache.set(key, (version, payload), cache_timeout())
+    return payload, False
+
+
+async def _acached(keys, build):
+    key, version_key = keys
+    cache = get_cache()
+    entries = await cache.aget_many([key, version_key])
+    version = await _afresh_version(cache, version_key, entries.get(version_key))
+    cached = entries.get(key)
+    hit = cached is not None and cached[0] == version
+    stats.record(hit=hit)
+    if hit:
+        return cached[1], True
+    payload = await build()
+    await cache.aset(key, (version, payload), cache_timeout())
+    return payload, False
+
+
+def cached_payload(keys, build):
+    """
+    Return the payload cached under `keys` (payload key, version key) if it
+    was built under the current version token, else build and store it.
+    """
+    if not cache_timeout():
+        return build()
+    return _cached(keys, build)[0]
+
+
+async def acached_payload(keys, build):
+    """cached_payload() for async views; `build` is a coroutine function."""
+    if not cache_timeout():
+        return await build()
+    return (await _acached(keys, build))[0]
+
+
+def _rows(page):
+    return page["results"] if isinstance(page, dict) else page
+
+
+def _to_fill(page, hit):
+    """
+    Ids of the rows of `page` whose totals come from the detail payloads:
+    all of them on a cached page, those with pending sharded counters on a
+    page just built.
+    """
+    return [row["id"] for row in _rows(page) if hit or row.get("shard_count")]
+
+
+def _current_details(fund_ids, entries):
+    """
+    Current detail payloads found in `entries`, and the version of the
+    others (None if it has to be created), by fund id.
+    """
+    details, missing = {}, {}
+    for fund_id in fund_ids:
+        key, version_key = detail_keys(fund_id, None)
+        version, cached = entries.get(version_key), entries.get(key)
+        if version is not None and cached is not None and cached[0] == version:
+            details[fund_id] = cached[1]
+        else:
+            missing[fund_id] = version
+    return details, missing
+
+
+def _detail_entries(built, versions):
+    return {detail_keys(fund_id, None)[0]: (versions[fund_id], payload) for fund_id, payload in built.items()}
+
+
+def _with_totals(page, details):
+    rows = [
+        {**row, **{field: details[row["id"]][field] for field in TOTAL_FIELDS}} if row["id"] in details else row
+        for row in _rows(page)
+    ]
+    return {**page, "results": rows} if isinstance(page, dict) else rows
+
+
+def cached_list_payload(keys, build, build_details):
+    """
+    cached_payload() of a list page, with the totals of its rows taken from
+    their detail payloads. `build_details(fund_ids)` returns the plain
+    detail payloads of the given cagnottes by id.
+    """
+    if not cache_timeout():
+        return build()
+    page, hit = _cached(keys, build)
+    fund_ids = _to_fill(page, hit)
+    if not fund_ids:
+        return page
+    cache = get_cache()
+    details, missing = _current_details(
+        fund_ids, cache.get_many([key for fund_id in fund_ids for key in detail_keys(fund_id, None)])
+    )
+    if missing:
+        # Versions read before the rows, as in cached_payload()
+        versions = {
+            fund_id: _fresh_version(cache, detail_keys(fund_id, None)[1], version)
+            for fund_id, version in missing.items()
+        }
+        built = build_details(list(missing))
+        cache.set_many(_detail_entries(built, versions), cache_timeout())
+        details.update(built)
+    return _with_totals(page, details)
+
+
+async def acached_list_payload(keys, build, build_details):
+    """cached_list_payload() for async views; both builders are coroutine functions."""
+    if not cache_timeout():
+        return await build()
+    page, hit = await _acached(keys, build)
+    fund_ids = _to_fill(page, hit)
+    if not fund_ids:
+        return page
+    cache = get_cache()
+    details, missing = _current_details(
+        fund_ids, await cache.aget_many([key for fund_id in fund_ids for key in detail_keys(fund_id, None)])
+    )
+    if missing:
+        versions = {
+            fund_id: await _afresh_version(cache, detail_keys(fund_id, None)[1], version)
+            for fund_id, version in missing.items()
+        }
+        built = await build_details(list(missing))
+        await cache.aset_many(_detail_entries(built, versions), cache_timeout())
+        details.update(built)
+    return _with_totals(page, details)
+
+
+def _invalidate(fund_ids, lists):
+    # Fresh tokens rather than incr(): an evicted counter could restart at an old value.
+    version = time.time_ns()
+    versions = {_detail_version_key(fund_id): version for fund_id in fund_ids}
+    if lists:
+        versions[LIST_VERSION_KEY] = version
+    get_cache().set_many(versions, timeout=None)
+
+
+def invalidate_funds(*fund_ids, lists=False):
+    """
+    Retire the cached payloads of the given funds, and every cached list
+    page with `lists`: at once, and again once the current transaction
+    commits for the payloads built from the rows it had not written yet.
+    """
+    _invalidate(fund_ids, lists)
+    transaction.on_commit(lambda: _invalidate(fund_ids, lists))
@@ -0,0 +1,246 @@
+"""
+Sharded donation counters of hot cagnottes (Fund.shard_count > 0, off by
+default).
+
+A sharded donation adds to a random FundCounterShard slot instead of
+UPDATEing the Fund row, and takes a FOR SHARE lock on that row instead of
+the exclusive one: donors do not wait on each other, but a close (any
+UPDATE of the row) waits for the donations in flight, and a donation
+arriving after it sees the cagnotte closed. Their rollups (funds.stats)
+are queued as FundPendingDonation rows rather than updated in place.
+
+fold_fund_counters moves the slots back into the Fund row and the queued
+donations into the rollups, and should run periodically; it waits for
+the donations in flight like a close does. Reads add the pending slots
+without writing; the stats, leaderboards and trending scores of a sharded
+cagnotte trail by one fold.
+
+Once the folded and pending totals reach the target, new donations are
+refused, and the donation that crossed it closes the cagnotte, at the
+latest right after it commits.
+
+Each process remembers which cagnottes lock_open_fund() last found
+sharded, so that donate() takes the sharded path for them without first
+trying the UPDATE of an unsharded cagnotte. The hint is only a shortcut:
+both paths check shard_count again in the statement they run.
+"""
+import random
+
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import stats
+from .cache import invalidate_funds
+from .models import Fund, FundCounterShard, FundStatus
+
+# Cagnottes this process last found sharded
+_sharded = set()
+
+
+def known_sharded(fund_id):
+    """Whether lock_open_fund() last found the cagnotte sharded in this process."""
+    return fund_id in _sharded
+
+
+def _remember(fund_id, shard_count):
+    if shard_count:
+        _sharded.add(fund_id)
+    else:
+        _sharded.discard(fund_id)
+    return shard_count
+
+
+def set_shard_count(fund_id, shards):
+    """
+    Enable sharded counters on a cagnotte with `shards` slots (0 disables).
+
+    Slots are created up front so donations only ever UPDATE them. Slots
+    above the new count are kept: they stop receiving donations but are
+    still drained by every fold.
+    """
+    with transaction.atomic():
+        Fund.objects.filter(pk=fund_id).update(shard_count=shards)
+        FundCounterShard.objects.bulk_create(
+            [FundCounterShard(fund_id=fund_id, shard=slot) for slot in range(shards)],
+            ignore_conflicts=True,
+        )
+    _remember(fund_id, shards)
+    if not shards:
+        fold_counter_shards(fund_id)
+
+
+def lock_open_fund(fund_id, today):
+    """
+    shard_count of the cagnotte if it is open and its folded and pending
+    totals have not reached the target yet, or None. On PostgreSQL the row
+    stays FOR SHARE locked until the donation commits, so that a close
+    cannot commit between this check and the donation.
+
+    Donations that run concurrently do not see each other's slots until
+    they commit, so those in flight when the target is crossed are all
+    accepted, as the donation crossing it is on an unsharded cagnotte; any
+    donation starting after they committed is refused.
+    """
+    if connection.vendor == "postgresql":
+        table = connection.ops.quote_name(Fund._meta.db_table)
+        slots = connection.ops.quote_name(FundCounterShard._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT fund.shard_count FROM {table} fund
+                WHERE fund.id = %s AND fund.status = %s AND fund.deadline >= %s
+                AND fund.current_amount
+                    + COALESCE((SELECT SUM(slot.amount) FROM {slots} slot WHERE slot.fund_id = fund.id), 0)
+                    < fund.target_amount
+                FOR SHARE OF fund
+                """,
+                [fund_id, FundStatus.OPEN, today],
+            )
+            row = cursor.fetchone()
+        return _remember(fund_id, row[0] if row else None)
+    # SQLite serializes writers: no close can commit during the donation
+    return _remember(fund_id, (
+        Fund.objects.filter(pk=fund_id, status=FundStatus.OPEN, deadline__gte=today)
+        .annotate(pending=pending_amount_subquery())
+        .filter(target_amount__gt=F("current_amount") + F("pending"))
+        .values_list("shard_count", flat=True)
+        .first()
+    ))
+
+
+def add_donation(fund_id, shard_count, amount):
+    """
+    Record a donation on a random slot and close the cagnotte if the
+    target has been reached; returns whether it has. Must run inside the
+    donation transaction, after lock_open_fund().
+    """
+    slot = random.randrange(shard_count)
+    updated = FundCounterShard.objects.filter(fund_id=fund_id, shard=slot).update(
+        amount=F("amount") + amount,
+        participants=F("participants") + 1,
+    )
+    if not updated:
+        FundCounterShard.objects.create(fund_id=fund_id, shard=slot, amount=amount, participants=1)
+
+    # Folded and pending totals are read in one statement so a concurrent
+    # fold cannot make the same amount be counted twice.
+    fund = (
+        Fund.objects.filter(pk=fund_id)
+        .annotate(pending=pending_amount_subquery())
+        .values("current_amount", "target_amount", "pending")
+        .get()
+    )
+    reached = fund["current_amount"] + fund["pending"] >= fund["target_amount"]
+    if reached:
+        _close_reached(fund_id)
+    return reached
+
+
+def _close_reached(fund_id):
+    if connection.vendor != "postgresql":
+        Fund.objects.filter(pk=fund_id, status=FundStatus.OPEN).update(status=FundStatus.CLOSED)
+        return
+    # Other donations in flight hold FOR SHARE locks on the row: waiting for
+    # them here could deadlock with one of them closing too. The row is
+    # skipped instead, and closed once this donation has committed and
+    # holds no lock, after the donations in flight.
+    table = connection.ops.quote_name(Fund._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} SET status = %s
+            WHERE id IN (SELECT id FROM {table} WHERE id = %s AND status = %s FOR UPDATE SKIP LOCKED)
+            """,
+            [FundStatus.CLOSED, fund_id, FundStatus.OPEN],
+        )
+        closed = cursor.rowcount
+    if not closed:
+        transaction.on_commit(
+            lambda: Fund.objects.filter(pk=fund_id, status=FundStatus.OPEN).update(status=FundStatus.CLOSED)
+        )
+
+
+def _pending_sum(field, output_field):
+    return Coalesce(
+        Subquery(
+            FundCounterShard.objects.filter(fund=OuterRef("pk"))
+            .values("fund")
+            .annotate(total=Sum(field))
+            .values("total")
+        ),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def pending_amount_subquery():
+    """Sum of the not yet folded slot amounts of the outer Fund."""
+    return _pending_sum("amount", DecimalField(max_digits=10, decimal_places=2))
+
+
+def current_totals(fund_id):
+    """
+    (current_amount, total_participants) of a sharded cagnotte including
+    the slots not folded yet, read in one statement so that a concurrent
+    fold is counted exactly once. Writes nothing.
+    """
+    return (
+        Fund.objects.filter(pk=fund_id)
+        .annotate(pending=pending_amount_subquery(), pending_participants=_pending_sum("participants", IntegerField()))
+        .values_list(F("current_amount") + F("pending"), F("total_participants") + F("pending_participants"))
+        .get()
+    )
+
+
+def fold_counter_shards(fund_id):
+    """
+    Move the slot totals of a cagnotte into Fund.current_amount and
+    total_participants, closing it if the target has been reached, and
+    add its queued donations to the rollups. Returns the folded amount.
+
+    The Fund row is locked before the slots, in the order donations take
+    them (FOR SHARE on the row, then a slot): the fold waits for the
+    donations in flight to commit and holds off new ones until it does,
+    so no slot it reads can change under it.
+    """
+    with transaction.atomic():
+        fund = (
+            Fund.objects.select_for_update(no_key=True)
+            .filter(pk=fund_id)
+            .values("status", "current_amount", "target_amount")
+            .first()
+        )
+        if not fund:
+            return 0
+        stats.record_pending_donations(fund_id)
+        slots = list(
+            FundCounterShard.objects.filter(fund_id=fund_id)
+            .exclude(participants=0)
+            .values_list("pk", "amount", "participants")
+        )
+        if not slots:
+            return 0
+
+        amount = sum(slot_amount for _, slot_amount, _ in slots)
+        participants = sum(count for _, _, count in slots)
+        FundCounterShard.objects.filter(pk__in=[pk for pk, _, _ in slots]).update(
+            amount=0, participants=0
+        )
+        Fund.objects.filter(pk=fund_id).update(
+            current_amount=F("current_amount") + amount,
+            total_participants=F("total_participants") + participants,
+            status=Case(
+                When(
+                    status=FundStatus.OPEN,
+                    current_amount__gte=F("target_amount") - amount,
+                    then=Value(FundStatus.CLOSED),
+                ),
+                default=F("status"),
+            ),
+            updated_at=timezone.now().date(),
+        )
+        closes = fund["status"] == FundStatus.OPEN and fund["current_amount"] + amount >= fund["target_amount"]
+        invalidate_funds(fund_id, lists=closes)
+        return amount
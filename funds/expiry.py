@@ -0,0 +1,64 @@
+"""
+Closing of cagnottes whose deadline has passed.
+
+A cagnotte stays open up to and including its deadline day. Expired ones
+are found through the partial fund_open_deadline_idx index and closed in
+batches, each a single UPDATE in its own short transaction. On PostgreSQL
+the batch is picked with FOR UPDATE SKIP LOCKED, so several workers can
+run at once: each closes different rows, and none waits on a row that a
+donation or another worker holds.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import invalidate_funds
+from .models import Fund, FundStatus
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def close_expired_batch(today=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Close up to `batch_size` expired open cagnottes; returns their ids."""
+    today = today or timezone.now().date()
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            table = connection.ops.quote_name(Fund._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {table} SET status = %s, updated_at = %s
+                    WHERE id IN (
+                        SELECT id FROM {table}
+                        WHERE status = %s AND deadline < %s
+                        ORDER BY deadline
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id
+                    """,
+                    [FundStatus.CLOSED, today, FundStatus.OPEN, today, batch_size],
+                )
+                closed = [row[0] for row in cursor.fetchall()]
+        else:
+            closed = list(
+                Fund.objects.select_for_update(skip_locked=True)
+                .filter(status=FundStatus.OPEN, deadline__lt=today)
+                .order_by("deadline")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            Fund.objects.filter(pk__in=closed).update(status=FundStatus.CLOSED, updated_at=today)
+        if closed:
+            invalidate_funds(*closed, lists=True)
+    return closed
+
+
+def close_expired_funds(today=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Close every expired open cagnotte; returns (closed, batches)."""
+    closed = batches = 0
+    while True:
+        ids = close_expired_batch(today, batch_size)
+        if ids:
+            closed += len(ids)
+            batches += 1
+        if len(ids) < batch_size:
+            return closed, batches
@@ -0,0 +1,76 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from funds.models import Fund
+from funds.views import DonateAPIView, DonateBatchAPIView
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the per-donation cost of POST /api/donate/ with POST /api/donate/batch/ "
+        "for growing batch sizes. Creates and removes its own rows; run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50, 100])
+        parser.add_argument("--donations", type=int, default=1000, help="Donations per measurement")
+        parser.add_argument("--funds", type=int, default=20)
+
+    def handle(self, *args, **options):
+        prefix = f"+bench{int(time.time()) % 100000:05d}"
+        self.donor = User.objects.create(phone_number=f"{prefix}0001", solde=Decimal("99999999"))
+        owner = User.objects.create(phone_number=f"{prefix}0000")
+        deadline = timezone.now().date() + timedelta(days=1)
+        self.fund_ids = [
+            fund.pk for fund in Fund.objects.bulk_create(
+                Fund(
+                    owner=owner,
+                    name=f"Batch benchmark {i}",
+                    phone_beneficiary=0,
+                    target_amount=Decimal("99999999"),
+                    description="",
+                    deadline=deadline,
+                )
+                for i in range(options["funds"])
+            )
+        ]
+        self.factory = APIRequestFactory()
+        try:
+            total = options["donations"]
+            self.stdout.write(f"{'mode':<12} {'batch':>6} {'ms/donation':>12} {'donations/s':>12}")
+            elapsed = self.measure(self.single, 1, total)
+            self.stdout.write(f"{'single':<12} {1:>6} {elapsed * 1000 / total:>12.3f} {total / elapsed:>12.1f}")
+            for size in options["sizes"]:
+                elapsed = self.measure(self.batch, size, total)
+                self.stdout.write(f"{'batch':<12} {size:>6} {elapsed * 1000 / total:>12.3f} {total / elapsed:>12.1f}")
+        finally:
+            User.objects.filter(pk__in=[self.donor.pk, owner.pk]).delete()
+
+    def item(self, index):
+        return {"cagnotte_id": self.fund_ids[index % len(self.fund_ids)], "amount": "5", "note": "bench"}
+
+    def single(self, offset, size):
+        return DonateAPIView.as_view(), "/api/donate/", self.item(offset)
+
+    def batch(self, offset, size):
+        items = [self.item(offset + i) for i in range(size)]
+        return DonateBatchAPIView.as_view(), "/api/donate/batch/", {"items": items}
+
+    def measure(self, build, size, total):
+        started = time.perf_counter()
+        for offset in range(0, total, size):
+            view, path, data = build(offset, size)
+            request = self.factory.post(path, data, format="json")
+            force_authenticate(request, user=self.donor)
+            response = view(request)
+            if response.status_code != 201:
+                raise CommandError(f"{path} answered {response.status_code}: {response.data}")
+        return time.perf_counter() - started
@@ -0,0 +1,80 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from funds import cache as fund_cache
+from funds.models import Fund
+from funds.views import FundListCreateAPIView, FundRetrieveUpdateDestroyAPIView
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare p50/p99 latency of cached and uncached cagnotte detail and list reads. "
+        "Creates and removes its own rows; run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--funds", type=int, default=500)
+        parser.add_argument("--requests", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        owner = User.objects.create(phone_number=f"+bench{int(time.time()) % 100000:05d}")
+        deadline = timezone.now().date() + timedelta(days=30)
+        funds = Fund.objects.bulk_create(
+            Fund(
+                owner=owner,
+                name=f"Fund {i}",
+                phone_beneficiary=0,
+                target_amount=Decimal("1000"),
+                description="Benchmark cagnotte " * 20,
+                deadline=deadline,
+            )
+            for i in range(options["funds"])
+        )
+        self.factory = APIRequestFactory()
+        self.owner = owner
+        # Reads hit a small set of popular funds, like a campaign landing page.
+        self.hot_ids = [fund.pk for fund in random.sample(funds, min(20, len(funds)))]
+        try:
+            self.stdout.write(f"{'endpoint':<8} {'mode':<9} {'p50 ms':>8} {'p99 ms':>8}")
+            for name, run in (("detail", self.detail), ("list", self.listing)):
+                for mode, timeout in (("uncached", 0), ("cached", 60)):
+                    fund_cache.get_cache().clear()
+                    with override_settings(FUND_CACHE_TIMEOUT=timeout):
+                        p50, p99 = self.measure(run, options["requests"])
+                    self.stdout.write(f"{name:<8} {mode:<9} {p50:>8.3f} {p99:>8.3f}")
+            self.stdout.write(f"cache counters: {fund_cache.stats.as_dict()}")
+        finally:
+            owner.delete()
+
+    def detail(self):
+        fund_id = random.choice(self.hot_ids)
+        request = self.factory.get(f"/api/cagnottes/{fund_id}/")
+        force_authenticate(request, user=self.owner)
+        return FundRetrieveUpdateDestroyAPIView.as_view()(request, pk=fund_id)
+
+    def listing(self):
+        request = self.factory.get("/api/cagnottes/", {"page_size": 20})
+        force_authenticate(request, user=self.owner)
+        return FundListCreateAPIView.as_view()(request)
+
+    def measure(self, run, count):
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            response = run()
+            response.render()
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"benchmark request answered {response.status_code}")
+        timings.sort()
+        return timings[len(timings) // 2], timings[int(len(timings) * 0.99) - 1]
@@ -0,0 +1,99 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from funds.models import Fund, FundStatus
+from funds.search import ORDERING, search_funds, trigram_enabled
+
+User = get_user_model()
+
+WORDS = [
+    "mariage", "naissance", "aide", "medicale", "operation", "ecole", "mosquee", "puits", "football", "club",
+    "voyage", "hajj", "omra", "maison", "incendie", "inondation", "orphelins", "ramadan", "iftar", "cadeau",
+    "retraite", "diplome", "bourse", "etudiant", "hopital", "dialyse", "cancer", "chirurgie", "famille", "village",
+    "nouakchott", "nouadhibou", "kiffa", "atar", "rosso", "zouerate", "kaedi", "aleg", "tidjikja", "selibaby",
+    "quartier", "association", "cooperative", "femmes", "jeunes", "sport", "musique", "festival", "livres", "ordinateurs",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark /api/cagnottes/search/ queries on a large table: a rare word, a common word, two "
+        "words and a misspelt name, against substring matching. Creates and removes its own rows; "
+        "PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--funds", type=int, default=1_000_000)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This benchmark needs PostgreSQL.")
+        prefix = f"+bench{int(time.time()) % 100000:05d}"
+        owner = User.objects.create(phone_number=f"{prefix}0000")
+        try:
+            self.populate(owner, options["funds"])
+            self.stdout.write(f"trigram matching: {'on' if trigram_enabled(connection.alias) else 'off (no pg_trgm)'}")
+            self.stdout.write(f"{'query':<24} {'matches':>8} {'search ms':>10} {'page 2 ms':>10} {'icontains ms':>13}")
+            queries = [
+                "selibaby ordinateurs",  # two rare words
+                "hajj",  # about 2% of the funds
+                "mariage nouakchott",
+                "chirurgi",  # misspelt: only trigram similarity finds it
+            ]
+            for query in queries:
+                self.report(owner, query, options["page_size"], options["repeat"])
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {Fund._meta.db_table} WHERE owner_id = %s", [owner.pk])
+            owner.delete()
+
+    def populate(self, owner, count):
+        started = time.perf_counter()
+        words = len(WORDS)
+        with connection.cursor() as cursor:
+            # Name: two words; description: four more. The trigger fills search_vector.
+            cursor.execute(
+                f"""
+                INSERT INTO {Fund._meta.db_table} (id, name, owner_id, phone_beneficiary, target_amount,
+                    current_amount, total_participants, description, deadline, status, created_at,
+                    updated_at, shard_count)
+                SELECT 's' || lpad(i::text, 9, '0'),
+                    initcap(w[1 + i %% {words}]) || ' ' || w[1 + (i / {words}) %% {words}], %s, 0, 1000, 0, 0,
+                    'Collecte pour ' || w[1 + (i * 7) %% {words}] || ' et ' || w[1 + (i * 13) %% {words}]
+                        || ', ' || w[1 + (i * 31) %% {words}] || ' ' || w[1 + (i * 37) %% {words}],
+                    current_date + 30, %s, current_date - (i %% 1500), current_date, 0
+                FROM generate_series(1, %s) AS i, (SELECT %s::text[] AS w) AS vocabulary
+                """,
+                [owner.pk, FundStatus.OPEN, count, WORDS],
+            )
+            cursor.execute(f"ANALYZE {Fund._meta.db_table}")
+        self.stdout.write(f"Inserted {count} funds in {time.perf_counter() - started:.1f} s")
+
+    def report(self, owner, query, page_size, repeat):
+        queryset = search_funds(Fund.objects.filter(owner=owner), query).order_by(*ORDERING)
+        matches = queryset.count()
+        page = list(queryset[:page_size])
+        search_ms = self.time(queryset[:page_size], repeat)
+        page_2_ms = None
+        if len(page) == page_size:
+            last = page[-1]
+            after = queryset.filter(Q(rank__lt=last.rank) | Q(rank=last.rank, id__lt=last.id))
+            page_2_ms = self.time(after[:page_size], repeat)
+        substring = Fund.objects.filter(
+            Q(owner=owner) & (Q(name__icontains=query) | Q(description__icontains=query))
+        ).order_by("-created_at", "-id")
+        substring_ms = self.time(substring[:page_size], max(1, repeat // 10))
+        page_2 = f"{page_2_ms:>10.1f}" if page_2_ms is not None else f"{'-':>10}"
+        self.stdout.write(f"{query:<24} {matches:>8} {search_ms:>10.1f} {page_2} {substring_ms:>13.1f}")
+
+    def time(self, queryset, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.values_list("id", flat=True))
+        return (time.perf_counter() - started) * 1000 / repeat
@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from funds.counters import fold_counter_shards, set_shard_count
+from funds.models import Fund
+from funds.services import donate
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark donation throughput on a single hot cagnotte for several "
+        "counter shard counts. Creates and removes its own rows; run it "
+        "against a scratch database (PostgreSQL for meaningful numbers)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shards", type=int, nargs="+", default=[1, 8, 32])
+        parser.add_argument("--donations", type=int, default=2000)
+        parser.add_argument("--workers", type=int, default=32)
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        prefix = f"+bench{int(time.time()) % 100000:05d}"
+        owner = User.objects.create(phone_number=f"{prefix}0000")
+        donors = User.objects.bulk_create(
+            User(phone_number=f"{prefix}{i + 1:04d}", solde=Decimal("1000000"))
+            for i in range(workers * 4)
+        )
+        try:
+            self.stdout.write(f"{'shards':>8} {'donations':>10} {'seconds':>9} {'donations/s':>12}")
+            for shards in options["shards"]:
+                elapsed = self.run(owner, donors, shards, options["donations"], workers)
+                rate = options["donations"] / elapsed
+                self.stdout.write(f"{shards:>8} {options['donations']:>10} {elapsed:>9.2f} {rate:>12.1f}")
+        finally:
+            User.objects.filter(pk__in=[owner.pk] + [donor.pk for donor in donors]).delete()
+
+    def run(self, owner, donors, shards, donations, workers):
+        fund = Fund.objects.create(
+            owner=owner,
+            name="Hot fund benchmark",
+            phone_beneficiary=0,
+            target_amount=Decimal("99999999"),
+            description="",
+            deadline=timezone.now().date() + timedelta(days=1),
+        )
+        set_shard_count(fund.pk, shards)
+
+        def worker(index):
+            try:
+                donate(donors[index % len(donors)], fund.pk, Decimal("5"))
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(worker, range(donations)))
+        elapsed = time.perf_counter() - started
+
+        fold_counter_shards(fund.pk)
+        fund.refresh_from_db()
+        if fund.total_participants != donations:
+            self.stderr.write(f"shards={shards}: expected {donations} donations, counted {fund.total_participants}")
+        return elapsed
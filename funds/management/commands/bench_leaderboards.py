@@ -0,0 +1,113 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from funds.models import Fund, FundDonor, FundStatus
+from funds.services import donate
+from funds.stats import rebuild_stats
+from transactions.models import Transaction
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the trending and top donors reads served from the maintained FundStats / FundDonor "
+        "rows with aggregating the transaction log, and time donations. Creates and removes its own "
+        "rows; run it against a scratch database (PostgreSQL for meaningful numbers)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--funds", type=int, default=1000)
+        parser.add_argument("--donors", type=int, default=500)
+        parser.add_argument("--transactions", type=int, default=200_000)
+        parser.add_argument("--donations", type=int, default=500, help="Timed donations through donate()")
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        prefix = f"+bench{int(time.time()) % 100000:05d}"
+        owner = User.objects.create(phone_number=f"{prefix}0000")
+        donors = User.objects.bulk_create(
+            User(phone_number=f"{prefix}{i + 1:04d}", solde=Decimal("99999999")) for i in range(options["donors"])
+        )
+        funds = Fund.objects.bulk_create(
+            Fund(
+                owner=owner,
+                name=f"Leaderboard benchmark {i}",
+                phone_beneficiary=0,
+                target_amount=Decimal("99999999"),
+                description="",
+                deadline=timezone.now().date() + timedelta(days=1),
+            )
+            for i in range(options["funds"])
+        )
+        try:
+            self.populate(donors, funds, options["transactions"])
+            self.reads(funds, options["repeat"])
+            self.donations(donors, funds, options["donations"])
+        finally:
+            Transaction.objects.filter(cagnotte__owner=owner).delete()
+            User.objects.filter(pk__in=[owner.pk] + [donor.pk for donor in donors]).delete()
+
+    def populate(self, donors, funds, count):
+        # Popularity follows a power law, timestamps cover the last 30 days
+        rng = random.Random(42)
+        now = timezone.now()
+        weights = [1 / (rank + 1) for rank in range(len(funds))]
+        for start in range(0, count, 10_000):
+            chosen = rng.choices(funds, weights, k=min(10_000, count - start))
+            created = Transaction.objects.bulk_create(
+                Transaction(user=rng.choice(donors), cagnotte=fund, amount=Decimal(rng.randint(5, 500)))
+                for fund in chosen
+            )
+            for donation in created:
+                donation.created_at = now - timedelta(seconds=rng.uniform(0, 30 * 86400))
+            Transaction.objects.bulk_update(created, ["created_at"], batch_size=2000)
+        started = time.perf_counter()
+        fund_ids = [fund.pk for fund in funds]
+        for index in range(0, len(fund_ids), 500):
+            rebuild_stats(fund_ids[index:index + 500])
+        self.stdout.write(
+            f"{count} transactions; rebuild_stats of {len(funds)} funds: {time.perf_counter() - started:.1f} s"
+        )
+
+    def reads(self, funds, repeat):
+        hottest = funds[0].pk
+        day_ago = timezone.now() - timedelta(days=1)
+        reads = {
+            "trending, log aggregate": lambda: list(
+                Transaction.objects.filter(created_at__gte=day_ago, cagnotte__status=FundStatus.OPEN)
+                .values("cagnotte_id").annotate(donations=Count("id")).order_by("-donations")[:10]
+            ),
+            # The query of FundTrendingAPIView
+            "trending, maintained": lambda: list(
+                Fund.objects.filter(status=FundStatus.OPEN, stats__trending_score__isnull=False)
+                .order_by("-stats__trending_score").values_list("pk", flat=True)[:10]
+            ),
+            "top donors, log aggregate": lambda: list(
+                Transaction.objects.filter(cagnotte_id=hottest)
+                .values("user_id").annotate(total=Sum("amount")).order_by("-total")[:10]
+            ),
+            "top donors, maintained": lambda: list(
+                FundDonor.objects.filter(fund_id=hottest).order_by("-total_amount").values_list("user_id", flat=True)[:10]
+            ),
+        }
+        self.stdout.write(f"{'read (top 10)':<28} {'ms':>8}")
+        for name, read in reads.items():
+            started = time.perf_counter()
+            for _ in range(repeat):
+                read()
+            self.stdout.write(f"{name:<28} {(time.perf_counter() - started) * 1000 / repeat:>8.2f}")
+
+    def donations(self, donors, funds, count):
+        started = time.perf_counter()
+        for index in range(count):
+            donate(donors[index % len(donors)], funds[index % 50].pk, Decimal("5"))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"donate(): {elapsed * 1000 / count:.2f} ms per donation over {count}")
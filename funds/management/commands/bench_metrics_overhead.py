@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from elkiss_project import metrics
+from funds.models import Fund
+
+User = get_user_model()
+
+MIDDLEWARE = "elkiss_project.metrics.MetricsMiddleware"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the cost of MetricsMiddleware on the uncached cagnotte detail "
+        "read: without the middleware, then at several METRICS_SAMPLE_RATE values. "
+        "Creates and removes its own rows; run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rates", type=float, nargs="+", default=[0, 0.01, 1])
+        parser.add_argument("--requests", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        owner = User.objects.create(phone_number=f"+bench{int(time.time()) % 100000:05d}")
+        fund = Fund.objects.create(
+            owner=owner,
+            name="Metrics benchmark",
+            phone_beneficiary=0,
+            target_amount=Decimal("1000"),
+            deadline=timezone.now().date() + timedelta(days=30),
+        )
+        self.url = reverse("cagnotte-detail", args=[fund.pk])
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(owner)}"}
+        without = [name for name in settings.MIDDLEWARE if name != MIDDLEWARE]
+        runs = [("off", without, 0)] + [(str(rate), [MIDDLEWARE] + without, rate) for rate in options["rates"]]
+        try:
+            self.stdout.write(f"{'sample rate':<12} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8}")
+            for name, middleware, rate in runs:
+                # The test client builds its handler, and so the middleware chain, when created
+                with override_settings(MIDDLEWARE=middleware, METRICS_SAMPLE_RATE=rate, FUND_CACHE_TIMEOUT=0):
+                    p50, p99, mean = self.measure(Client(), options["requests"])
+                self.stdout.write(f"{name:<12} {p50:>8.3f} {p99:>8.3f} {mean:>8.3f}")
+        finally:
+            metrics.registry.reset()
+            owner.delete()
+
+    def measure(self, client, count):
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.get(self.url, **self.auth)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"benchmark request answered {response.status_code}")
+        timings.sort()
+        return timings[len(timings) // 2], timings[int(len(timings) * 0.99) - 1], sum(timings) / len(timings)
@@ -0,0 +1,99 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from funds.models import Fund, FundStatus
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the cagnotte listing filtered by status on a large table, with and without the "
+        "partial index on open funds. Creates and removes its own rows; PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--funds", type=int, default=1_000_000)
+        parser.add_argument("--open-ratio", type=float, default=0.1)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This benchmark needs PostgreSQL.")
+        prefix = f"+bench{int(time.time()) % 100000:05d}"
+        owner = User.objects.create(phone_number=f"{prefix}0000")
+        try:
+            self.populate(owner, options["funds"], options["open_ratio"])
+            self.stdout.write(f"{'filter':<8} {'index':<24} {'first page ms':>14} {'deep page ms':>13}")
+            for status in (FundStatus.OPEN, FundStatus.CLOSED, None):
+                self.report(status, options["page_size"], options["repeat"])
+            # The open listing again, once each index is the only candidate
+            for dropped in ("fund_status_created_idx", "fund_open_created_idx"):
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"DROP INDEX {dropped}")
+                    self.report(FundStatus.OPEN, options["page_size"], options["repeat"])
+                    transaction.set_rollback(True)
+            self.index_sizes()
+        finally:
+            # Plain DELETE: the benchmark rows have nothing to cascade to.
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {Fund._meta.db_table} WHERE owner_id = %s", [owner.pk])
+            owner.delete()
+
+    def populate(self, owner, count, open_ratio):
+        started = time.perf_counter()
+        every = max(1, round(1 / open_ratio)) if open_ratio else count + 1
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {Fund._meta.db_table} (id, name, owner_id, phone_beneficiary, target_amount,
+                    current_amount, total_participants, description, deadline, status, created_at,
+                    updated_at, shard_count)
+                SELECT 'b' || lpad(i::text, 9, '0'), 'Benchmark', %s, 0, 1000, 0, 0, '',
+                    current_date + 30, CASE WHEN i %% %s = 0 THEN %s ELSE %s END,
+                    current_date - (i %% 1500), current_date, 0
+                FROM generate_series(1, %s) AS i
+                """,
+                [owner.pk, every, FundStatus.OPEN, FundStatus.CLOSED, count],
+            )
+            cursor.execute(f"ANALYZE {Fund._meta.db_table}")
+        self.stdout.write(f"Inserted {count} funds in {time.perf_counter() - started:.1f} s")
+
+    def report(self, status, page_size, repeat):
+        queryset = Fund.objects.order_by("-created_at", "-id")
+        if status:
+            queryset = queryset.filter(status=status)
+        # A deep page: the keyset cursor of the row in the middle of the listing
+        middle = queryset.values_list("created_at", "id")[queryset.count() // 2]
+        deep = queryset.filter(created_at__lte=middle[0]).exclude(created_at=middle[0], id__gte=middle[1])
+        first_ms = self.time(queryset[:page_size], repeat)
+        deep_ms = self.time(deep[:page_size], repeat)
+        self.stdout.write(f"{status or 'all':<8} {self.index_used(queryset[:page_size]):<24} {first_ms:>14.3f} {deep_ms:>13.3f}")
+
+    def index_sizes(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexrelname, pg_size_pretty(pg_relation_size(indexrelid)) FROM pg_stat_user_indexes "
+                "WHERE relname = %s ORDER BY 1",
+                [Fund._meta.db_table],
+            )
+            for name, size in cursor.fetchall():
+                self.stdout.write(f"{name:<32} {size:>10}")
+
+    def time(self, queryset, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.values_list("id", flat=True))
+        return (time.perf_counter() - started) * 1000 / repeat
+
+    def index_used(self, queryset):
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            if " using " in line:
+                return line.split(" using ")[1].split()[0]
+        return "seq scan"
@@ -0,0 +1,94 @@
+import secrets
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from funds.models import Fund
+from funds.services import compute_tax, donate
+from transactions.models import Transaction
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the WAL bytes written per donation by the current narrow-column write path and by "
+        "the former full-row save() path, on cagnottes with a long description. Creates and removes "
+        "its own rows; PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--donations", type=int, default=500)
+        parser.add_argument("--description-bytes", type=int, default=4000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("WAL positions are only available on PostgreSQL.")
+        prefix = f"+bench{int(time.time()) % 100000:05d}"
+        donor = User.objects.create(phone_number=f"{prefix}0001", solde=Decimal("99999999"))
+        try:
+            self.stdout.write(f"{'path':<10} {'WAL bytes/donation':>19} {'HOT updates':>12} {'updates':>8}")
+            for name, path in (("full-row", self.full_row), ("narrow", self.narrow)):
+                fund = Fund.objects.create(
+                    owner=donor,
+                    name="WAL benchmark",
+                    phone_beneficiary=0,
+                    target_amount=Decimal("99999999"),
+                    # Incompressible, so it is stored out of line in the TOAST table
+                    description=secrets.token_urlsafe(options["description_bytes"])[:options["description_bytes"]],
+                    deadline=timezone.now().date() + timedelta(days=1),
+                )
+                before_stats = self.update_counts()
+                before_lsn = self.wal_position()
+                for _ in range(options["donations"]):
+                    path(donor, fund.pk, Decimal("5"))
+                wal = self.wal_bytes_since(before_lsn)
+                after_stats = self.update_counts()
+                hot = after_stats[0] - before_stats[0]
+                updates = after_stats[1] - before_stats[1]
+                self.stdout.write(f"{name:<10} {wal / options['donations']:>19.0f} {hot:>12} {updates:>8}")
+        finally:
+            User.objects.filter(pk=donor.pk).delete()
+
+    def narrow(self, user, fund_id, amount):
+        donate(user, fund_id, amount)
+
+    def full_row(self, user, fund_id, amount):
+        # The write path before update_fields: both rows are read and saved whole.
+        with transaction.atomic():
+            user = User.objects.select_for_update().get(pk=user.pk)
+            fund = Fund.objects.select_for_update().get(pk=fund_id)
+            tax = compute_tax(amount)
+            user.solde -= amount + tax
+            user.save()
+            fund.current_amount += amount
+            fund.total_participants += 1
+            fund.save()
+            Transaction.objects.create(user=user, cagnotte=fund, amount=amount, tax=tax)
+
+    def wal_position(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_current_wal_insert_lsn()")
+            return cursor.fetchone()[0]
+
+    def wal_bytes_since(self, lsn):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), %s)", [lsn])
+            return cursor.fetchone()[0]
+
+    def update_counts(self):
+        """(HOT updates, updates) of the funds and users tables so far."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_stat_force_next_flush()")
+            cursor.execute("SELECT pg_stat_clear_snapshot()")
+            cursor.execute(
+                "SELECT COALESCE(SUM(n_tup_hot_upd), 0), COALESCE(SUM(n_tup_upd), 0) FROM pg_stat_user_tables "
+                "WHERE relname IN (%s, %s)",
+                [Fund._meta.db_table, User._meta.db_table],
+            )
+            return cursor.fetchone()
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from funds.expiry import DEFAULT_BATCH_SIZE, close_expired_funds
+
+
+class Command(BaseCommand):
+    help = (
+        "Close open cagnottes whose deadline has passed. Run it from cron, or with --loop as a "
+        "worker; several workers can run at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--loop", action="store_true", help="Keep running, one pass every --interval seconds")
+        parser.add_argument("--interval", type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            closed, batches = close_expired_funds(batch_size=options["batch_size"])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"Closed {closed} expired fund(s) in {batches} batch(es), {elapsed * 1000:.1f} ms")
+            if not options["loop"]:
+                return
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from funds.counters import fold_counter_shards
+from funds.models import FundCounterShard
+
+
+class Command(BaseCommand):
+    help = "Fold sharded donation counters back into Fund.current_amount (run periodically)."
+
+    def handle(self, *args, **options):
+        fund_ids = list(
+            FundCounterShard.objects.exclude(participants=0)
+            .values_list("fund_id", flat=True)
+            .distinct()
+        )
+        folded = 0
+        for fund_id in fund_ids:
+            if fold_counter_shards(fund_id):
+                folded += 1
+        self.stdout.write(f"Folded pending counters of {folded} fund(s)")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from funds.models import Fund
+from funds.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FundStats / FundDailyStats rollups from the transaction log, chunk by chunk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="Funds rebuilt per transaction")
+        parser.add_argument("--fund", action="append", dest="funds", help="Only rebuild these funds")
+
+    def handle(self, *args, **options):
+        funds = Fund.objects.order_by("pk")
+        if options["funds"]:
+            funds = funds.filter(pk__in=options["funds"])
+
+        rebuilt, last_pk = 0, None
+        while True:
+            chunk = funds.filter(pk__gt=last_pk) if last_pk is not None else funds
+            fund_ids = list(chunk.values_list("pk", flat=True)[:options["chunk_size"]])
+            if not fund_ids:
+                break
+            rebuilt += rebuild_stats(fund_ids)
+            last_pk = fund_ids[-1]
+            self.stdout.write(f"Rebuilt {rebuilt} fund(s)...")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt donation stats of {rebuilt} fund(s)"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from funds.counters import set_shard_count
+from funds.models import Fund
+
+
+class Command(BaseCommand):
+    help = "Spread donations to a hot cagnotte over N counter slots (0 disables sharding)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("fund_id")
+        parser.add_argument("shards", type=int)
+
+    def handle(self, *args, **options):
+        fund_id, shards = options["fund_id"], options["shards"]
+        if not 0 <= shards <= 256:
+            raise CommandError("shards must be between 0 and 256")
+        if not Fund.objects.filter(pk=fund_id).exists():
+            raise CommandError(f"Fund {fund_id} does not exist")
+
+        set_shard_count(fund_id, shards)
+        self.stdout.write(self.style.SUCCESS(f"Fund {fund_id} now uses {shards} counter shard(s)"))
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-18 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0005_alter_fund_current_amount_alter_fund_target_amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fund',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='FundCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('participants', models.IntegerField(default=0)),
+                ('fund', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='funds.fund')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='fundcountershard',
+            constraint=models.UniqueConstraint(fields=('fund', 'shard'), name='unique_fund_counter_shard'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 14:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0006_fund_shard_count_fundcountershard_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fund',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='fund_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fund',
+            index=models.Index(fields=['created_at', 'id'], name='fund_created_idx'),
+        ),
+    ]
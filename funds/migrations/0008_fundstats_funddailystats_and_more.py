@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-10-18 14:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0007_fund_fund_status_created_idx_fund_fund_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FundStats',
+            fields=[
+                ('fund', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='funds.fund')),
+                ('donations', models.IntegerField(default=0)),
+                ('unique_donors', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('first_donation_at', models.DateTimeField(blank=True, null=True)),
+                ('last_donation_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FundDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('donations', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('fund', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='funds.fund')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='funddailystats',
+            constraint=models.UniqueConstraint(fields=('fund', 'day'), name='unique_fund_daily_stats'),
+        ),
+    ]
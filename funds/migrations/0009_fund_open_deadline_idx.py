@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0008_fundstats_funddailystats_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fund',
+            index=models.Index(condition=models.Q(('status', 'open')), fields=['deadline'], name='fund_open_deadline_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def normalize_status(apps, schema_editor):
+    # Rows were written as 'Open'/'Closed' (the old choices), 'open', 'close'
+    # and 'closed'. Anything that is not some spelling of open is closed.
+    Fund = apps.get_model('funds', 'Fund')
+    Fund.objects.filter(status__iexact='open').exclude(status='open').update(status='open')
+    Fund.objects.exclude(status__iexact='open').exclude(status='closed').update(status='closed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0009_fund_open_deadline_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_status, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='fund',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('closed', 'Closed')], default='open', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='fund',
+            index=models.Index(condition=models.Q(('status', 'open')), fields=['created_at', 'id'], name='fund_open_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='fund',
+            constraint=models.CheckConstraint(check=models.Q(('status__in', ['open', 'closed'])), name='fund_status_valid'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations
+
+# PostgreSQL only; see funds.search. The column is not a model field: it is
+# filled by the trigger, which only fires when name or description is
+# written, so counter updates do not rebuild it.
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce({row}name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({row}description, '')), 'B')"
+)
+
+FORWARD = [
+    "ALTER TABLE funds_fund ADD COLUMN search_vector tsvector",
+    f"""
+    CREATE FUNCTION funds_fund_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER funds_fund_search_vector_trg
+    BEFORE INSERT OR UPDATE OF name, description ON funds_fund
+    FOR EACH ROW EXECUTE FUNCTION funds_fund_search_vector()
+    """,
+    f"UPDATE funds_fund SET search_vector = {SEARCH_VECTOR.format(row='')}",
+    "CREATE INDEX fund_search_idx ON funds_fund USING gin (search_vector)",
+]
+
+BACKWARD = [
+    "DROP INDEX IF EXISTS fund_name_trgm_idx",
+    "DROP TRIGGER funds_fund_search_vector_trg ON funds_fund",
+    "DROP FUNCTION funds_fund_search_vector()",
+    "ALTER TABLE funds_fund DROP COLUMN search_vector",
+]
+
+
+def add_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in FORWARD:
+        schema_editor.execute(statement)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        trigram = cursor.fetchone() is not None
+    # Typo-tolerant name matching, when the server ships the contrib module
+    if trigram:
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute("CREATE INDEX fund_name_trgm_idx ON funds_fund USING gin (name gin_trgm_ops)")
+
+
+def remove_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in BACKWARD:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0010_fund_status_enum'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search, remove_search),
+    ]
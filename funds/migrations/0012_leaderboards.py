@@ -0,0 +1,72 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill_donors(apps, schema_editor):
+    # New donors are detected by their missing FundDonor row, so the table
+    # must hold every past donor before the next donation. Trending scores
+    # stay empty until rebuild_fund_stats is run.
+    Transaction = apps.get_model('transactions', 'Transaction')
+    FundDonor = apps.get_model('funds', 'FundDonor')
+    rows = (
+        Transaction.objects.values('cagnotte_id', 'user_id')
+        .annotate(donations=Count('id'), total_amount=Sum('amount'), last_donation_at=Max('created_at'))
+        .order_by()
+    )
+    FundDonor.objects.bulk_create(
+        (FundDonor(fund_id=row.pop('cagnotte_id'), **row) for row in rows.iterator(chunk_size=2000)),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0011_fund_search'),
+        ('transactions', '0002_alter_transaction_cagnotte_alter_transaction_user_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FundDonor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('donations', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('last_donation_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='fundstats',
+            name='trending_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='fundstats',
+            index=models.Index(fields=['-trending_score'], name='fund_stats_trending_idx'),
+        ),
+        migrations.AddField(
+            model_name='funddonor',
+            name='fund',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='donors', to='funds.fund'),
+        ),
+        migrations.AddField(
+            model_name='funddonor',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fund_donations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='funddonor',
+            index=models.Index(fields=['fund', '-total_amount'], name='fund_donor_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='funddonor',
+            constraint=models.UniqueConstraint(fields=('fund', 'user'), name='unique_fund_donor'),
+        ),
+        migrations.RunPython(backfill_donors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:34
+
+import elkiss_project.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0012_leaderboards'),
+        ('outbox', '0003_compact_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fund',
+            name='id',
+            field=models.CharField(default=elkiss_project.ids.generate_id, editable=False, max_length=15, primary_key=True, serialize=False, unique=True),
+        ),
+    ]
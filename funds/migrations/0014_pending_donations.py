@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0013_compact_ids'),
+        ('transactions', '0003_compact_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FundPendingDonation',
+            fields=[
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='transactions.transaction')),
+                ('fund', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_donations', to='funds.fund')),
+            ],
+        ),
+    ]
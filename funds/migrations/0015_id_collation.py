@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:22
+
+from importlib import import_module
+
+import elkiss_project.ids
+from django.db import migrations
+
+id_collation = import_module("users.migrations.0014_id_collation")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_id_collation'),
+        ('funds', '0014_pending_donations'),
+    ]
+
+    operations = [
+        id_collation.AlterIdCollation(
+            model_name='fund',
+            name='id',
+            field=elkiss_project.ids.IdField(default=elkiss_project.ids.generate_id, editable=False, max_length=15, primary_key=True, serialize=False, unique=True),
+        ),
+    ]
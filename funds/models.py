@@ -1,20 +1,25 @@
+from decimal import Decimal
 from django.db import models
-import shortuuid
 from elkiss_project import settings
+from elkiss_project.ids import ID_LENGTH, IdField, generate_id
+
 
 def generate_short_uuid():
-    return shortuuid.ShortUUID().random(length=10)
+    # Only referenced by migration 0001: new ids come from elkiss_project.ids
+    return generate_id()
+
+
+class FundStatus(models.TextChoices):
+    OPEN = 'open', 'Open'
+    CLOSED = 'closed', 'Closed'
+
 
 class Fund(models.Model):
-    status_choices = [
-        ('Open','open'),
-        ('Closed','closed')
-    ]
 
-    id = models.CharField(
-        max_length=10, 
+    id = IdField(
+        max_length=ID_LENGTH, 
         primary_key=True, 
-        default=generate_short_uuid, 
+        default=generate_id, 
         editable=False, 
         unique=True
     )
@@ -29,14 +34,156 @@ class Fund(models.Model):
     total_participants = models.IntegerField(default=0)
     description = models.TextField()
     deadline = models.DateField()
-    status = models.CharField(max_length=10, default='open', choices=status_choices)
+    status = models.CharField(max_length=10, default=FundStatus.OPEN, choices=FundStatus.choices)
     created_at = models.DateField(auto_now_add=True)
     updated_at = models.DateField(auto_now=True)
+    # Number of FundCounterShard slots donations are spread over (0 = disabled)
+    shard_count = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the listing, with and without ?status=
+            models.Index(fields=['status', 'created_at', 'id'], name='fund_status_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='fund_created_idx'),
+            # ?status=open, the listing clients use the most
+            models.Index(
+                fields=['created_at', 'id'], condition=models.Q(status=FundStatus.OPEN), name='fund_open_created_idx'
+            ),
+            # Expired open cagnottes, for funds.expiry
+            models.Index(fields=['deadline'], condition=models.Q(status=FundStatus.OPEN), name='fund_open_deadline_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(status__in=FundStatus.values), name='fund_status_valid'),
+        ]
 
     def __str__(self):
         return f'{self.name} - {self.owner}'
     
     def add_donation(self, amount):
         """Method to add donations and update current amount."""
-        self.current_amount += amount
-        self.save()
\ No newline at end of file
+        # Increment in the database and write only the touched columns.
+        self.current_amount = models.F('current_amount') + amount
+        self.save(update_fields=['current_amount', 'updated_at'])
+        self.refresh_from_db(fields=['current_amount'])
+
+
+class FundCounterShard(models.Model):
+    """
+    One slot of a sharded donation counter.
+
+    Hot cagnottes spread their increments over several slots so concurrent
+    donations do not all queue on the Fund row. The slots are folded back
+    into Fund.current_amount / total_participants by funds.counters.
+    """
+    fund = models.ForeignKey(
+        Fund,
+        on_delete=models.CASCADE,
+        related_name='counter_shards')
+    shard = models.PositiveSmallIntegerField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    participants = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fund', 'shard'], name='unique_fund_counter_shard'),
+        ]
+
+    def __str__(self):
+        return f'{self.fund_id} #{self.shard}'
+
+
+class FundPendingDonation(models.Model):
+    """
+    A donation to a sharded cagnotte not yet added to its rollups.
+
+    Sharded donations append one of these instead of UPDATEing the
+    FundStats, FundDailyStats and FundDonor rows every donor of the
+    cagnotte would queue on; funds.counters adds them when folding.
+    """
+    transaction = models.OneToOneField(
+        'transactions.Transaction',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+')
+    fund = models.ForeignKey(
+        Fund,
+        on_delete=models.CASCADE,
+        related_name='pending_donations')
+
+    def __str__(self):
+        return f'{self.transaction_id} to {self.fund_id}'
+
+
+class FundStats(models.Model):
+    """Donation rollup of a cagnotte, updated in the same transaction as each donation."""
+    fund = models.OneToOneField(
+        Fund,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats')
+    donations = models.IntegerField(default=0)
+    unique_donors = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    first_donation_at = models.DateTimeField(null=True, blank=True)
+    last_donation_at = models.DateTimeField(null=True, blank=True)
+    # log of the donations weighted by recency, see funds.stats.trending_weight
+    trending_score = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-trending_score'], name='fund_stats_trending_idx'),
+        ]
+
+    @property
+    def average_donation(self):
+        if not self.donations:
+            return Decimal('0.00')
+        return (self.total_amount / self.donations).quantize(Decimal('0.01'))
+
+    def __str__(self):
+        return f'Stats of {self.fund_id}'
+
+
+class FundDailyStats(models.Model):
+    """Donations received by a cagnotte on one (UTC) day."""
+    fund = models.ForeignKey(
+        Fund,
+        on_delete=models.CASCADE,
+        related_name='daily_stats')
+    day = models.DateField()
+    donations = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fund', 'day'], name='unique_fund_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f'{self.fund_id} on {self.day}'
+
+
+class FundDonor(models.Model):
+    """What one user gave to a cagnotte, kept for its top donors leaderboard."""
+    fund = models.ForeignKey(
+        Fund,
+        on_delete=models.CASCADE,
+        related_name='donors')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='fund_donations')
+    donations = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_donation_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fund', 'user'], name='unique_fund_donor'),
+        ]
+        indexes = [
+            models.Index(fields=['fund', '-total_amount'], name='fund_donor_top_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} to {self.fund_id}'
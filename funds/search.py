@@ -0,0 +1,49 @@
+"""
+Search over cagnotte names and descriptions.
+
+On PostgreSQL funds_fund carries a search_vector tsvector (name weighted
+above description, 'simple' configuration since names mix French, Arabic
+and Hassaniya) maintained by a trigger and indexed with GIN, see migration
+0011. With the pg_trgm extension a fund also matches on name similarity,
+which tolerates typos, through a trigram GIN index. Results are ranked by
+ts_rank plus the name similarity.
+
+Other databases (SQLite in tests) fall back to case-insensitive substring
+matching, name matches ranked first.
+"""
+from functools import lru_cache
+
+from django.db import connections
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+MAX_QUERY_LENGTH = 100
+ORDERING = ("-rank", "-id")
+
+
+@lru_cache(maxsize=None)
+def trigram_enabled(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def search_funds(queryset, query):
+    """Funds of `queryset` matching `query`, annotated with their `rank`."""
+    if connections[queryset.db].vendor != "postgresql":
+        return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query)).annotate(
+            rank=Case(When(name__icontains=query, then=Value(1.0)), default=Value(0.5), output_field=FloatField())
+        )
+
+    table = connections[queryset.db].ops.quote_name(queryset.model._meta.db_table)
+    tsquery = "websearch_to_tsquery('simple', %s)"
+    match_sql, match_params = f"{table}.search_vector @@ {tsquery}", [query]
+    rank_sql, rank_params = f"ts_rank({table}.search_vector, {tsquery})", [query]
+    if trigram_enabled(queryset.db):
+        # `%%` is the pg_trgm similarity operator, escaped for the driver
+        match_sql, match_params = f"({match_sql} OR {table}.name %% %s)", match_params + [query]
+        rank_sql, rank_params = f"{rank_sql} + similarity({table}.name, %s)", rank_params + [query]
+    # ts_rank() is a float4: as float8 the cursor value round-trips exactly
+    return queryset.filter(RawSQL(match_sql, match_params, output_field=BooleanField())).annotate(
+        rank=RawSQL(f"({rank_sql})::float8", rank_params, output_field=FloatField())
+    )
@@ -1,8 +1,14 @@
 from rest_framework import serializers
-from .models import Fund
+from elkiss_project.expand import ExpandableFieldsMixin
+from elkiss_project.metrics import TimedSerializerMixin
+from users.serializers import UserSummarySerializer
+from .models import Fund, FundDailyStats, FundDonor, FundStats
+from .stats import trending_now
 from django.utils import timezone
 
-class FundSerializer(serializers.ModelSerializer):
+class FundSerializer(TimedSerializerMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {"owner": UserSummarySerializer}
+
     class Meta:
         model = Fund
         fields = '__all__'
@@ -10,13 +16,64 @@ class FundSerializer(serializers.ModelSerializer):
             "owner",
             "current_amount",
             "total_participants",
+            "shard_count",
             "created_at",
             "updated_at",
         ]
 
+    def update(self, instance, validated_data):
+        # Write only the columns that changed, not the whole row (description included).
+        changed = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        for field in changed:
+            setattr(instance, field, validated_data[field])
+        if changed:
+            instance.save(update_fields=changed + ["updated_at"])
+        return instance
+
     # Validate that deadline is in the future.
     def validate_deadline(self, value):
         if value <= timezone.now().date():
             raise serializers.ValidationError("Deadline must be in the future.")
         return value
 
+
+
+class FundDailyStatsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = FundDailyStats
+        fields = ["day", "donations", "total_amount"]
+
+
+class FundStatsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    average_donation = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = FundStats
+        fields = [
+            "fund",
+            "donations",
+            "unique_donors",
+            "total_amount",
+            "average_donation",
+            "first_donation_at",
+            "last_donation_at",
+        ]
+
+
+class TrendingFundSerializer(FundSerializer):
+    # Donations weighted by recency, as of now (see funds.stats)
+    trending = serializers.SerializerMethodField()
+
+    def get_trending(self, fund):
+        return round(trending_now(fund.trending_score), 2)
+
+
+class FundDonorSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    user = UserSummarySerializer(read_only=True)
+
+    class Meta:
+        model = FundDonor
+        fields = ["user", "donations", "total_amount", "last_donation_at"]
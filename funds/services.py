@@ -0,0 +1,244 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ledger import services as ledger
+from outbox import services as outbox
+from transactions.models import Transaction
+from . import counters, stats
+from .cache import invalidate_funds
+from .models import Fund, FundStatus
+
+User = get_user_model()
+
+MIN_DONATION = Decimal("5")
+MAX_BATCH_SIZE = 100
+TAX_RATE = Decimal("0.01")
+CENT = Decimal("0.01")
+
+
+class DonationError(Exception):
+    """Base error for a donation that could not be applied."""
+    status_code = 400
+    default_detail = "Donation failed"
+
+    def __init__(self, detail=None):
+        self.detail = detail or self.default_detail
+        super().__init__(self.detail)
+
+
+class FundNotAvailable(DonationError):
+    status_code = 404
+    default_detail = "Fund not found or not Open"
+
+
+class InsufficientFunds(DonationError):
+    status_code = 400
+    default_detail = "Insufficient funds"
+
+
+class BatchRejected(DonationError):
+    """An all-or-nothing batch had invalid items; `errors` maps item index to error."""
+    status_code = 400
+    default_detail = "Batch rejected, no donation was made"
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__()
+
+
+def clean_amount(value):
+    """Parse a donation amount, enforcing the minimum donation."""
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise DonationError("amount must be a number")
+    if not amount.is_finite() or amount < MIN_DONATION:
+        raise DonationError("Minimum donation is 5 MRU")
+    return amount
+
+
+def compute_tax(amount):
+    """Tax charged on top of a donation (1%), rounded to the cent."""
+    return (amount * TAX_RATE).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def donate(user, cagnotte_id, amount, note=""):
+    """
+    Debit `user` and credit the cagnotte in a single database transaction.
+
+    Both sides are conditional UPDATEs built from F() expressions, so the
+    balance check, the increments and the status flip happen inside the
+    database under the row locks taken by the UPDATE itself. Nothing is
+    read into Python first, which keeps concurrent donations to the same
+    cagnotte from overwriting each other.
+
+    The user row is locked first and the cagnotte row last, so the lock on
+    the (possibly hot) cagnotte is held for as short a time as possible.
+    Cagnottes with sharded counters are credited through funds.counters.
+    The rollups (queued for the fold on a sharded cagnotte) and the
+    donation.created outbox event are written in the same transaction. With the
+    ledger balance backend the debit is an append to ledger.LedgerEntry
+    instead of an UPDATE of the user row.
+
+    A cagnotte past its deadline is refused even before funds.expiry has
+    closed it.
+    """
+    tax = compute_tax(amount)
+    total_amount = amount + tax
+    open_funds = Fund.objects.filter(status=FundStatus.OPEN, deadline__gte=timezone.now().date())
+
+    with transaction.atomic():
+        if not _debit(user.pk, total_amount):
+            # Only on the error path: report a missing fund before a low balance.
+            if not open_funds.filter(pk=cagnotte_id).exists():
+                raise FundNotAvailable()
+            raise InsufficientFunds()
+
+        credit = {
+            "current_amount": F("current_amount") + amount,
+            "total_participants": F("total_participants") + 1,
+            "updated_at": timezone.now().date(),
+        }
+        shard_count = credited = closed = 0
+        if counters.known_sharded(cagnotte_id):
+            # Hot cagnottes spread their increments over counter slots instead.
+            shard_count = counters.lock_open_fund(cagnotte_id, timezone.now().date())
+            if shard_count is None:
+                raise FundNotAvailable()
+        if not shard_count:
+            unsharded = open_funds.filter(pk=cagnotte_id, shard_count=0)
+            # Evaluated against the pre-update row. The donation reaching the
+            # target closes the cagnotte, which also changes the cached lists.
+            credited = unsharded.filter(current_amount__lt=F("target_amount") - amount).update(**credit)
+            if not credited:
+                credited = closed = unsharded.filter(current_amount__gte=F("target_amount") - amount).update(
+                    status=FundStatus.CLOSED, **credit
+                )
+        if not credited and not shard_count:
+            # Sharded since this process last looked, or not open
+            shard_count = counters.lock_open_fund(cagnotte_id, timezone.now().date())
+            if not shard_count:
+                raise FundNotAvailable()
+        if shard_count:
+            closed = counters.add_donation(cagnotte_id, shard_count, amount)
+
+        donation = Transaction.objects.create(
+            user_id=user.pk,
+            cagnotte_id=cagnotte_id,
+            amount=amount,
+            note=note,
+            tax=tax,
+        )
+        if ledger.ledger_enabled():
+            ledger.record_donations([donation])
+        if shard_count:
+            # Their donors would all queue on the rollup rows: the fold adds them
+            stats.defer_donation(donation)
+        else:
+            stats.record_donation(donation)
+        outbox.record_donations([donation])
+        invalidate_funds(cagnotte_id, lists=bool(closed))
+        return donation
+
+
+def _debit(user_id, total_amount):
+    """Debit the donor if their balance covers `total_amount`; False otherwise."""
+    if ledger.ledger_enabled():
+        # The entries are appended once the Transaction exists; the account
+        # lock keeps the balance from changing until then.
+        ledger.lock_account(user_id)
+        return ledger.balance(user_id) >= total_amount
+    return User.objects.filter(pk=user_id, solde__gte=total_amount).update(
+        solde=F("solde") - total_amount,
+        updated_at=timezone.now(),
+    )
+
+
+def donate_batch(user, items, partial=False):
+    """
+    Apply several donations of `user` in one database transaction.
+
+    `items` are dicts with cagnotte_id, amount (Decimal) and note. The user
+    row is locked first, then every involved cagnotte in primary key order,
+    so concurrent batches and single donations always take locks in the
+    same order and cannot deadlock. The balance is checked once against the
+    grand total (tax included), the funds are written with one bulk UPDATE
+    and the Transaction rows with one bulk INSERT.
+
+    Items are applied in order: an item arriving after its cagnotte reached
+    the target fails like a single donation would. Without `partial` any
+    failing item raises BatchRejected and nothing is written; with it the
+    failing items are skipped. Returns one Transaction or DonationError per
+    item.
+    """
+    results = [None] * len(items)
+    today = timezone.now().date()
+    with transaction.atomic():
+        if ledger.ledger_enabled():
+            ledger.lock_account(user.pk)
+            solde = ledger.balance(user.pk)
+        else:
+            solde = User.objects.select_for_update().filter(pk=user.pk).values_list("solde", flat=True).get()
+        funds = {
+            fund.pk: fund
+            for fund in Fund.objects.select_for_update()
+            .filter(pk__in={item["cagnotte_id"] for item in items})
+            .annotate(pending=counters.pending_amount_subquery())
+            .order_by("pk")
+        }
+
+        accepted, total_amount = [], Decimal("0")
+        for index, item in enumerate(items):
+            fund = funds.get(item["cagnotte_id"])
+            if fund is None or fund.status != FundStatus.OPEN or fund.deadline < today:
+                results[index] = FundNotAvailable()
+                continue
+            amount = item["amount"]
+            tax = compute_tax(amount)
+            fund.current_amount += amount
+            fund.total_participants += 1
+            if fund.current_amount + fund.pending >= fund.target_amount:
+                fund.status = FundStatus.CLOSED
+            total_amount += amount + tax
+            accepted.append((index, Transaction(
+                user_id=user.pk,
+                cagnotte_id=fund.pk,
+                amount=amount,
+                note=item.get("note", ""),
+                tax=tax,
+            )))
+
+        errors = {index: error for index, error in enumerate(results) if error is not None}
+        if errors and not partial:
+            raise BatchRejected(errors)
+        if not accepted:
+            return results
+        if total_amount > solde:
+            raise InsufficientFunds()
+
+        if not ledger.ledger_enabled():
+            User.objects.filter(pk=user.pk).update(
+                solde=F("solde") - total_amount,
+                updated_at=timezone.now(),
+            )
+        touched = sorted({donation.cagnotte_id for _, donation in accepted})
+        for fund_id in touched:
+            funds[fund_id].updated_at = timezone.now().date()
+        Fund.objects.bulk_update(
+            [funds[fund_id] for fund_id in touched],
+            ["current_amount", "total_participants", "status", "updated_at"],
+        )
+        donations = Transaction.objects.bulk_create(donation for _, donation in accepted)
+        if ledger.ledger_enabled():
+            ledger.record_donations(donations)
+        stats.record_donations(donations)
+        outbox.record_donations(donations)
+        invalidate_funds(*touched, lists=any(funds[fund_id].status == FundStatus.CLOSED for fund_id in touched))
+
+    for (index, _), donation in zip(accepted, donations):
+        results[index] = donation
+    return results
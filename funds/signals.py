@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_funds
+from .models import Fund
+
+
+# Saving only these leaves every list holding the same cagnottes
+AMOUNT_FIELDS = {"current_amount", "total_participants", "updated_at"}
+
+
+@receiver(post_save, sender=Fund)
+@receiver(post_delete, sender=Fund)
+def invalidate_cached_fund(sender, instance, update_fields=None, **kwargs):
+    # Covers create/update/delete through the API and the admin;
+    # queryset.update() paths call invalidate_funds() themselves.
+    invalidate_funds(instance.pk, lists=update_fields is None or not set(update_fields) <= AMOUNT_FIELDS)
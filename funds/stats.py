@@ -0,0 +1,202 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Min, Sum, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln, TruncDate
+from django.utils import timezone
+
+from transactions.models import Transaction
+from .models import Fund, FundDailyStats, FundDonor, FundPendingDonation, FundStats
+
+# Trending scores are sums of exp(rate * (t - TRENDING_EPOCH)) over the
+# donations of a fund, stored as their log. Every fund's score decays by the
+# same factor as time passes, so the ordering never has to be recomputed:
+# a donation just weighs more than an older one (twice as much as one made
+# a half-life earlier), and reads only walk fund_stats_trending_idx.
+TRENDING_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def trending_rate():
+    return math.log(2) / (getattr(settings, "TRENDING_HALF_LIFE_HOURS", 24) * 3600)
+
+
+def trending_weight(created_at):
+    """log of the weight of a donation made at `created_at`."""
+    return trending_rate() * (created_at - TRENDING_EPOCH).total_seconds()
+
+
+def log_sum(weights):
+    """log(sum(exp(w))) of log weights, without overflowing."""
+    top = max(weights)
+    return top + math.log(sum(math.exp(weight - top) for weight in weights))
+
+
+def trending_now(score, now=None):
+    """A stored trending_score as recency-weighted donations, as of `now`."""
+    if score is None:
+        return 0.0
+    return math.exp(score - trending_weight(now or timezone.now()))
+
+
+def _add_trending(score):
+    # log(exp(a) + exp(b)) = max(a, b) + log(1 + exp(-|a - b|))
+    current = F("trending_score")
+    return Case(
+        When(trending_score__isnull=True, then=Value(score)),
+        default=Greatest(current, Value(score)) + Ln(Value(1.0) + Exp(-Abs(current - Value(score)))),
+    )
+
+
+def record_donation(donation):
+    """Add one donation (a saved Transaction) to the rollups, see record_donations()."""
+    record_donations([donation])
+
+
+def defer_donation(donation):
+    """Queue a donation to a sharded cagnotte for the rollups, see record_pending_donations()."""
+    FundPendingDonation.objects.create(transaction_id=donation.pk, fund_id=donation.cagnotte_id)
+
+
+def record_pending_donations(fund_id):
+    """
+    Add the queued donations of a sharded cagnotte to the rollups and
+    return their number. Runs in the fold, whose lock of the Fund row keeps
+    donations from queueing more meanwhile.
+    """
+    pending = list(FundPendingDonation.objects.filter(fund_id=fund_id).values_list("transaction_id", flat=True))
+    if not pending:
+        return 0
+    record_donations(
+        Transaction.objects.filter(pk__in=pending).only("cagnotte_id", "user_id", "amount", "created_at")
+    )
+    FundPendingDonation.objects.filter(pk__in=pending).delete()
+    return len(pending)
+
+
+def record_donations(donations):
+    """
+    Add saved Transaction rows to the FundStats / FundDailyStats rollups and
+    the FundDonor leaderboard, with one UPDATE per touched fund, day and
+    donor. Must run inside the donation transaction.
+
+    A donor is counted as new when the fund had no FundDonor row for them.
+    Their balance debit already holds their (row or ledger) lock, so two
+    concurrent donations of the same donor cannot both count as new.
+    """
+    funds, days, donors = {}, {}, {}
+    for donation in donations:
+        fund = funds.setdefault(donation.cagnotte_id, {
+            "donations": 0, "amount": 0, "new_donors": 0, "weights": [],
+            "first": donation.created_at, "last": donation.created_at,
+        })
+        fund["donations"] += 1
+        fund["amount"] += donation.amount
+        fund["last"] = max(fund["last"], donation.created_at)
+        fund["weights"].append(trending_weight(donation.created_at))
+
+        day = days.setdefault((donation.cagnotte_id, timezone.localdate(donation.created_at)), {
+            "donations": 0, "amount": 0,
+        })
+        day["donations"] += 1
+        day["amount"] += donation.amount
+
+        donor = donors.setdefault((donation.cagnotte_id, donation.user_id), {
+            "donations": 0, "amount": 0, "last": donation.created_at,
+        })
+        donor["donations"] += 1
+        donor["amount"] += donation.amount
+        donor["last"] = max(donor["last"], donation.created_at)
+
+    # Sorted so concurrent writers always lock rollup rows in the same order.
+    for (fund_id, user_id), donor in sorted(donors.items()):
+        if _increment(
+            FundDonor.objects.filter(fund_id=fund_id, user_id=user_id),
+            FundDonor(fund_id=fund_id, user_id=user_id),
+            donations=F("donations") + donor["donations"],
+            total_amount=F("total_amount") + donor["amount"],
+            last_donation_at=donor["last"],
+        ):
+            funds[fund_id]["new_donors"] += 1
+    for fund_id, fund in sorted(funds.items()):
+        _increment(
+            FundStats.objects.filter(fund_id=fund_id),
+            FundStats(fund_id=fund_id, first_donation_at=fund["first"]),
+            donations=F("donations") + fund["donations"],
+            unique_donors=F("unique_donors") + fund["new_donors"],
+            total_amount=F("total_amount") + fund["amount"],
+            last_donation_at=fund["last"],
+            trending_score=_add_trending(log_sum(fund["weights"])),
+        )
+    for (fund_id, day), totals in sorted(days.items()):
+        _increment(
+            FundDailyStats.objects.filter(fund_id=fund_id, day=day),
+            FundDailyStats(fund_id=fund_id, day=day),
+            donations=F("donations") + totals["donations"],
+            total_amount=F("total_amount") + totals["amount"],
+        )
+
+
+def _increment(queryset, empty_row, **changes):
+    """Apply `changes` to the row of `queryset`, creating it first if needed; True if it was missing."""
+    # The row only needs creating on the first donation; ON CONFLICT DO
+    # NOTHING lets two concurrent first donations both go on to the UPDATE.
+    if queryset.update(**changes):
+        return False
+    type(empty_row).objects.bulk_create([empty_row], ignore_conflicts=True)
+    queryset.update(**changes)
+    return True
+
+
+def rebuild_stats(fund_ids):
+    """
+    Recompute the rollups, trending scores and donor leaderboards of
+    `fund_ids` from the transaction log.
+
+    The fund rows are locked first so donations to these funds wait until
+    the rebuilt rows are in place. Queued donations of sharded funds are in
+    the log already: the queue is emptied.
+    """
+    with transaction.atomic():
+        fund_ids = list(Fund.objects.select_for_update().filter(pk__in=fund_ids).values_list("pk", flat=True))
+        donations = Transaction.objects.filter(cagnotte_id__in=fund_ids)
+
+        totals = donations.values("cagnotte_id").annotate(
+            donations=Count("id"),
+            unique_donors=Count("user_id", distinct=True),
+            total_amount=Sum("amount"),
+            first_donation_at=Min("created_at"),
+            last_donation_at=Max("created_at"),
+        )
+        daily = (
+            donations.annotate(day=TruncDate("created_at"))
+            .values("cagnotte_id", "day")
+            .annotate(donations=Count("id"), total_amount=Sum("amount"))
+        )
+
+        donors = donations.values("cagnotte_id", "user_id").annotate(
+            donations=Count("id"),
+            total_amount=Sum("amount"),
+            last_donation_at=Max("created_at"),
+        )
+        weights = {}
+        for fund_id, created_at in donations.values_list("cagnotte_id", "created_at").iterator(chunk_size=2000):
+            weights.setdefault(fund_id, []).append(trending_weight(created_at))
+
+        FundStats.objects.filter(fund_id__in=fund_ids).delete()
+        FundDailyStats.objects.filter(fund_id__in=fund_ids).delete()
+        FundDonor.objects.filter(fund_id__in=fund_ids).delete()
+        FundPendingDonation.objects.filter(fund_id__in=fund_ids).delete()
+        rollups = []
+        for row in totals:
+            fund_id = row.pop("cagnotte_id")
+            rollups.append(FundStats(fund_id=fund_id, trending_score=log_sum(weights[fund_id]), **row))
+        FundStats.objects.bulk_create(rollups)
+        FundDailyStats.objects.bulk_create(
+            FundDailyStats(fund_id=row.pop("cagnotte_id"), **row) for row in daily
+        )
+        FundDonor.objects.bulk_create(
+            FundDonor(fund_id=row.pop("cagnotte_id"), **row) for row in donors
+        )
+        return len(fund_ids)
@@ -1,3 +1,1088 @@
-from django.test import TestCase
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from elkiss_project import metrics
+from elkiss_project.testing import NarrowWritesMixin, QueryBudgetMixin, make_fund
+from transactions.models import Transaction
+from users.models import CustomUser
+from django.core.management import call_command
+
+from . import cache as fund_cache, counters
+from .cache import invalidate_funds
+from .counters import fold_counter_shards, set_shard_count
+from .expiry import close_expired_batch
+from .search import trigram_enabled
+from .models import (
+    Fund, FundCounterShard, FundDailyStats, FundDonor, FundPendingDonation, FundStats, FundStatus,
+)
+from .services import FundNotAvailable, donate
+from .views import CloseFundAPIView
+
+
+class DonateAPITests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(phone_number="+22220000001", password="secret")
+        self.donor = CustomUser.objects.create_user(phone_number="+22220000002", password="secret")
+        self.fund = make_fund(self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.donor)
+
+    def post(self, **data):
+        payload = {"cagnotte_id": self.fund.pk, "amount": "100.00", "note": "Hi"}
+        payload.update(data)
+        return self.client.post(reverse("donate"), payload, format="json")
+
+    def test_donation_debits_user_and_credits_fund(self):
+        response = self.post()
+
+        self.assertEqual(response.status_code, 201)
+        self.donor.refresh_from_db()
+        self.fund.refresh_from_db()
+        self.assertEqual(self.donor.solde, Decimal("899.00"))
+        self.assertEqual(self.fund.current_amount, Decimal("100.00"))
+        self.assertEqual(self.fund.total_participants, 1)
+        self.assertEqual(self.fund.status, "open")
+        transaction = Transaction.objects.get()
+        self.assertEqual(transaction.tax, Decimal("1.00"))
+        self.assertEqual(response.data["id"], transaction.pk)
+
+    def test_reaching_target_closes_fund(self):
+        self.fund.current_amount = Decimal("950.00")
+        self.fund.save()
+
+        self.assertEqual(self.post(amount="50").status_code, 201)
+
+        self.fund.refresh_from_db()
+        self.assertEqual(self.fund.status, "closed")
+        self.assertEqual(self.post(amount="5").status_code, 404)
+
+    def test_insufficient_funds_includes_tax(self):
+        response = self.post(amount="1000")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["detail"], "Insufficient funds")
+        self.donor.refresh_from_db()
+        self.fund.refresh_from_db()
+        self.assertEqual(self.donor.solde, Decimal("1000.00"))
+        self.assertEqual(self.fund.current_amount, Decimal("0.00"))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_unknown_fund_is_reported_before_balance(self):
+        response = self.post(cagnotte_id="missing", amount="5000")
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_amounts_are_rejected(self):
+        self.assertEqual(self.post(amount="4.99").status_code, 400)
+        self.assertEqual(self.post(amount="abc").status_code, 400)
+        self.assertEqual(self.post(amount="NaN").status_code, 400)
+
+    def test_donation_uses_fixed_number_of_queries(self):
+        donate(self.donor, self.fund.pk, Decimal("10"))
+        # savepoint, user UPDATE, fund UPDATE, transaction INSERT, donor UPDATE,
+        # stats UPDATE, daily stats UPDATE, outbox INSERT, release
+        with self.assertNumQueries(9):
+            donate(self.donor, self.fund.pk, Decimal("10"))
+
+
+class ShardedCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(phone_number="+22220000001", password="secret")
+        self.donor = CustomUser.objects.create_user(phone_number="+22220000002", password="secret")
+        self.fund = make_fund(self.owner, target_amount=Decimal("100.00"))
+        set_shard_count(self.fund.pk, 4)
+        self.client = APIClient()
+        self.client.force_authenticate(self.donor)
+
+    def test_donations_go_to_slots_until_folded(self):
+        for _ in range(3):
+            donate(self.donor, self.fund.pk, Decimal("10"))
+
+        self.fund.refresh_from_db()
+        self.assertEqual(self.fund.current_amount, Decimal("0.00"))
+        self.assertEqual(FundCounterShard.objects.filter(fund=self.fund).count(), 4)
+
+        # Reads add the pending slots without folding them
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("cagnotte-detail", args=[self.fund.pk]))
+        self.assertEqual(Decimal(response.data["current_amount"]), Decimal("30.00"))
+        self.assertEqual(response.data["total_participants"], 3)
+        self.assertFalse([query for query in queries if not query["sql"].startswith("SELECT")])
+        self.assertEqual(fold_counter_shards(self.fund.pk), Decimal("30.00"))
+
+        self.fund.refresh_from_db()
+        self.assertEqual((self.fund.current_amount, self.fund.total_participants), (Decimal("30.00"), 3))
+
+    def test_target_reached_closes_sharded_fund(self):
+        donate(self.donor, self.fund.pk, Decimal("60"))
+        donate(self.donor, self.fund.pk, Decimal("40"))
+
+        self.fund.refresh_from_db()
+        self.assertEqual(self.fund.status, "closed")
+        self.assertEqual(
+            self.client.post(reverse("donate"), {"cagnotte_id": self.fund.pk, "amount": "5"}).status_code,
+            404,
+        )
+
+    def test_rollups_of_sharded_donations_are_added_by_the_fold(self):
+        donate(self.donor, self.fund.pk, Decimal("10"))
+        donate(self.donor, self.fund.pk, Decimal("20"))
+
+        # Donors of a hot cagnotte do not queue on its rollup rows
+        self.assertFalse(FundStats.objects.filter(fund=self.fund).exists())
+        self.assertFalse(FundDonor.objects.filter(fund=self.fund).exists())
+        self.assertEqual(FundPendingDonation.objects.filter(fund=self.fund).count(), 2)
+
+        fold_counter_shards(self.fund.pk)
+        stats = FundStats.objects.get(fund=self.fund)
+        self.assertEqual((stats.donations, stats.unique_donors, stats.total_amount), (2, 1, Decimal("30.00")))
+        self.assertIsNotNone(stats.trending_score)
+        self.assertEqual(FundDailyStats.objects.get(fund=self.fund).donations, 2)
+        self.assertEqual(FundDonor.objects.get(fund=self.fund).total_amount, Decimal("30.00"))
+        self.assertFalse(FundPendingDonation.objects.exists())
+
+    def test_rebuild_empties_the_queue(self):
+        donate(self.donor, self.fund.pk, Decimal("10"))
+        call_command("rebuild_fund_stats", stdout=StringIO())
+
+        self.assertFalse(FundPendingDonation.objects.exists())
+        fold_counter_shards(self.fund.pk)
+        self.assertEqual(FundStats.objects.get(fund=self.fund).donations, 1)
+
+    def test_sharded_donations_skip_the_unsharded_update(self):
+        donate(self.donor, self.fund.pk, Decimal("10"))
+        # As in a process that has not seen it sharded yet: both unsharded UPDATEs miss, once
+        counters._sharded.discard(self.fund.pk)
+        for wasted in (2, 0):
+            with CaptureQueriesContext(connection) as queries:
+                donate(self.donor, self.fund.pk, Decimal("10"))
+            fund_updates = [
+                query for query in queries if query["sql"].startswith('UPDATE "funds_fund"')
+            ]
+            self.assertEqual(len(fund_updates), wasted)
+
+    def test_disabling_shards_folds_pending_amounts(self):
+        donate(self.donor, self.fund.pk, Decimal("10"))
+        set_shard_count(self.fund.pk, 0)
+
+        self.fund.refresh_from_db()
+        self.assertEqual(self.fund.shard_count, 0)
+        self.assertEqual(self.fund.current_amount, Decimal("10.00"))
+        donate(self.donor, self.fund.pk, Decimal("10"))
+        self.fund.refresh_from_db()
+        self.assertEqual(self.fund.current_amount, Decimal("20.00"))
+
+
+class FundQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(phone_number="+22220000003", password="secret")
+        self.client.force_authenticate(self.user)
+
+    def make_funds(self, count):
+        start = Fund.objects.count()
+        for i in range(start, start + count):
+            owner = CustomUser.objects.create(phone_number=f"+2222300{i:04d}", name=f"Owner {i}")
+            make_fund(owner)
+
+    def test_list_query_count_does_not_grow_with_page(self):
+        url = reverse("cagnotte-list-create")
+        self.make_funds(1)
+        self.assertQueryBudget(1, url, items=1)
+        self.assertQueryBudget(1, url + "?expand=owner", items=1)
+
+        self.make_funds(15)
+        self.assertQueryBudget(1, url, items=16)
+        response = self.assertQueryBudget(1, url + "?expand=owner", items=16)
+        self.assertEqual(set(response.data["results"][0]["owner"]), {"id", "name"})
+
+    def test_detail_expands_owner_in_one_query(self):
+        fund = make_fund(self.user)
+        response = self.assertQueryBudget(1, reverse("cagnotte-detail", args=[fund.pk]) + "?expand=owner")
+        self.assertEqual(response.data["owner"], {"id": self.user.pk, "name": None})
+
+
+class FundStatusTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(phone_number="+22220000001", password="secret")
+        self.open = make_fund(self.owner)
+        self.closed = make_fund(self.owner, status=FundStatus.CLOSED)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def listed(self, status):
+        response = self.client.get(reverse("cagnotte-list-create"), {"status": status})
+        return [row["id"] for row in response.data["results"]]
+
+    def test_listing_filters_by_status_case_insensitively(self):
+        self.assertEqual(self.listed("open"), [self.open.pk])
+        self.assertEqual(self.listed("Closed"), [self.closed.pk])
+
+    def test_unknown_status_is_rejected_by_the_database(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Fund.objects.filter(pk=self.open.pk).update(status="close")
+
+    def test_created_fund_accepts_status_values(self):
+        response = self.client.post(reverse("cagnotte-list-create"), {
+            "name": "Explicit",
+            "phone_beneficiary": 22222222,
+            "target_amount": "100.00",
+            "description": "Status given",
+            "deadline": str(timezone.now().date() + timedelta(days=5)),
+            "status": "open",
+        })
+
+        self.assertEqual(response.status_code, 201, response.data)
+
+
+class FundSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(phone_number="+22220000001", password="secret")
+        self.wedding = make_fund(self.owner, name="Mariage de Aicha", description="Cadeau des amis")
+        self.medical = make_fund(self.owner, name="Aide medicale", description="Opération après le mariage")
+        make_fund(self.owner, name="Football", description="Maillots du club")
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.url = reverse("cagnotte-search")
+
+    def search(self, **params):
+        return self.client.get(self.url, params)
+
+    def ids(self, response):
+        return [row["id"] for row in response.data["results"]]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.ids(self.search(q="mariage")), [self.wedding.pk, self.medical.pk])
+
+    def test_results_are_cursor_paginated(self):
+        first = self.search(q="mariage", page_size=1)
+        second = self.client.get(first.data["next"])
+
+        self.assertEqual(self.ids(first) + self.ids(second), [self.wedding.pk, self.medical.pk])
+        self.assertIsNone(second.data["next"])
+
+    def test_renamed_fund_is_found_under_its_new_name(self):
+        self.client.patch(reverse("cagnotte-detail", args=[self.wedding.pk]), {"name": "Naissance"}, format="json")
+
+        self.assertEqual(self.ids(self.search(q="naissance")), [self.wedding.pk])
+        self.assertEqual(self.ids(self.search(q="mariage")), [self.medical.pk])
+
+    def test_status_filter_and_query_validation(self):
+        Fund.objects.filter(pk=self.medical.pk).update(status=FundStatus.CLOSED)
+
+        self.assertEqual(self.ids(self.search(q="mariage", status="open")), [self.wedding.pk])
+        self.assertEqual(self.search(q="  ").status_code, 400)
+        self.assertEqual(self.search(q="x" * 101).status_code, 400)
+
+    @skipUnless(connection.vendor == "postgresql", "needs pg_trgm")
+    def test_typos_in_the_name_still_match(self):
+        if not trigram_enabled(connection.alias):
+            self.skipTest("pg_trgm is not available on this server")
+        self.assertEqual(self.ids(self.search(q="mariag aisha")), [self.wedding.pk])
+
+
+class FundCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        fund_cache.stats.reset()
+        self.owner = CustomUser.objects.create_user(phone_number="+22220000001", password="secret")
+        self.donor = CustomUser.objects.create_user(phone_number="+22220000002", password="secret")
+        self.fund = make_fund(self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.detail_url = reverse("cagnotte-detail", args=[self.fund.pk])
+
+    def test_detail_is_served_from_cache(self):
+        self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url)
+        self.assertEqual(response.data["id"], self.fund.pk)
+        self.assertEqual(fund_cache.stats.as_dict(), {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+    def test_donation_refreshes_detail_and_list_totals(self):
+        list_url = reverse("cagnotte-list-create")
+        self.client.get(self.detail_url)
+        self.client.get(list_url)
+        Fund.objects.filter(pk=self.fund.pk).update(target_amount=Decimal("50.00"))
+        donor = APIClient()
+        donor.force_authenticate(self.donor)
+
+        donor.post(reverse("donate"), {"cagnotte_id": self.fund.pk, "amount": "25"})
+        self.assertEqual(self.client.get(self.detail_url).data["current_amount"], "25.00")
+        self.assertEqual(self.client.get(list_url).data["results"][0]["current_amount"], "25.00")
+        response = self.client.get(
+            reverse("async-cagnotte-list"), HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.owner)}"
+        )
+        self.assertEqual(response.json()["results"][0]["current_amount"], "25.00")
+
+        donor.post(reverse("donate"), {"cagnotte_id": self.fund.pk, "amount": "25"})
+        row = self.client.get(list_url).data["results"][0]
+        self.assertEqual((row["status"], row["current_amount"]), ("closed", "50.00"))
+
+    def test_lists_include_pending_sharded_counters(self):
+        set_shard_count(self.fund.pk, 4)
+        donor = APIClient()
+        donor.force_authenticate(self.donor)
+        donor.post(reverse("donate"), {"cagnotte_id": self.fund.pk, "amount": "25"})
+
+        for _ in range(2):  # built, then cached
+            row = self.client.get(reverse("cagnotte-list-create")).data["results"][0]
+            self.assertEqual((row["current_amount"], row["total_participants"]), ("25.00", 1))
+
+    def test_payload_built_before_a_write_is_not_served_after_it(self):
+        keys = fund_cache.detail_keys(self.fund.pk, None)
+
+        def build_racing_a_donation():
+            # The reader has read the row; the donation commits before it stores the payload
+            invalidate_funds(self.fund.pk)
+            return "stale"
+
+        self.assertEqual(fund_cache.cached_payload(keys, build_racing_a_donation), "stale")
+        self.assertEqual(fund_cache.cached_payload(keys, lambda: "fresh"), "fresh")
+        self.assertEqual(fund_cache.cached_payload(keys, lambda: "rebuilt"), "fresh")
+
+    def test_update_close_and_delete_invalidate(self):
+        self.client.get(self.detail_url)
+        self.client.patch(self.detail_url, {"name": "Renamed"})
+        self.assertEqual(self.client.get(self.detail_url).data["name"], "Renamed")
+
+        self.client.put(reverse("cagnotte-close", args=[self.fund.pk]))
+        self.assertEqual(self.client.get(self.detail_url).data["status"], "closed")
+
+        other = make_fund(self.owner)
+        other_url = reverse("cagnotte-detail", args=[other.pk])
+        self.client.get(other_url)
+        self.client.delete(other_url)
+        self.assertEqual(self.client.get(other_url).status_code, 404)
+
+    def test_new_fund_appears_in_cached_list(self):
+        list_url = reverse("cagnotte-list-create")
+        self.assertEqual(len(self.client.get(list_url).data["results"]), 1)
+        self.client.post(list_url, {
+            "name": "Second",
+            "phone_beneficiary": 22222222,
+            "target_amount": "100.00",
+            "description": "Another",
+            "deadline": str(timezone.now().date() + timedelta(days=5)),
+        })
+        self.assertEqual(len(self.client.get(list_url).data["results"]), 2)
+
+    def test_stats_endpoint_is_admin_only(self):
+        url = reverse("cagnotte-cache-stats")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.owner.is_staff = True
+        self.owner.save()
+        self.assertEqual(self.client.get(url).data["misses"], 0)
+
+
+class DonateBatchAPITests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(phone_number="+22220000001", password="secret")
+        self.donor = CustomUser.objects.create(phone_number="+22220000002")
+        self.funds = [make_fund(self.owner, target_amount=Decimal("100.00")) for _ in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.donor)
+
+    def post(self, items, **extra):
+        return self.client.post(reverse("donate-batch"), {"items": items, **extra}, format="json")
+
+    def item(self, fund, amount):
+        return {"cagnotte_id": fund.pk, "amount": amount, "note": "batch"}
+
+    def test_batch_is_applied_in_one_transaction(self):
+        response = self.post([
+            self.item(self.funds[0], "10"),
+            self.item(self.funds[1], "20"),
+            self.item(self.funds[0], "30"),
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 3)
+        self.donor.refresh_from_db()
+        self.assertEqual(self.donor.solde, Decimal("1000") - Decimal("60.60"))
+        first, second = (Fund.objects.get(pk=fund.pk) for fund in self.funds)
+        self.assertEqual((first.current_amount, first.total_participants), (Decimal("40.00"), 2))
+        self.assertEqual((second.current_amount, second.total_participants), (Decimal("20.00"), 1))
+        self.assertEqual(Transaction.objects.count(), 3)
+        self.assertEqual(FundStats.objects.get(fund=first).unique_donors, 1)
+
+    def test_invalid_item_rejects_whole_batch(self):
+        self.funds[1].status = "closed"
+        self.funds[1].save()
+
+        response = self.post([self.item(self.funds[0], "10"), self.item(self.funds[1], "10")])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], [{"index": 1, "detail": "Fund not found or not Open"}])
+
+        # Malformed items are reported before any fund is looked at
+        response = self.post([self.item(self.funds[0], "10"), {"amount": "10"}])
+        self.assertEqual(response.data["errors"], [{"index": 1, "detail": "cagnotte_id is required"}])
+        self.assertFalse(Transaction.objects.exists())
+        self.donor.refresh_from_db()
+        self.assertEqual(self.donor.solde, Decimal("1000.00"))
+
+    def test_partial_mode_reports_each_item(self):
+        response = self.post(
+            [self.item(self.funds[0], "10"), {"cagnotte_id": "missing", "amount": "10"}, self.item(self.funds[1], "1")],
+            partial=True,
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual([row["status"] for row in response.data["results"]], [201, 404, 400])
+        self.assertEqual(Transaction.objects.get().cagnotte_id, self.funds[0].pk)
+
+    def test_items_after_the_target_is_reached_fail(self):
+        items = [self.item(self.funds[0], "60"), self.item(self.funds[0], "50"), self.item(self.funds[0], "10")]
+        self.assertEqual(self.post(items).status_code, 400)
+
+        response = self.post(items, partial=True)
+        self.assertEqual([row["status"] for row in response.data["results"]], [201, 201, 404])
+        self.assertEqual(Fund.objects.get(pk=self.funds[0].pk).status, "closed")
+
+    def test_balance_is_checked_against_grand_total(self):
+        response = self.post([self.item(self.funds[0], "600"), self.item(self.funds[1], "500")])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["detail"], "Insufficient funds")
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        # Warm up the stats rows so every batch takes the same path
+        self.post([self.item(self.funds[0], "5"), self.item(self.funds[1], "5")])
+        with CaptureQueriesContext(connection) as small:
+            self.post([self.item(self.funds[0], "5"), self.item(self.funds[1], "5")])
+        with CaptureQueriesContext(connection) as large:
+            self.post([self.item(self.funds[0], "5"), self.item(self.funds[1], "5")] * 10)
+        self.assertEqual(len(small), len(large))
+
+
+class AsyncFundViewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create(phone_number="+22220000001", name="Owner")
+        self.funds = [make_fund(self.owner) for _ in range(3)]
+        self.auth = {"headers": {"Authorization": f"Bearer {AccessToken.for_user(self.owner)}"}}
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    async def test_list_matches_sync_endpoint(self):
+        response = await self.async_client.get(reverse("async-cagnotte-list") + "?expand=owner&page_size=2", **self.auth)
+
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(self.client.get)(reverse("cagnotte-list-create") + "?expand=owner&page_size=2")
+        self.assertEqual(response.json()["results"], expected.json()["results"])
+        self.assertEqual(len(response.json()["results"]), 2)
+        self.assertIn("cursor=", response.json()["next"])
+
+    async def test_detail(self):
+        fund = self.funds[0]
+        response = await self.async_client.get(reverse("async-cagnotte-detail", args=[fund.pk]), **self.auth)
+        self.assertEqual(response.json()["id"], fund.pk)
+
+        response = await self.async_client.get(reverse("async-cagnotte-detail", args=["missing"]), **self.auth)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(reverse("async-cagnotte-list"))
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(reverse("async-cagnotte-list"), headers={"Authorization": "Bearer nope"})
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(METRICS_TOKEN="scrape")
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        fund_cache.stats.reset()
+        metrics.registry.reset()
+        self.owner = CustomUser.objects.create(phone_number="+22220000001", name="Owner")
+        self.fund = make_fund(self.owner)
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.owner)}"}
+
+    def scrape(self):
+        return self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape").content.decode()
+
+    def server_timing(self, response):
+        return dict(
+            (part.split(";")[0], part) for part in response["Server-Timing"].split(", ")
+        )
+
+    @override_settings(METRICS_SAMPLE_RATE=1)
+    def test_sampled_request_reports_phases(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("cagnotte-detail", args=[self.fund.pk]), **self.auth)
+
+        self.assertEqual(response.status_code, 200)
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {"auth", "db", "serialize", "render", "app", "total"})
+        self.assertIn(f'desc="{len(queries)} queries"', timing["total"])
+        serialize = metrics.registry.histograms[(
+            "elkiss_http_phase_duration_seconds",
+            (("route", "api/cagnottes/<str:pk>/"), ("method", "GET"), ("phase", "serialize")),
+        )]
+        self.assertGreater(serialize.sum, 0)
+
+        body = self.scrape()
+        labels = 'route="api/cagnottes/<str:pk>/",method="GET"'
+        self.assertIn(f"elkiss_http_request_duration_seconds_count{{{labels}}} 1", body)
+        self.assertIn(f'elkiss_http_responses_total{{{labels},status="200"}} 1', body)
+        self.assertIn(f'elkiss_http_phase_duration_seconds_count{{{labels},phase="auth"}} 1', body)
+        self.assertIn(f'elkiss_http_queries_bucket{{{labels},le="+Inf"}} 1', body)
+        self.assertIn('elkiss_fund_cache_requests_total{outcome="miss"} 1', body)
+
+    @override_settings(METRICS_SAMPLE_RATE=1)
+    async def test_async_views_are_sampled(self):
+        response = await self.async_client.get(
+            reverse("async-cagnotte-detail", args=[self.fund.pk]),
+            headers={"Authorization": self.auth["HTTP_AUTHORIZATION"]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('desc="0 queries"', response["Server-Timing"])
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request_is_only_timed(self):
+        response = self.client.get(reverse("cagnotte-detail", args=[self.fund.pk]), **self.auth)
+
+        self.assertNotIn("Server-Timing", response)
+        body = self.scrape()
+        self.assertIn('elkiss_http_request_duration_seconds_count{route="api/cagnottes/<str:pk>/",method="GET"} 1', body)
+        self.assertIn('elkiss_http_response_size_bytes_count{route="api/cagnottes/<str:pk>/",method="GET"} 1', body)
+        self.assertNotIn("elkiss_http_queries", body)
+
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer nope").status_code, 401)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+    @override_settings(METRICS_TOKEN="")
+    def test_metrics_without_token_are_staff_only(self):
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer ").status_code, 403)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        CustomUser.objects.filter(pk=self.owner.pk).update(is_staff=True)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+    @override_settings(METRICS_SAMPLE_RATE=1)
+    def test_serializers_are_timed_without_patching_drf(self):
+        self.assertFalse(hasattr(BaseSerializer.is_valid, "timed"))
+        response = self.client.get(reverse("cagnotte-list-create"), **self.auth)
+        self.assertIn("serialize;dur=", response["Server-Timing"])
+        self.assertNotIn("serialize;dur=0.00,", response["Server-Timing"])
+
+
+class FundStatsTests(TestCase):
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user(phone_number="+22220000001", password="secret")
+        self.donors = [
+            CustomUser.objects.create(phone_number=f"+2222400000{i}") for i in range(2)
+        ]
+        self.fund = make_fund(self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def donate_all(self):
+        donate(self.donors[0], self.fund.pk, Decimal("10"))
+        donate(self.donors[0], self.fund.pk, Decimal("20"))
+        donate(self.donors[1], self.fund.pk, Decimal("30"))
+
+    def test_rollup_is_updated_with_each_donation(self):
+        self.donate_all()
+
+        stats = FundStats.objects.get(fund=self.fund)
+        self.assertEqual(stats.donations, 3)
+        self.assertEqual(stats.unique_donors, 2)
+        self.assertEqual(stats.total_amount, Decimal("60.00"))
+        self.assertEqual(stats.average_donation, Decimal("20.00"))
+        daily = FundDailyStats.objects.get(fund=self.fund)
+        self.assertEqual((daily.day, daily.donations), (timezone.localdate(), 3))
+
+    def test_stats_endpoint(self):
+        url = reverse("cagnotte-stats", args=[self.fund.pk])
+        self.assertEqual(self.client.get(url).data["donations"], 0)
+        self.donate_all()
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.data["unique_donors"], 2)
+        self.assertEqual(response.data["average_donation"], "20.00")
+        self.assertEqual(response.data["daily"], [
+            {"day": str(timezone.localdate()), "donations": 3, "total_amount": "60.00"},
+        ])
+        self.assertEqual(self.client.get(reverse("cagnotte-stats", args=["missing"])).status_code, 404)
+
+    def test_rebuild_matches_incremental_rollup(self):
+        self.donate_all()
+        expected = FundStats.objects.values().get(fund=self.fund)
+        FundStats.objects.all().delete()
+        FundDailyStats.objects.all().delete()
+
+        call_command("rebuild_fund_stats", chunk_size=1, stdout=StringIO())
+
+        rebuilt = FundStats.objects.values().get(fund=self.fund)
+        self.assertAlmostEqual(rebuilt.pop("trending_score"), expected.pop("trending_score"))
+        self.assertEqual(rebuilt, expected)
+        self.assertEqual(FundDailyStats.objects.get(fund=self.fund).total_amount, Decimal("60.00"))
+        self.assertEqual(
+            {row[0]: row[1:] for row in FundDonor.objects.values_list("user_id", "donations", "total_amount")},
+            {self.donors[0].pk: (2, Decimal("30.00")), self.donors[1].pk: (1, Decimal("30.00"))},
+        )
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(phone_number="+22220000001", password="secret")
+        self.donors = [
+            CustomUser.objects.create(phone_number=f"+2222500000{i}", name=f"Donor {i}", solde=Decimal("10000"))
+            for i in range(3)
+        ]
+        self.funds = [make_fund(self.owner, target_amount=Decimal("99999")) for _ in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def trending(self, **params):
+        return [row["id"] for row in self.client.get(reverse("cagnotte-trending"), params).data]
+
+    def test_top_donors_by_total_amount(self):
+        fund = self.funds[0]
+        donate(self.donors[0], fund.pk, Decimal("10"))
+        donate(self.donors[1], fund.pk, Decimal("50"))
+        donate(self.donors[0], fund.pk, Decimal("15"))
+        donate(self.donors[2], self.funds[1].pk, Decimal("500"))
+        url = reverse("cagnotte-top-donors", args=[fund.pk])
+
+        with self.assertNumQueries(1):
+            rows = self.client.get(url).data
+        self.assertEqual(
+            [(row["user"]["name"], row["donations"], row["total_amount"]) for row in rows],
+            [("Donor 1", 1, "50.00"), ("Donor 0", 2, "25.00")],
+        )
+        self.assertEqual(len(self.client.get(url, {"limit": 1}).data), 1)
+        self.assertEqual(self.client.get(reverse("cagnotte-top-donors", args=["missing"])).status_code, 404)
+
+    def test_trending_ranks_recent_donations_first(self):
+        for _ in range(4):
+            donate(self.donors[0], self.funds[0].pk, Decimal("10"))
+        Transaction.objects.filter(cagnotte=self.funds[0]).update(created_at=timezone.now() - timedelta(days=3))
+        call_command("rebuild_fund_stats", stdout=StringIO())
+        donate(self.donors[1], self.funds[1].pk, Decimal("10"))
+
+        # 4 donations three half-lives ago weigh 0.5, 1 just now weighs 1
+        self.assertEqual(self.trending(), [self.funds[1].pk, self.funds[0].pk])
+        response = self.client.get(reverse("cagnotte-trending"))
+        self.assertAlmostEqual(response.data[1]["trending"], 0.5, places=2)
+
+        donate(self.donors[2], self.funds[0].pk, Decimal("10"))
+        # The cached page keeps its order until it expires, with current totals
+        response = self.client.get(reverse("cagnotte-trending"))
+        self.assertEqual([row["id"] for row in response.data], [self.funds[1].pk, self.funds[0].pk])
+        self.assertEqual(response.data[1]["current_amount"], "50.00")
+        cache.clear()
+        self.assertEqual(self.trending(), [self.funds[0].pk, self.funds[1].pk])
+        self.assertEqual(self.trending(limit=1), [self.funds[0].pk])
+
+    def test_closed_funds_leave_the_trending_list(self):
+        donate(self.donors[0], self.funds[0].pk, Decimal("10"))
+        donate(self.donors[0], self.funds[1].pk, Decimal("10"))
+        self.client.put(reverse("cagnotte-close", args=[self.funds[0].pk]))
+
+        self.assertEqual(self.trending(), [self.funds[1].pk])
+
+
+class NarrowWriteTests(NarrowWritesMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(phone_number="+22220000001", password="secret")
+        self.donor = CustomUser.objects.create_user(phone_number="+22220000002", password="secret")
+        self.fund = make_fund(self.owner, description="x" * 4000)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_donations_write_only_counters(self):
+        other = make_fund(self.owner)
+        set_shard_count(other.pk, 4)
+        self.client.force_authenticate(self.donor)
+
+        with self.assertNoFullRowUpdates():
+            self.client.post(reverse("donate"), {"cagnotte_id": self.fund.pk, "amount": "10"}, format="json")
+            self.client.post(reverse("donate"), {"cagnotte_id": other.pk, "amount": "10"}, format="json")
+            self.client.post(reverse("donate-batch"), {"items": [
+                {"cagnotte_id": self.fund.pk, "amount": "10"},
+                {"cagnotte_id": other.pk, "amount": "10"},
+            ]}, format="json")
+            fold_counter_shards(other.pk)
+            self.fund.add_donation(Decimal("5"))
+
+        self.fund.refresh_from_db()
+        self.assertEqual(self.fund.current_amount, Decimal("25.00"))
+
+    def test_owner_edits_write_only_changed_columns(self):
+        url = reverse("cagnotte-detail", args=[self.fund.pk])
+
+        with self.assertNoFullRowUpdates() as captured:
+            self.client.patch(url, {"name": "Renamed"}, format="json")
+            self.client.put(reverse("cagnotte-close", args=[self.fund.pk]))
+
+        updates = [query["sql"] for query in captured if query["sql"].startswith("UPDATE")]
+        self.assertNotIn("description", " ".join(updates))
+        self.fund.refresh_from_db()
+        self.assertEqual((self.fund.name, self.fund.status), ("Renamed", "closed"))
+
+    def test_close_only_updates_an_open_fund(self):
+        # Regression guard for the conditional UPDATE of the close: it must
+        # not rewrite a status changed after the fund was read, e.g. by a
+        # donation reaching the target.
+        url = reverse("cagnotte-close", args=[self.fund.pk])
+        stale = Fund.objects.get(pk=self.fund.pk)
+        Fund.objects.filter(pk=self.fund.pk).update(status=FundStatus.CLOSED)
+
+        with mock.patch.object(CloseFundAPIView, "get_object", return_value=stale):
+            self.assertEqual(self.client.put(url).status_code, 400)
+        Fund.objects.filter(pk=self.fund.pk).update(status=FundStatus.OPEN)
+        self.assertEqual(self.client.put(url).status_code, 200)
+        self.assertEqual(self.client.put(url).status_code, 400)
+
+    def test_guard_catches_plain_save(self):
+        with self.assertRaises(AssertionError):
+            with self.assertNoFullRowUpdates():
+                self.fund.save()
+
+
+class FundExpiryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(phone_number="+22220000001", password="secret")
+        self.yesterday = timezone.now().date() - timedelta(days=1)
+        self.expired = [make_fund(self.owner, deadline=self.yesterday) for _ in range(3)]
+        self.today = make_fund(self.owner, deadline=timezone.now().date())
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def statuses(self):
+        return dict(Fund.objects.values_list("pk", "status"))
+
+    def test_command_closes_expired_funds_in_batches(self):
+        out = StringIO()
+        call_command("close_expired_funds", "--batch-size", "2", stdout=out)
+
+        self.assertIn("Closed 3 expired fund(s) in 2 batch(es)", out.getvalue())
+        statuses = self.statuses()
+        self.assertEqual({statuses[fund.pk] for fund in self.expired}, {"closed"})
+        self.assertEqual(statuses[self.today.pk], "open")
+
+        call_command("close_expired_funds", stdout=out)
+        self.assertIn("Closed 0 expired fund(s) in 0 batch(es)", out.getvalue())
+
+    def test_closing_refreshes_cached_fund(self):
+        url = reverse("cagnotte-detail", args=[self.expired[0].pk])
+        self.assertEqual(self.client.get(url).data["status"], "open")
+
+        close_expired_batch()
+
+        self.assertEqual(self.client.get(url).data["status"], "closed")
+
+    def test_expired_funds_refuse_donations(self):
+        response = self.client.post(reverse("donate"), {"cagnotte_id": self.expired[0].pk, "amount": "10"})
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post(reverse("donate-batch"), {"items": [
+            {"cagnotte_id": self.expired[1].pk, "amount": "10"},
+            {"cagnotte_id": self.today.pk, "amount": "10"},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(reverse("donate"), {"cagnotte_id": self.today.pk, "amount": "10"}).status_code, 201)
+
+
+@skipUnless(connection.vendor == "postgresql", "needs real row-level locking")
+class ConcurrentDonationTests(TransactionTestCase):
+    donors = 20
+    donations_per_donor = 15
+
+    def test_parallel_donations_do_not_lose_updates(self):
+        self.run_parallel_donations(shards=0)
+
+    def test_parallel_donations_on_sharded_fund(self):
+        self.run_parallel_donations(shards=8)
+
+    def run_parallel_donations(self, shards):
+        owner = CustomUser.objects.create_user(phone_number="+22221000000", password="secret")
+        fund = make_fund(owner, target_amount=Decimal("99999999.00"))
+        set_shard_count(fund.pk, shards)
+        donors = [
+            CustomUser.objects.create_user(phone_number=f"+2222200{i:04d}", password="secret")
+            for i in range(self.donors)
+        ]
+
+        def worker(user):
+            try:
+                donate(user, fund.pk, Decimal("10"))
+            finally:
+                connection.close()
+
+        jobs = [user for user in donors for _ in range(self.donations_per_donor)]
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            list(pool.map(worker, jobs))
+
+        count = len(jobs)
+        fold_counter_shards(fund.pk)
+        fund.refresh_from_db()
+        self.assertEqual(fund.current_amount, Decimal("10") * count)
+        self.assertEqual(fund.total_participants, count)
+        self.assertEqual(Transaction.objects.filter(cagnotte=fund).count(), count)
+        for user in CustomUser.objects.filter(pk__in=[u.pk for u in donors]):
+            self.assertEqual(user.solde, Decimal("1000") - Decimal("10.10") * self.donations_per_donor)
+
+
+@skipUnless(connection.vendor == "postgresql", "needs real row-level locking")
+class ConcurrentShardedCloseTests(TransactionTestCase):
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user(phone_number="+22221000000", password="secret")
+        self.donor = CustomUser.objects.create_user(phone_number="+22222000000", password="secret")
+
+    def test_close_is_not_raced_by_sharded_donations(self):
+        fund = make_fund(self.owner)
+        set_shard_count(fund.pk, 4)
+        closing, release = threading.Event(), threading.Event()
+        outcome = []
+
+        def close():
+            try:
+                with transaction.atomic():
+                    Fund.objects.filter(pk=fund.pk, status=FundStatus.OPEN).update(status=FundStatus.CLOSED)
+                    closing.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        def give():
+            try:
+                outcome.append(donate(self.donor, fund.pk, Decimal("10")))
+            except Exception as exc:
+                outcome.append(exc)
+            finally:
+                connection.close()
+
+        closer, donation = threading.Thread(target=close), threading.Thread(target=give)
+        closer.start()
+        closing.wait(10)
+        donation.start()
+        try:
+            # The donation waits for the close instead of reading the row as it was
+            donation.join(0.5)
+            self.assertTrue(donation.is_alive())
+        finally:
+            release.set()
+            closer.join()
+            donation.join()
+
+        self.assertIsInstance(outcome[0], FundNotAvailable)
+        self.assertFalse(Transaction.objects.filter(cagnotte=fund).exists())
+        self.assertEqual(fold_counter_shards(fund.pk), 0)
+
+    def test_donations_crossing_the_target_together(self):
+        fund = make_fund(self.owner, target_amount=Decimal("100.00"))
+        set_shard_count(fund.pk, 8)
+        donors = [CustomUser.objects.create(phone_number=f"+2222300{i:04d}") for i in range(16)]
+
+        def give(index):
+            try:
+                return donate(donors[index % len(donors)], fund.pk, Decimal("10"))
+            except FundNotAvailable:
+                return None
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            accepted = [donation for donation in pool.map(give, range(40)) if donation]
+
+        # Closed without waiting for a fold; only donations in flight at the crossing overshoot
+        fund.refresh_from_db()
+        self.assertEqual(fund.status, FundStatus.CLOSED)
+        self.assertGreaterEqual(len(accepted), 10)
+        self.assertLess(len(accepted), 10 + 16)
+        self.assertEqual(counters.current_totals(fund.pk)[0], Decimal("10") * len(accepted))
+
+    def test_target_reached_while_a_donation_holds_the_fund(self):
+        fund = make_fund(self.owner, target_amount=Decimal("100.00"))
+        set_shard_count(fund.pk, 2)
+        donate(self.donor, fund.pk, Decimal("90"))
+        crosser, latecomer = (CustomUser.objects.create(phone_number=f"+2222500000{i}") for i in range(2))
+        locked, release = threading.Event(), threading.Event()
+        outcome = {}
+
+        def in_flight():
+            # A sharded donation between its FOR SHARE lock and its slot UPDATE
+            try:
+                with transaction.atomic():
+                    shard_count = counters.lock_open_fund(fund.pk, timezone.now().date())
+                    locked.set()
+                    release.wait(10)
+                    counters.add_donation(fund.pk, shard_count, Decimal("5"))
+            finally:
+                connection.close()
+
+        def cross():
+            try:
+                outcome["crossing"] = donate(crosser, fund.pk, Decimal("20"))
+            finally:
+                connection.close()
+
+        holder, crossing = threading.Thread(target=in_flight), threading.Thread(target=cross)
+        holder.start()
+        locked.wait(10)
+        crossing.start()
+        try:
+            # Its close skipped the share-locked row; it commits, then waits to close
+            for _ in range(100):
+                if Transaction.objects.filter(user=crosser).exists():
+                    break
+                crossing.join(0.05)
+            self.assertTrue(Transaction.objects.filter(user=crosser).exists())
+            self.assertEqual(Fund.objects.get(pk=fund.pk).status, FundStatus.OPEN)
+            with self.assertRaises(FundNotAvailable):
+                donate(latecomer, fund.pk, Decimal("10"))
+        finally:
+            release.set()
+            holder.join()
+            crossing.join()
+
+        self.assertIn("crossing", outcome)
+        fund.refresh_from_db()
+        self.assertEqual(fund.status, FundStatus.CLOSED)
+        self.assertEqual(counters.current_totals(fund.pk)[0], Decimal("115.00"))
+
+
+@skipUnless(connection.vendor == "postgresql", "needs real row-level locking")
+class ConcurrentShardedFoldTests(TransactionTestCase):
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user(phone_number="+22221000000", password="secret")
+        self.donors = [CustomUser.objects.create(phone_number=f"+2222400{i:04d}") for i in range(16)]
+
+    def test_fold_waits_for_a_donation_holding_the_fund(self):
+        fund = make_fund(self.owner)
+        set_shard_count(fund.pk, 1)
+        donate(self.donors[0], fund.pk, Decimal("10"))
+        locked, release = threading.Event(), threading.Event()
+        errors = []
+
+        def give():
+            # A sharded donation between its FOR SHARE lock and its slot UPDATE
+            try:
+                with transaction.atomic():
+                    shard_count = counters.lock_open_fund(fund.pk, timezone.now().date())
+                    locked.set()
+                    release.wait(10)
+                    counters.add_donation(fund.pk, shard_count, Decimal("10"))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        def fold():
+            try:
+                fold_counter_shards(fund.pk)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        donation, folder = threading.Thread(target=give), threading.Thread(target=fold)
+        donation.start()
+        locked.wait(10)
+        folder.start()
+        try:
+            folder.join(0.5)
+            self.assertTrue(folder.is_alive())
+        finally:
+            release.set()
+            donation.join()
+            folder.join()
+
+        self.assertEqual(errors, [])
+        fold_counter_shards(fund.pk)
+        fund.refresh_from_db()
+        self.assertEqual((fund.current_amount, fund.total_participants), (Decimal("20.00"), 2))
+
+    def test_folds_during_sharded_donations(self):
+        fund = make_fund(self.owner, target_amount=Decimal("99999999.00"))
+        set_shard_count(fund.pk, 8)
+        done, folds = threading.Event(), []
+
+        def give(index):
+            try:
+                return donate(self.donors[index % len(self.donors)], fund.pk, Decimal("10"))
+            finally:
+                connection.close()
+
+        def fold():
+            try:
+                while not done.is_set():
+                    folds.append(fold_counter_shards(fund.pk))
+            finally:
+                connection.close()
+
+        folder = threading.Thread(target=fold)
+        folder.start()
+        try:
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                accepted = list(pool.map(give, range(160)))
+        finally:
+            done.set()
+            folder.join()
+
+        fold_counter_shards(fund.pk)
+        fund.refresh_from_db()
+        self.assertEqual(len(accepted), 160)
+        self.assertTrue(any(folds))
+        self.assertEqual((fund.current_amount, fund.total_participants), (Decimal("1600.00"), 160))
+
+
+@skipUnless(connection.vendor == "postgresql", "needs real row-level locking")
+class ConcurrentExpiryTests(TransactionTestCase):
+    def test_locked_funds_are_skipped_not_waited_for(self):
+        owner = CustomUser.objects.create_user(phone_number="+22220000001", password="secret")
+        funds = [make_fund(owner, deadline=timezone.now().date() - timedelta(days=1)) for _ in range(3)]
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    Fund.objects.select_for_update().get(pk=funds[0].pk)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        locked.wait(10)
+        try:
+            closed = close_expired_batch()
+        finally:
+            release.set()
+            holder.join()
+
+        self.assertEqual(sorted(closed), sorted(fund.pk for fund in funds[1:]))
+        self.assertEqual(close_expired_batch(), [funds[0].pk])
@@ -1,12 +1,18 @@
 from django.urls import path
-from .views import DonateAPIView, FundListCreateAPIView, FundRetrieveUpdateDestroyAPIView, CloseFundAPIView
+from .views import DonateAPIView, DonateBatchAPIView, FundListCreateAPIView, FundRetrieveUpdateDestroyAPIView, CloseFundAPIView, FundCacheStatsAPIView, FundSearchAPIView, FundStatsAPIView, FundTopDonorsAPIView, FundTrendingAPIView
 
 urlpatterns = [
     path("cagnottes/", FundListCreateAPIView.as_view(), name="cagnotte-list-create"),
+    path("cagnottes/search/", FundSearchAPIView.as_view(), name="cagnotte-search"),
+    path("cagnottes/trending/", FundTrendingAPIView.as_view(), name="cagnotte-trending"),
     path("cagnottes/<str:pk>/", FundRetrieveUpdateDestroyAPIView.as_view(), name="cagnotte-detail"),
     path("cagnottes/<str:pk>/close/", CloseFundAPIView.as_view(), name="cagnotte-close"),
+    path("cagnottes/<str:pk>/stats/", FundStatsAPIView.as_view(), name="cagnotte-stats"),
+    path("cagnottes/<str:pk>/top-donors/", FundTopDonorsAPIView.as_view(), name="cagnotte-top-donors"),
     # path("cagnottes/<str:pk>/open/", OpenFundAPIView.as_view(), name="cagnotte-open"),
 
     path("donate/", DonateAPIView.as_view(), name="donate"),
+    path("donate/batch/", DonateBatchAPIView.as_view(), name="donate-batch"),
+    path("cagnottes-cache/stats/", FundCacheStatsAPIView.as_view(), name="cagnotte-cache-stats"),
 
 ]
\ No newline at end of file
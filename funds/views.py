@@ -1,11 +1,42 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from transactions.models import Transaction
+from idempotency.mixins import IdempotentMixin
+from outbox import services as outbox
+from outbox.models import OutboxEvent
 from transactions.serializers import TransactionSerializer
-from .models import Fund
-from .serializers import FundSerializer
-from decimal import Decimal
+from . import cache as fund_cache
+from .cache import cached_list_payload, cached_payload, invalidate_funds
+from .counters import current_totals
+from .models import Fund, FundDailyStats, FundDonor, FundStats, FundStatus
+from .search import MAX_QUERY_LENGTH, ORDERING as SEARCH_ORDERING, search_funds
+from .serializers import (
+    FundDailyStatsSerializer, FundDonorSerializer, FundSerializer, FundStatsSerializer, TrendingFundSerializer,
+)
+from .services import MAX_BATCH_SIZE, BatchRejected, DonationError, clean_amount, donate, donate_batch
+
+
+def fund_list_queryset(request):
+    """Cagnottes listed for `request`, honouring ?status= and ?expand=."""
+    queryset = FundSerializer.setup_queryset(Fund.objects.all(), request)
+    status_filter = request.query_params.get("status")
+    if status_filter:
+        queryset = queryset.filter(status=status_filter.lower())
+    return queryset
+
+
+def fund_detail_payloads(fund_ids):
+    """Plain detail payloads of the given cagnottes by id, as GET /api/cagnottes/{id} serves them."""
+    payloads = {}
+    for cagnotte in Fund.objects.filter(pk__in=fund_ids):
+        if cagnotte.shard_count:
+            cagnotte.current_amount, cagnotte.total_participants = current_totals(cagnotte.pk)
+        payloads[cagnotte.pk] = FundSerializer(cagnotte).data
+    return payloads
 
 
 class FundListCreateAPIView(generics.ListCreateAPIView):
@@ -17,14 +48,94 @@ class FundListCreateAPIView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        queryset = Fund.objects.all()
-        status_filter = self.request.query_params.get("status")
-        if status_filter:
-            queryset = queryset.filter(status=status_filter.upper())
-        return queryset
+        return fund_list_queryset(self.request)
+
+    def list(self, request, *args, **kwargs):
+        def build():
+            return super(FundListCreateAPIView, self).list(request, *args, **kwargs).data
+        return Response(cached_list_payload(fund_cache.list_keys(request), build, fund_detail_payloads))
 
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        with transaction.atomic():
+            fund = serializer.save(owner_id=self.request.user.pk)
+            outbox.emit(OutboxEvent.FUND_CREATED, fund.pk, outbox.fund_payload(fund))
+
+
+class FundSearchAPIView(generics.ListAPIView):
+    """
+    GET ?q=: cagnottes whose name or description matches q, best match
+    first (also honours ?status= and ?expand=).
+    """
+    serializer_class = FundSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = SEARCH_ORDERING
+
+    def get_queryset(self):
+        query = self.request.query_params.get("q", "").strip()
+        if not query or len(query) > MAX_QUERY_LENGTH:
+            raise ValidationError({"q": f"Must be between 1 and {MAX_QUERY_LENGTH} characters."})
+        return search_funds(fund_list_queryset(self.request), query)
+
+    def list(self, request, *args, **kwargs):
+        def build():
+            return super(FundSearchAPIView, self).list(request, *args, **kwargs).data
+        return Response(cached_list_payload(fund_cache.list_keys(request), build, fund_detail_payloads))
+
+
+def top_limit(request, default=10, maximum=50):
+    """?limit= of a top-k endpoint."""
+    try:
+        limit = int(request.query_params.get("limit", default))
+    except ValueError:
+        raise ValidationError({"limit": "Must be an integer."})
+    return min(max(limit, 1), maximum)
+
+
+class FundTrendingAPIView(generics.ListAPIView):
+    """
+    GET /api/cagnottes/trending -> open cagnottes with the most recent
+    donations, best first (?limit=, 10 by default, at most 50).
+    """
+    serializer_class = TrendingFundSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        queryset = TrendingFundSerializer.setup_queryset(Fund.objects.all(), self.request)
+        return (
+            queryset.filter(status=FundStatus.OPEN, stats__trending_score__isnull=False)
+            .annotate(trending_score=F("stats__trending_score"))
+            .order_by("-trending_score")[:top_limit(self.request)]
+        )
+
+    def list(self, request, *args, **kwargs):
+        def build():
+            return super(FundTrendingAPIView, self).list(request, *args, **kwargs).data
+        return Response(cached_list_payload(fund_cache.list_keys(request), build, fund_detail_payloads))
+
+
+class FundTopDonorsAPIView(generics.ListAPIView):
+    """
+    GET /api/cagnottes/{id}/top-donors -> the users who gave the most to a
+    cagnotte (?limit=, 10 by default, at most 50).
+    """
+    serializer_class = FundDonorSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        return (
+            FundDonor.objects.filter(fund_id=self.kwargs["pk"])
+            .select_related("user")
+            .only("donations", "total_amount", "last_donation_at", "fund_id", "user__id", "user__name")
+            .order_by("-total_amount", "pk")[:top_limit(self.request)]
+        )
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if not response.data and not Fund.objects.filter(pk=kwargs["pk"]).exists():
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return response
 
 
 class FundRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
@@ -35,12 +146,26 @@ class FundRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
     """
     serializer_class = FundSerializer
     permission_classes = [permissions.IsAuthenticated]
-    queryset = Fund.objects.all()
+
+    def get_queryset(self):
+        return FundSerializer.setup_queryset(Fund.objects.all(), self.request)
+
+    def get_object(self):
+        cagnotte = super().get_object()
+        # Add the pending sharded counters; fold_fund_counters writes them back
+        if cagnotte.shard_count:
+            cagnotte.current_amount, cagnotte.total_participants = current_totals(cagnotte.pk)
+        return cagnotte
+
+    def retrieve(self, request, *args, **kwargs):
+        def build():
+            return super(FundRetrieveUpdateDestroyAPIView, self).retrieve(request, *args, **kwargs).data
+        return Response(cached_payload(fund_cache.detail_keys(kwargs["pk"], request), build))
 
     def update(self, request, *args, **kwargs):
         cagnotte = self.get_object()
         # Ensure only the owner can update
-        if cagnotte.owner != request.user:
+        if cagnotte.owner_id != request.user.pk:
             return Response(
                 {"detail": "Only the owner can update this cagnotte."},
                 status=status.HTTP_403_FORBIDDEN
@@ -55,7 +180,7 @@ class FundRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
 
     def destroy(self, request, *args, **kwargs):
         cagnotte = self.get_object()
-        if cagnotte.owner != request.user:
+        if cagnotte.owner_id != request.user.pk:
             return Response(
                 {"detail": "Only the owner can delete this cagnotte."},
                 status=status.HTTP_403_FORBIDDEN
@@ -67,8 +192,13 @@ class FundRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
             )
         return super().destroy(request, *args, **kwargs)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            outbox.emit(OutboxEvent.FUND_DELETED, instance.pk, outbox.fund_payload(instance))
+            instance.delete()
+
 
-class DonateAPIView(APIView):
+class DonateAPIView(IdempotentMixin, APIView):
     """
     POST /api/donate -> user donates to a cagnotte
     {
@@ -76,65 +206,103 @@ class DonateAPIView(APIView):
       "amount": 50.00,
       "note": "Happy Birthday!"
     }
+    Retries sent with the same Idempotency-Key header get the first response back.
     """
     permission_classes = [permissions.IsAuthenticated]
+    idempotency_scope = "donate"
 
     def post(self, request):
-        user = request.user
         cagnotte_id = request.data.get("cagnotte_id")
-        amount = request.data.get("amount", 0)
         note = request.data.get("note", "")
-        
+
         # Basic validations
         if not cagnotte_id:
             return Response({"detail": "cagnotte_id is required"}, status=400)
-        if Decimal(amount) < 5:
-            return Response({"detail": "Minimum donation is 5 MRU"}, status=400)
-        
         try:
-            cagnotte = Fund.objects.get(pk=cagnotte_id, status="open")
-        except Fund.DoesNotExist:
-            return Response({"detail": "Fund not found or not Open"}, status=404)
-        
-        # Check user solde
-        if user.solde < Decimal(amount):
-            return Response({"detail": "Insufficient funds"}, status=400)
-        
-        # Convert amount to Decimal
-        amount_decimal = Decimal(str(amount))
-
-        # Calculate tax (1% example) and total amount
-        tax = amount_decimal * Decimal('0.01')
-        total_amount = amount_decimal + tax
-        
-        # Deduct from user solde
-        user.solde -= total_amount
-        user.save()
-        
-        # Update cagnotte
-        cagnotte.current_amount += Decimal(amount)
-        cagnotte.total_participants += 1
-        cagnotte.save()
-
-        # Check if we reached or exceeded the target
-        if cagnotte.current_amount >= cagnotte.target_amount:
-            cagnotte.status = "close"
-
-        cagnotte.save()
-        
-        # Create transaction record
-        transaction = Transaction.objects.create(
-            user=user,
-            cagnotte=cagnotte,
-            amount=amount,
-            note=note,
-            tax=tax
-        )
-        
-        serializer = TransactionSerializer(transaction)
+            amount = clean_amount(request.data.get("amount", 0))
+        except DonationError as exc:
+            return Response({"detail": exc.detail}, status=exc.status_code)
+
+        # Debit, credit and transaction record are applied atomically
+        try:
+            donation = donate(request.user, cagnotte_id, amount, note)
+        except DonationError as exc:
+            return Response({"detail": exc.detail}, status=exc.status_code)
+
+        serializer = TransactionSerializer(donation)
         return Response(serializer.data, status=201)
 
 
+class DonateBatchAPIView(IdempotentMixin, APIView):
+    """
+    POST /api/donate/batch -> user donates to several cagnottes at once
+    {
+      "items": [
+        {"cagnotte_id": "uuid", "amount": 50.00, "note": "Happy Birthday!"},
+        ...
+      ],
+      "partial": false
+    }
+    By default the batch is all-or-nothing. With "partial": true failing
+    items are skipped and reported in their result instead.
+    Supports the Idempotency-Key header like /api/donate.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    idempotency_scope = "donate-batch"
+
+    def post(self, request):
+        items = request.data.get("items")
+        partial = request.data.get("partial") in (True, "true", "1")
+        if not isinstance(items, list) or not items:
+            return Response({"detail": "items must be a non-empty list"}, status=400)
+        if len(items) > MAX_BATCH_SIZE:
+            return Response({"detail": f"A batch holds at most {MAX_BATCH_SIZE} items"}, status=400)
+
+        # Item validation happens before anything is locked
+        results, cleaned = [None] * len(items), []
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, dict) or not item.get("cagnotte_id"):
+                    raise DonationError("cagnotte_id is required")
+                cleaned.append((index, {
+                    "cagnotte_id": str(item["cagnotte_id"]),
+                    "amount": clean_amount(item.get("amount", 0)),
+                    "note": item.get("note", ""),
+                }))
+            except DonationError as exc:
+                results[index] = exc
+
+        errors = {index: error for index, error in enumerate(results) if error is not None}
+        if errors and not partial:
+            return self.rejected(errors)
+        try:
+            outcomes = donate_batch(request.user, [item for _, item in cleaned], partial=partial) if cleaned else []
+        except BatchRejected as exc:
+            # donate_batch() indexes refer to the cleaned items
+            return self.rejected({cleaned[i][0]: error for i, error in exc.errors.items()})
+        except DonationError as exc:
+            return Response({"detail": exc.detail}, status=exc.status_code)
+
+        for (index, _), outcome in zip(cleaned, outcomes):
+            results[index] = outcome
+
+        created = 0
+        payload = []
+        for index, outcome in enumerate(results):
+            if isinstance(outcome, DonationError):
+                payload.append({"index": index, "status": outcome.status_code, "detail": outcome.detail})
+            else:
+                created += 1
+                payload.append({"index": index, "status": 201, "transaction": TransactionSerializer(outcome).data})
+        return Response({"created": created, "results": payload}, status=201 if created else 400)
+
+    def rejected(self, errors):
+        return Response({
+            "detail": BatchRejected.default_detail,
+            "errors": [{"index": index, "detail": error.detail} for index, error in sorted(errors.items())],
+        }, status=400)
+
+
 class CloseFundAPIView(generics.UpdateAPIView):
     """
     PUT /api/cagnottes/{id}/close -> Closes the cagnotte if you're the owner.
@@ -145,23 +313,66 @@ class CloseFundAPIView(generics.UpdateAPIView):
 
     def update(self, request, *args, **kwargs):
         cagnotte = self.get_object()
-        if cagnotte.owner != request.user:
+        if cagnotte.owner_id != request.user.pk:
             return Response(
                 {"detail": "Only the owner can close this cagnotte."},
                 status=status.HTTP_403_FORBIDDEN
             )
-        if cagnotte.status != "open":
+        # Conditional UPDATE of the status alone: a concurrent close or the
+        # donation reaching the target cannot be overwritten. The
+        # outbox_fund_closed trigger records the fund.closed event.
+        cagnotte.status, cagnotte.updated_at = FundStatus.CLOSED, timezone.now().date()
+        closed = Fund.objects.filter(pk=cagnotte.pk, status=FundStatus.OPEN).update(
+            status=cagnotte.status,
+            updated_at=cagnotte.updated_at,
+        )
+        if not closed:
             return Response(
                 {"detail": "Fund is already closed."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        # Mark as CLOSED
-        cagnotte.status = "closed"
-        cagnotte.save()
+        invalidate_funds(cagnotte.pk, lists=True)
         return Response(
             self.get_serializer(cagnotte).data,
             status=status.HTTP_200_OK
         )
+
+
+class FundStatsAPIView(APIView):
+    """
+    GET /api/cagnottes/{id}/stats -> donation rollup of a cagnotte
+    (?days=N adds the last N daily buckets, 30 by default, at most 366)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        try:
+            days = min(max(int(request.query_params.get("days", 30)), 0), 366)
+        except ValueError:
+            return Response({"detail": "days must be an integer"}, status=400)
+
+        stats = FundStats.objects.filter(fund_id=pk).first()
+        if stats is None:
+            if not Fund.objects.filter(pk=pk).exists():
+                return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+            stats = FundStats(fund_id=pk)
+
+        data = FundStatsSerializer(stats).data
+        daily = []
+        if days and stats.donations:
+            daily = FundDailyStats.objects.filter(fund_id=pk).order_by("-day")[:days]
+        data["daily"] = FundDailyStatsSerializer(daily, many=True).data
+        return Response(data)
+
+
+class FundCacheStatsAPIView(APIView):
+    """
+    GET /api/cagnottes-cache/stats -> hit/miss counters of the fund cache (this worker only).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(fund_cache.stats.as_dict())
     
 
 # class OpenFundAPIView(generics.UpdateAPIView):
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from idempotency.mixins import key_ttl
+from idempotency.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete Idempotency-Key rows older than IDEMPOTENCY_KEY_TTL_HOURS (run periodically)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - key_ttl()
+        deleted = 0
+        # Small batches keep each DELETE short next to live donations.
+        while True:
+            ids = list(
+                IdempotencyKey.objects.filter(created_at__lt=cutoff)
+                .values_list("pk", flat=True)[:options["batch_size"]]
+            )
+            if not ids:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(f"Deleted {deleted} expired idempotency key(s)")
@@ -0,0 +1,118 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from rest_framework import exceptions, status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+class IdempotencyKeyReused(exceptions.APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used with a different request."
+    default_code = "idempotency_key_reused"
+
+
+class _Replay(Exception):
+    def __init__(self, record):
+        self.record = record
+
+
+def key_ttl():
+    return timedelta(hours=getattr(settings, "IDEMPOTENCY_KEY_TTL_HOURS", 24))
+
+
+class IdempotentMixin:
+    """
+    Make POST on an APIView safe to retry with an Idempotency-Key header.
+
+    The first request with a key claims it by inserting its IdempotencyKey
+    row, and runs in one database transaction with the row update that
+    stores its response. A retry gets the stored response back without
+    running the view again. A concurrent duplicate blocks on the unique
+    (scope, key) index until the first request commits, then replays its
+    response; if the first one rolls back, the duplicate runs instead.
+
+    Only 2xx responses are stored: after an error the request is rolled
+    back with its claim, and a retry runs again, e.g. once the balance is
+    topped up. Requests without the header behave as before.
+
+    Keys are scoped per user. Anonymous clients (registration) cannot be
+    told apart, so their keys are scoped by the request body too: a key
+    another client already used with a different body just runs.
+    """
+    idempotency_scope = None
+
+    def get_idempotency_scope(self, request, fingerprint):
+        if request.user.is_authenticated:
+            return f"{self.idempotency_scope}:{request.user.pk}"
+        return f"{self.idempotency_scope}:{fingerprint[:32]}"
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != "POST" or HEADER not in request.headers:
+            return super().dispatch(request, *args, **kwargs)
+        with transaction.atomic():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.idempotency_record = None
+        key = request.headers.get(HEADER)
+        if request.method != "POST" or key is None:
+            return
+        if not key or len(key) > 255:
+            raise exceptions.ValidationError({HEADER: "Must be between 1 and 255 characters."})
+
+        # Keyed hash of the parsed body: key order and whitespace do not matter,
+        # and the stored fingerprint does not reveal passwords.
+        payload = json.dumps([request.path, request.data], sort_keys=True, default=str)
+        fingerprint = salted_hmac("idempotency", payload, algorithm="sha256").hexdigest()
+        scope = self.get_idempotency_scope(request, fingerprint)
+
+        record = self.claim(scope, key, fingerprint)
+        if record.fingerprint != fingerprint:
+            raise IdempotencyKeyReused()
+        if record.status_code is not None:
+            raise _Replay(record)
+        self.idempotency_record = record
+
+    def claim(self, scope, key, fingerprint):
+        """Return the committed row of an earlier request with `key`, or insert ours."""
+        for _ in range(2):
+            record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+            if record is not None:
+                if record.created_at > timezone.now() - key_ttl():
+                    return record
+                record.delete()  # expired: the key can be used again
+            try:
+                with transaction.atomic():
+                    return IdempotencyKey.objects.create(scope=scope, key=key, fingerprint=fingerprint)
+            except IntegrityError:
+                pass  # a concurrent request committed the key first: replay it
+        raise exceptions.APIException("Could not claim the Idempotency-Key, try again.")
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _Replay):
+            response = Response(exc.record.response, status=exc.record.status_code)
+            response["Idempotent-Replayed"] = "true"
+            return response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        record = getattr(self, "idempotency_record", None)
+        if record is not None:
+            self.idempotency_record = None
+            if not status.is_success(response.status_code):
+                transaction.set_rollback(True)  # release the key for a retry
+            else:
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=["status_code", "response"])
+        return response
@@ -0,0 +1,30 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored outcome of a POST sent with an Idempotency-Key header.
+
+    Rows are only ever committed together with the effects of the request,
+    see IdempotentMixin; there is no "in progress" state to clean up.
+    """
+    scope = models.CharField(max_length=64)  # endpoint, and the user for authenticated ones
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)  # set before the claim commits
+    response = models.JSONField(encoder=DjangoJSONEncoder, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key"], name="idempotency_scope_key_uniq"),
+        ]
+        indexes = [
+            # Expiry purge
+            models.Index(fields=["created_at"], name="idempotency_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} -> {self.status_code}"
@@ -0,0 +1,160 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from elkiss_project.testing import make_fund
+from transactions.models import Transaction
+from users.models import CustomUser
+from .models import IdempotencyKey
+
+BIG_TARGET = Decimal("99999.00")
+
+
+class IdempotentDonateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.donor = CustomUser.objects.create_user(phone_number="+22240000001", password="secret")
+        self.fund = make_fund(self.donor, target_amount=BIG_TARGET)
+        self.client = APIClient()
+        self.client.force_authenticate(self.donor)
+
+    def donate(self, key, amount="100.00", client=None):
+        return (client or self.client).post(
+            reverse("donate"), {"cagnotte_id": self.fund.pk, "amount": amount},
+            format="json", HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.donate("k-1")
+        retry = self.donate("k-1")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.donor.refresh_from_db()
+        self.assertEqual(self.donor.solde, Decimal("899.00"))
+
+    def test_replay_touches_no_fund_rows(self):
+        self.donate("k-1")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.donate("k-1")
+
+        statements = [query["sql"] for query in queries if "SAVEPOINT" not in query["sql"]]
+        self.assertEqual(len(statements), 1)
+        self.assertIn("idempotency_idempotencykey", statements[0])
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.donate("k-1")
+
+        response = self.donate("k-1", amount="50.00")
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        other = CustomUser.objects.create_user(phone_number="+22240000002", password="secret")
+        client = APIClient()
+        client.force_authenticate(other)
+
+        self.donate("k-1")
+        self.donate("k-1", client=client)
+
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_errors_are_not_replayed(self):
+        self.assertEqual(self.donate("k-1", amount="5000.00").status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        CustomUser.objects.filter(pk=self.donor.pk).update(solde=Decimal("10000"))
+
+        self.assertEqual(self.donate("k-1", amount="5000.00").status_code, 201)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_without_key_every_request_runs(self):
+        self.client.post(reverse("donate"), {"cagnotte_id": self.fund.pk, "amount": "10"}, format="json")
+        self.client.post(reverse("donate"), {"cagnotte_id": self.fund.pk, "amount": "10"}, format="json")
+
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_expired_keys_are_reusable_and_purged(self):
+        self.donate("k-1")
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.donate("k-2")
+
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+
+        self.assertIn("Deleted 1 ", out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["k-2"])
+        self.assertEqual(self.donate("k-1").status_code, 201)
+        self.assertEqual(Transaction.objects.count(), 3)
+
+
+class IdempotentRegisterTests(TestCase):
+    def test_retried_registration_returns_the_first_response(self):
+        payload = {"phone_number": "+22240000009", "password": "secret1", "confirm_password": "secret1"}
+        client = APIClient()
+
+        first = client.post(reverse("register"), payload, format="json", HTTP_IDEMPOTENCY_KEY="r-1")
+        retry = client.post(reverse("register"), payload, format="json", HTTP_IDEMPOTENCY_KEY="r-1")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(CustomUser.objects.filter(phone_number="+22240000009").count(), 1)
+
+    def test_anonymous_clients_sharing_a_key_do_not_collide(self):
+        client = APIClient()
+        for phone_number in ("+22240000009", "+22240000010"):
+            payload = {"phone_number": phone_number, "password": "secret1", "confirm_password": "secret1"}
+            response = client.post(reverse("register"), payload, format="json", HTTP_IDEMPOTENCY_KEY="1")
+            self.assertEqual(response.status_code, 201)
+            self.assertFalse(response.has_header("Idempotent-Replayed"))
+
+        self.assertEqual(CustomUser.objects.filter(phone_number__in=["+22240000009", "+22240000010"]).count(), 2)
+
+
+@skipUnless(connection.vendor == "postgresql", "needs row-level locking")
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    def test_concurrent_duplicates_run_once(self):
+        donor = CustomUser.objects.create_user(phone_number="+22240000003", password="secret")
+        fund = make_fund(donor, target_amount=BIG_TARGET)
+        duplicates = 8
+        barrier = threading.Barrier(duplicates)
+
+        def worker(_):
+            client = APIClient()
+            client.force_authenticate(donor)
+            barrier.wait()
+            try:
+                return client.post(
+                    reverse("donate"), {"cagnotte_id": fund.pk, "amount": "10"},
+                    format="json", HTTP_IDEMPOTENCY_KEY="same",
+                )
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=duplicates) as pool:
+            responses = list(pool.map(worker, range(duplicates)))
+
+        self.assertEqual({response.status_code for response in responses}, {201})
+        self.assertEqual(len({response.data["id"] for response in responses}), 1)
+        self.assertEqual(sum(response.has_header("Idempotent-Replayed") for response in responses), duplicates - 1)
+        self.assertEqual(Transaction.objects.filter(cagnotte=fund).count(), 1)
+        donor.refresh_from_db()
+        self.assertEqual(donor.solde, Decimal("989.90"))
@@ -0,0 +1,5 @@
+from django.contrib import admin
+from .models import BalanceSnapshot, LedgerEntry
+# Register your models here.
+admin.site.register(LedgerEntry)
+admin.site.register(BalanceSnapshot)
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from ledger.models import LedgerEntry
+from ledger.services import opening_entries, take_snapshots
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Open a ledger account for every user from their current CustomUser.solde, then snapshot it. "
+        "Users that already have entries are skipped. Run it right before setting BALANCE_BACKEND=ledger, "
+        "while donations still go to solde."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        has_entries = LedgerEntry.objects.filter(account_type=LedgerEntry.USER, account_id=OuterRef("pk"))
+        pending = (
+            User.objects.filter(~Exists(has_entries), solde__gt=0)
+            .order_by("pk")
+            .values_list("pk", "solde")
+        )
+        opened = 0
+        last_pk = ""
+        while True:
+            batch = list(pending.filter(pk__gt=last_pk)[:options["batch_size"]])
+            if not batch:
+                break
+            with transaction.atomic():
+                LedgerEntry.objects.bulk_create(
+                    entry for user_id, solde in batch for entry in opening_entries(user_id, solde)
+                )
+            take_snapshots([user_id for user_id, _ in batch])
+            opened += len(batch)
+            last_pk = batch[-1][0]
+        self.stdout.write(f"Opened {opened} ledger account(s)")
@@ -0,0 +1,122 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from funds.models import Fund
+from funds.services import donate
+from ledger.models import LedgerEntry
+from ledger.services import balance, opening_entries, take_snapshots
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare donation throughput with BALANCE_BACKEND=solde and =ledger, and the cost of a ledger "
+        "balance read against the length of its entry tail. Creates and removes its own rows; run it "
+        "against a scratch PostgreSQL database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--donors", type=int, default=50)
+        parser.add_argument("--donations", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument(
+            "--row-writers", type=int, default=4,
+            help="Threads that keep updating donor rows (profile edits, logins) in the second round",
+        )
+
+    def handle(self, *args, **options):
+        prefix = f"+bench{int(time.time()) % 100000:05d}"
+        first_entry = (LedgerEntry.objects.order_by("-pk").values_list("pk", flat=True).first() or 0) + 1
+        owner = User.objects.create(phone_number=f"{prefix}0000")
+        donors = User.objects.bulk_create(
+            User(phone_number=f"{prefix}{i + 1:04d}", solde=Decimal("99999999"))
+            for i in range(options["donors"])
+        )
+        LedgerEntry.objects.bulk_create(
+            entry for donor in donors for entry in opening_entries(donor.pk, donor.solde)
+        )
+        funds = Fund.objects.bulk_create(
+            Fund(
+                owner=owner,
+                name=f"Ledger benchmark {i}",
+                phone_beneficiary=0,
+                target_amount=Decimal("99999999"),
+                description="",
+                deadline=timezone.now().date() + timedelta(days=1),
+            )
+            for i in range(10)
+        )
+        try:
+            self.stdout.write(f"{'backend':<8} {'row writers':>11} {'donations/s':>12}")
+            for writers in (0, options["row_writers"]):
+                for backend in ("solde", "ledger"):
+                    with override_settings(BALANCE_BACKEND=backend), self.row_writers(donors, writers):
+                        rate = self.throughput(donors, funds, options["donations"], options["threads"])
+                    self.stdout.write(f"{backend:<8} {writers:>11} {rate:>12.1f}")
+            self.balance_reads(donors[0])
+        finally:
+            LedgerEntry.objects.filter(pk__gte=first_entry).delete()
+            User.objects.filter(pk__in=[owner.pk] + [donor.pk for donor in donors]).delete()
+
+    def throughput(self, donors, funds, count, threads):
+        def worker(index):
+            try:
+                donate(donors[index % len(donors)], funds[index % len(funds)].pk, Decimal("5"))
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, range(count)))
+        return count / (time.perf_counter() - started)
+
+    @contextmanager
+    def row_writers(self, donors, count):
+        stop = threading.Event()
+
+        def writer(offset):
+            try:
+                index = offset
+                while not stop.is_set():
+                    with transaction.atomic():
+                        donor = User.objects.select_for_update().get(pk=donors[index % len(donors)].pk)
+                        donor.name = f"edited {index}"
+                        donor.save(update_fields=["name", "updated_at"])
+                        time.sleep(0.002)  # e.g. a slow request touching the profile
+                    index += count
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer, args=(offset,)) for offset in range(count)]
+        for thread in threads:
+            thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def balance_reads(self, donor):
+        self.stdout.write(f"{'tail':>6} {'balance read ms':>16}")
+        for tail in (0, 10, 100, 1000):
+            take_snapshots([donor.pk])
+            LedgerEntry.objects.bulk_create(
+                LedgerEntry(account_type=LedgerEntry.USER, account_id=donor.pk, amount=Decimal("-1"))
+                for _ in range(tail)
+            )
+            started = time.perf_counter()
+            for _ in range(200):
+                balance(donor.pk)
+            self.stdout.write(f"{tail:>6} {(time.perf_counter() - started) * 1000 / 200:>16.3f}")
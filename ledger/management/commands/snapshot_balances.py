@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Q, Subquery
+
+from ledger.models import BalanceSnapshot, LedgerEntry
+from ledger.services import take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Snapshot the balance of users with a long tail of ledger entries (run periodically)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-tail", type=int, default=20, help="Entries since the last snapshot")
+
+    def handle(self, *args, **options):
+        last_snapshot = BalanceSnapshot.objects.filter(user_id=OuterRef("account_id")).values("last_entry_id")
+        user_ids = (
+            LedgerEntry.objects.filter(account_type=LedgerEntry.USER)
+            .annotate(after=Subquery(last_snapshot))
+            .filter(Q(after__isnull=True) | Q(pk__gt=F("after")))
+            .values("account_id")
+            .annotate(tail=Count("pk"))
+            .filter(tail__gte=options["min_tail"])
+            .values_list("account_id", flat=True)
+        )
+        written = take_snapshots(list(user_ids), min_tail=options["min_tail"])
+        self.stdout.write(f"Wrote {written} balance snapshot(s)")
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='account_id',
+            field=models.CharField(blank=True, max_length=15),
+        ),
+    ]
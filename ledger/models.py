@@ -0,0 +1,56 @@
+from django.db import models
+from django.utils import timezone
+
+from elkiss_project import settings
+from elkiss_project.ids import ID_LENGTH
+
+
+class LedgerEntry(models.Model):
+    """
+    One leg of a double-entry posting. The entries of a posting sum to zero;
+    an account's balance is the sum of its entries. Rows are only inserted.
+    """
+    USER, FUND, FEES, EQUITY = "user", "fund", "fees", "equity"
+    account_choices = (
+        (USER, "User balance"),
+        (FUND, "Cagnotte"),
+        (FEES, "Donation tax"),
+        (EQUITY, "Opening balances"),
+    )
+
+    account_type = models.CharField(max_length=6, choices=account_choices)
+    account_id = models.CharField(max_length=ID_LENGTH, blank=True)  # user or cagnotte id, empty otherwise
+    amount = models.DecimalField(max_digits=12, decimal_places=2)  # positive credits the account
+    transaction = models.ForeignKey(
+        "transactions.Transaction",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="ledger_entries",
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Balance tail: entries of one account after its snapshot
+            models.Index(fields=["account_type", "account_id", "id"], name="ledger_account_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.account_type}:{self.account_id} {self.amount:+}"
+
+
+class BalanceSnapshot(models.Model):
+    """User balance as of entry `last_entry_id`, see ledger.services.balance()."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="balance_snapshot",
+    )
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    last_entry_id = models.BigIntegerField()
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.balance} @ {self.last_entry_id}"
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from users.models import CustomUser
+from .models import LedgerEntry
+from .services import ledger_enabled, opening_entries
+
+
+@receiver(post_save, sender=CustomUser)
+def open_user_account(sender, instance, created, **kwargs):
+    # The signup credit (CustomUser.solde default) becomes the opening entry.
+    if created and ledger_enabled() and instance.solde:
+        LedgerEntry.objects.bulk_create(opening_entries(instance.pk, instance.solde))
@@ -0,0 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from elkiss_project.testing import make_fund
+from funds.services import InsufficientFunds, donate, donate_batch
+from transactions.models import Transaction
+from users.models import CustomUser
+from .models import BalanceSnapshot, LedgerEntry
+from .services import balance, get_balance, take_snapshots
+
+
+@override_settings(BALANCE_BACKEND="ledger")
+class LedgerDonationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.donor = CustomUser.objects.create_user(phone_number="+22250000001", password="secret")
+        self.fund = make_fund(self.donor, target_amount=BIG_TARGET)
+
+    def test_signup_credit_opens_the_account(self):
+        self.assertEqual(balance(self.donor.pk), Decimal("1000.00"))
+        self.assertEqual(LedgerEntry.objects.aggregate(total=Sum("amount"))["total"], 0)
+
+    def test_donation_appends_balanced_entries(self):
+        donation = donate(self.donor, self.fund.pk, Decimal("100"))
+
+        entries = {entry.account_type: entry.amount for entry in donation.ledger_entries.all()}
+        self.assertEqual(entries, {"user": Decimal("-101.00"), "fund": Decimal("100.00"), "fees": Decimal("1.00")})
+        self.assertEqual(balance(self.donor.pk), Decimal("899.00"))
+
+    def test_donation_does_not_write_the_user_row(self):
+        updated_at = self.donor.updated_at
+
+        with CaptureQueriesContext(connection) as queries:
+            donate(self.donor, self.fund.pk, Decimal("100"))
+
+        self.assertFalse([q for q in queries if q["sql"].startswith("UPDATE") and "users_customuser" in q["sql"]])
+        self.donor.refresh_from_db()
+        self.assertEqual(self.donor.updated_at, updated_at)
+        self.assertEqual(self.donor.solde, Decimal("1000.00"))  # the column is no longer maintained
+
+    def test_balance_is_checked_against_the_ledger(self):
+        donate(self.donor, self.fund.pk, Decimal("900"))
+
+        with self.assertRaises(InsufficientFunds):
+            donate(self.donor, self.fund.pk, Decimal("95"))
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_batch_appends_entries_for_every_item(self):
+        other = make_fund(self.donor, target_amount=BIG_TARGET)
+        items = [
+            {"cagnotte_id": self.fund.pk, "amount": Decimal("100"), "note": ""},
+            {"cagnotte_id": other.pk, "amount": Decimal("200"), "note": ""},
+        ]
+
+        donate_batch(self.donor, items)
+
+        self.assertEqual(LedgerEntry.objects.filter(transaction__isnull=False).count(), 6)
+        self.assertEqual(balance(self.donor.pk), Decimal("697.00"))
+
+    def test_snapshot_plus_tail(self):
+        donate(self.donor, self.fund.pk, Decimal("100"))
+        self.assertEqual(take_snapshots([self.donor.pk]), 1)
+        donate(self.donor, self.fund.pk, Decimal("10"))
+
+        snapshot = BalanceSnapshot.objects.get(user=self.donor)
+        self.assertEqual(snapshot.balance, Decimal("899.00"))
+        self.assertEqual(balance(self.donor.pk), Decimal("888.90"))
+        self.assertEqual(take_snapshots([self.donor.pk], min_tail=2), 0)
+
+    def test_get_balance_reads_the_ledger(self):
+        donate(self.donor, self.fund.pk, Decimal("100"))
+
+        self.assertEqual(get_balance(self.donor), Decimal("899.00"))
+
+BIG_TARGET = Decimal("99999.00")
+
+
+class LedgerBackfillTests(TestCase):
+    def test_backfill_opens_accounts_from_solde_once(self):
+        users = [
+            CustomUser.objects.create_user(phone_number=f"+2225100000{i}", password="secret", solde=Decimal(i * 10))
+            for i in range(3)
+        ]
+
+        call_command("backfill_ledger", stdout=StringIO())
+        out = StringIO()
+        call_command("backfill_ledger", stdout=out)
+
+        self.assertIn("Opened 0 ", out.getvalue())
+        for user in users:
+            self.assertEqual(balance(user.pk), user.solde)
+        self.assertEqual(BalanceSnapshot.objects.count(), 2)  # zero balances need no account
+        self.assertEqual(LedgerEntry.objects.aggregate(total=Sum("amount"))["total"], 0)
+
+    def test_snapshot_command_skips_short_tails(self):
+        user = CustomUser.objects.create_user(phone_number="+22251000009", password="secret")
+        call_command("backfill_ledger", stdout=StringIO())
+        with override_settings(BALANCE_BACKEND="ledger"):
+            fund = make_fund(user, target_amount=BIG_TARGET)
+            for _ in range(3):
+                donate(user, fund.pk, Decimal("10"))
+
+        out = StringIO()
+        call_command("snapshot_balances", "--min-tail", "4", stdout=out)
+        self.assertIn("Wrote 0 ", out.getvalue())
+        call_command("snapshot_balances", "--min-tail", "3", stdout=out)
+        self.assertIn("Wrote 1 ", out.getvalue())
+        self.assertEqual(BalanceSnapshot.objects.get(user=user).balance, Decimal("969.70"))
+
+
+@skipUnless(connection.vendor == "postgresql", "needs row-level locking")
+@override_settings(BALANCE_BACKEND="ledger")
+class ConcurrentLedgerTests(TransactionTestCase):
+    def test_parallel_donations_cannot_overspend(self):
+        donor = CustomUser.objects.create_user(phone_number="+22252000001", password="secret", solde=Decimal("100"))
+        fund = make_fund(donor, target_amount=BIG_TARGET)
+
+        def worker(_):
+            try:
+                donate(donor, fund.pk, Decimal("10"))
+                return True
+            except InsufficientFunds:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            succeeded = sum(pool.map(worker, range(20)))
+
+        self.assertEqual(succeeded, 9)  # 9 * 10.10 <= 100 < 10 * 10.10
+        self.assertEqual(balance(donor.pk), Decimal("100") - 9 * Decimal("10.10"))
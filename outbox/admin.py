@@ -0,0 +1,4 @@
+from django.contrib import admin
+from .models import OutboxEvent
+# Register your models here.
+admin.site.register(OutboxEvent)
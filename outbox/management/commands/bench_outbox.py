@@ -0,0 +1,137 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from funds.models import Fund
+from funds.services import donate
+from outbox.models import OutboxEvent
+from outbox.relay import relay_batch, relay_pending
+from outbox.sinks import FileSink, HTTPSink, QueueSink, start_stand_in
+from transactions.models import Transaction
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure outbox relay throughput per sink and batch size, then the delivery lag while "
+        "donations are being made. Needs an empty outbox (it relays everything it finds); creates "
+        "and removes its own rows. PostgreSQL for meaningful numbers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=100_000)
+        parser.add_argument("--batch-sizes", default="100,500,2000")
+        parser.add_argument("--donations", type=int, default=2000, help="Donations made while a relay runs")
+
+    def handle(self, *args, **options):
+        if OutboxEvent.objects.exists():
+            raise CommandError("The outbox is not empty; run this against a scratch database.")
+        server = start_stand_in()
+        directory = tempfile.TemporaryDirectory()
+        sinks = {
+            "queue": QueueSink(),
+            "file": FileSink(os.path.join(directory.name, "events.ndjson")),
+            "http": HTTPSink(f"http://127.0.0.1:{server.server_address[1]}/"),
+        }
+        try:
+            self.stdout.write(f"{'sink':<6} {'batch':>6} {'events/s':>10} {'seconds':>8}")
+            for name, sink in sinks.items():
+                for batch_size in [int(size) for size in options["batch_sizes"].split(",")]:
+                    self.throughput(name, sink, batch_size, options["events"])
+                    while not QueueSink.events.empty():
+                        QueueSink.events.get_nowait()
+            self.live(sinks["http"], options["donations"])
+        finally:
+            server.shutdown()
+            directory.cleanup()
+            OutboxEvent.objects.all().delete()
+
+    def populate(self, count):
+        table = OutboxEvent._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table} (topic, key, payload, created_at)
+                    SELECT %s, 'k' || i, jsonb_build_object('transaction_id', 'k' || i, 'amount', '10.00'), now()
+                    FROM generate_series(1, %s) AS i
+                    """,
+                    [OutboxEvent.DONATION_CREATED, count],
+                )
+                cursor.execute(f"ANALYZE {table}")
+            else:
+                OutboxEvent.objects.bulk_create(
+                    (OutboxEvent(topic=OutboxEvent.DONATION_CREATED, key=f"k{i}", payload={"transaction_id": f"k{i}"})
+                     for i in range(count)),
+                    batch_size=5000,
+                )
+
+    def throughput(self, name, sink, batch_size, count):
+        self.populate(count)
+        started = time.perf_counter()
+        delivered, _, _ = relay_pending(sink, batch_size)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{name:<6} {batch_size:>6} {delivered / elapsed:>10.0f} {elapsed:>8.2f}")
+
+    def live(self, sink, count):
+        prefix = f"+bench{int(time.time()) % 100000:05d}"
+        owner = User.objects.create(phone_number=f"{prefix}0000")
+        donors = [User.objects.create(phone_number=f"{prefix}{i + 1:04d}", solde=Decimal("99999999")) for i in range(20)]
+        fund = Fund.objects.create(
+            owner=owner,
+            name="Outbox benchmark",
+            phone_beneficiary=0,
+            target_amount=Decimal("99999999"),
+            description="",
+            deadline=timezone.now().date() + timedelta(days=1),
+        )
+        # Alone first: the outbox INSERT is part of every donation
+        started = time.perf_counter()
+        for index in range(count):
+            donate(donors[index % len(donors)], fund.pk, Decimal("5"))
+        alone = (time.perf_counter() - started) * 1000 / count
+        relay_pending(sink)
+        done = threading.Event()
+        lags = []
+
+        def relay():
+            try:
+                while True:
+                    delivered, lag = relay_batch(sink, 500)
+                    if delivered:
+                        lags.append(lag)
+                    elif done.is_set():
+                        return
+                    else:
+                        time.sleep(0.05)
+            finally:
+                connection.close()
+
+        relay_thread = threading.Thread(target=relay)
+        relay_thread.start()
+        try:
+            started = time.perf_counter()
+            for index in range(count):
+                donate(donors[index % len(donors)], fund.pk, Decimal("5"))
+            elapsed = time.perf_counter() - started
+        finally:
+            done.set()
+            relay_thread.join()
+            Transaction.objects.filter(cagnotte=fund).delete()
+            User.objects.filter(pk__in=[owner.pk] + [donor.pk for donor in donors]).delete()
+        lags.sort()
+        self.stdout.write(
+            f"donate(): {alone:.2f} ms alone, {elapsed * 1000 / count:.2f} ms with a relay running; "
+            f"{len(lags)} batches, lag p50 {statistics.median(lags) * 1000:.0f} ms, "
+            f"max {lags[-1] * 1000:.0f} ms"
+        )
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from outbox.sinks import start_stand_in
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local HTTP endpoint accepting what relay_outbox --sink http://HOST:PORT/ posts, "
+        "printing the number of events received every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8900)
+        parser.add_argument("--interval", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        server = start_stand_in(options["host"], options["port"])
+        self.stdout.write(f"Listening on http://{options['host']}:{server.server_address[1]}/")
+        try:
+            while True:
+                time.sleep(options["interval"])
+                self.stdout.write(f"{server.received} event(s) received")
+        except KeyboardInterrupt:
+            server.shutdown()
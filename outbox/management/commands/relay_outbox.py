@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from outbox.relay import DEFAULT_BATCH_SIZE, backlog_age, relay_pending
+from outbox.sinks import SinkError, get_sink
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver pending outbox events to a sink (file:PATH, an http:// URL or queue). Run it from "
+        "cron, or with --loop as a worker; several relays can run at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sink", default=settings.OUTBOX_SINK)
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--loop", action="store_true", help="Keep running; sleep --interval seconds when idle")
+        parser.add_argument("--interval", type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        try:
+            sink = get_sink(options["sink"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        while True:
+            started = time.perf_counter()
+            try:
+                delivered, batches, max_lag = relay_pending(sink, options["batch_size"])
+            except SinkError as exc:
+                # The failed batch stays in the outbox and is retried on the next pass
+                if not options["loop"]:
+                    raise CommandError(str(exc))
+                self.stderr.write(str(exc))
+                delivered = 0
+            else:
+                elapsed = time.perf_counter() - started
+                if delivered or not options["loop"]:
+                    self.stdout.write(
+                        f"Delivered {delivered} event(s) in {batches} batch(es), {elapsed * 1000:.1f} ms, "
+                        f"max lag {max_lag * 1000:.0f} ms, backlog age {backlog_age():.1f} s"
+                    )
+            if not options["loop"]:
+                return
+            if not delivered:
+                try:
+                    time.sleep(options["interval"])
+                except KeyboardInterrupt:
+                    return
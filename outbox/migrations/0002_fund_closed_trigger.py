@@ -0,0 +1,84 @@
+from django.db import migrations
+
+# A cagnotte is closed by several conditional UPDATEs (target reached in
+# funds.services and funds.counters, the close view, funds.expiry) that do
+# not read the row back. The trigger records the transition in the same
+# statement, whichever path made it, without an extra round trip.
+TOPIC = "fund.closed"
+
+POSTGRESQL_FORWARD = [
+    f"""
+    CREATE FUNCTION outbox_fund_closed() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO outbox_outboxevent (topic, key, payload, created_at)
+        VALUES ('{TOPIC}', NEW.id, json_build_object(
+            'cagnotte_id', NEW.id,
+            'owner_id', NEW.owner_id,
+            'current_amount', NEW.current_amount::text,
+            'target_amount', NEW.target_amount::text,
+            'total_participants', NEW.total_participants,
+            'deadline', NEW.deadline
+        ), now());
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER outbox_fund_closed_trg
+    AFTER UPDATE OF status ON funds_fund
+    FOR EACH ROW WHEN (OLD.status = 'open' AND NEW.status = 'closed')
+    EXECUTE FUNCTION outbox_fund_closed()
+    """,
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP TRIGGER outbox_fund_closed_trg ON funds_fund",
+    "DROP FUNCTION outbox_fund_closed()",
+]
+
+SQLITE_FORWARD = [
+    f"""
+    CREATE TRIGGER outbox_fund_closed_trg
+    AFTER UPDATE OF status ON funds_fund
+    FOR EACH ROW WHEN OLD.status = 'open' AND NEW.status = 'closed'
+    BEGIN
+        INSERT INTO outbox_outboxevent (topic, key, payload, created_at)
+        VALUES ('{TOPIC}', NEW.id, json_object(
+            'cagnotte_id', NEW.id,
+            'owner_id', NEW.owner_id,
+            'current_amount', printf('%.2f', NEW.current_amount),
+            'target_amount', printf('%.2f', NEW.target_amount),
+            'total_participants', NEW.total_participants,
+            'deadline', NEW.deadline
+        ), strftime('%Y-%m-%d %H:%M:%f', 'now'));
+    END
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER outbox_fund_closed_trg",
+]
+
+
+def add_trigger(apps, schema_editor):
+    statements = {"postgresql": POSTGRESQL_FORWARD, "sqlite": SQLITE_FORWARD}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement, params=None)
+
+
+def remove_trigger(apps, schema_editor):
+    statements = {"postgresql": POSTGRESQL_BACKWARD, "sqlite": SQLITE_BACKWARD}.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('outbox', '0001_initial'),
+        ('funds', '0012_leaderboards'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_trigger, remove_trigger),
+    ]
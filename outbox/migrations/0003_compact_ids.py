@@ -0,0 +1,37 @@
+from importlib import import_module
+
+from django.db import migrations, models
+
+# SQLite rebuilds a table to alter a column. The fund-closed trigger would
+# break the rebuild of outbox_outboxevent and vanish with the one of
+# funds_fund (users.0011 and funds.0013 rebuild it): drop it before them,
+# 0004 creates it again after them.
+trigger = import_module("outbox.migrations.0002_fund_closed_trigger")
+
+
+def drop_sqlite_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in trigger.SQLITE_BACKWARD:
+            schema_editor.execute(statement, params=None)
+
+
+def create_sqlite_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for statement in trigger.SQLITE_FORWARD:
+            schema_editor.execute(statement, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('outbox', '0002_fund_closed_trigger'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_sqlite_trigger, create_sqlite_trigger),
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='key',
+            field=models.CharField(max_length=15),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from importlib import import_module
+
+from django.db import migrations
+
+compact_ids = import_module("outbox.migrations.0003_compact_ids")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('outbox', '0003_compact_ids'),
+        ('users', '0011_compact_ids'),
+        ('funds', '0013_compact_ids'),
+        ('transactions', '0003_compact_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_ids.create_sqlite_trigger, compact_ids.drop_sqlite_trigger),
+    ]
@@ -0,0 +1,41 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+from elkiss_project.ids import ID_LENGTH
+
+
+class OutboxEvent(models.Model):
+    """
+    An event waiting to be delivered to downstream systems.
+
+    Rows are inserted in the transaction that makes the change they
+    describe, so an event exists if and only if the change committed. The
+    relay (outbox.relay) deletes them once a sink has accepted them; the
+    table therefore only holds the backlog.
+
+    The fund.closed event of a cagnotte closed by a donation comes before
+    that donation's donation.created; its payload carries the final totals.
+    """
+    DONATION_CREATED = "donation.created"
+    FUND_CREATED = "fund.created"
+    FUND_CLOSED = "fund.closed"  # inserted by the outbox_fund_closed trigger, see migration 0002
+    FUND_DELETED = "fund.deleted"
+
+    topic = models.CharField(max_length=32)
+    key = models.CharField(max_length=ID_LENGTH)  # id of the cagnotte or transaction the event is about
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.pk} {self.topic} {self.key}"
+
+    def as_message(self):
+        """Wire format handed to the sinks. `id` lets consumers drop redeliveries."""
+        return {
+            "id": self.pk,
+            "topic": self.topic,
+            "key": self.key,
+            "payload": self.payload,
+            "created_at": self.created_at.isoformat(),
+        }
@@ -0,0 +1,54 @@
+"""
+Delivery of outbox events.
+
+A batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, handed to the
+sink and deleted, all in one transaction. If the sink raises or the
+process dies before the commit, the rows are unlocked again and the next
+pass delivers them: delivery is at least once, and consumers drop
+duplicates by message id. Several relays can run at once, each claiming
+different rows; events are delivered in id order within a relay only.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def relay_batch(sink, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Deliver up to `batch_size` events. Returns (delivered, lag): lag is the
+    seconds between the oldest event of the batch and its delivery.
+    """
+    with transaction.atomic():
+        events = list(OutboxEvent.objects.select_for_update(skip_locked=True).order_by("pk")[:batch_size])
+        if not events:
+            return 0, 0.0
+        sink.send([event.as_message() for event in events])
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+    lag = (timezone.now() - min(event.created_at for event in events)).total_seconds()
+    return len(events), lag
+
+
+def relay_pending(sink, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Deliver until the outbox is empty (or only holds rows claimed by other
+    relays); returns (delivered, batches, max_lag).
+    """
+    delivered = batches = 0
+    max_lag = 0.0
+    while True:
+        count, lag = relay_batch(sink, batch_size)
+        if count:
+            delivered += count
+            batches += 1
+            max_lag = max(max_lag, lag)
+        if count < batch_size:
+            return delivered, batches, max_lag
+
+
+def backlog_age():
+    """Seconds since the oldest undelivered event was recorded (0 when empty)."""
+    oldest = OutboxEvent.objects.order_by("pk").values_list("created_at", flat=True).first()
+    return (timezone.now() - oldest).total_seconds() if oldest else 0.0
@@ -0,0 +1,44 @@
+"""
+Transactional outbox.
+
+Writers call emit() / record_donations() inside the transaction of the
+change they describe: the event commits or rolls back with it, so no
+event is lost when the process dies after the commit and none describes
+a change that did not happen. Closures are recorded by a database trigger
+instead (see migration 0002). Delivery is left to outbox.relay.
+"""
+from .models import OutboxEvent
+
+
+def emit(topic, key, payload):
+    """Record one event. Must run inside the transaction making the change."""
+    return OutboxEvent.objects.create(topic=topic, key=key, payload=payload)
+
+
+def record_donations(donations):
+    """One donation.created event per Transaction, in a single INSERT."""
+    OutboxEvent.objects.bulk_create(
+        OutboxEvent(
+            topic=OutboxEvent.DONATION_CREATED,
+            key=donation.pk,
+            payload={
+                "transaction_id": donation.pk,
+                "cagnotte_id": donation.cagnotte_id,
+                "user_id": donation.user_id,
+                "amount": f"{donation.amount:.2f}",
+                "tax": f"{donation.tax:.2f}",
+                "created_at": donation.created_at,
+            },
+        )
+        for donation in donations
+    )
+
+
+def fund_payload(fund):
+    return {
+        "cagnotte_id": fund.pk,
+        "owner_id": fund.owner_id,
+        "name": fund.name,
+        "target_amount": f"{fund.target_amount:.2f}",
+        "deadline": fund.deadline,
+    }
@@ -0,0 +1,107 @@
+"""
+Destinations of the outbox relay.
+
+A sink receives a batch of messages (OutboxEvent.as_message()) and either
+returns once the whole batch is durably accepted or raises; the relay only
+deletes the events after send() returned. Build one from a spec string
+with get_sink():
+
+    file:/var/spool/elkiss/events.ndjson   append newline-delimited JSON
+    http://127.0.0.1:8900/events           POST the batch as a JSON array
+    queue                                  in-process queue (tests, benchmarks)
+"""
+import json
+import os
+import queue
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class SinkError(Exception):
+    """The sink did not accept the batch; it will be delivered again."""
+
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, messages):
+        data = "".join(json.dumps(message, cls=DjangoJSONEncoder) + "\n" for message in messages)
+        try:
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(data)
+                handle.flush()
+                # Durable before the relay deletes the rows
+                os.fsync(handle.fileno())
+        except OSError as exc:  # full disk, no permission, missing directory
+            raise SinkError(f"Appending to {self.path} failed: {exc}") from exc
+
+
+class HTTPSink:
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, messages):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(messages, cls=DjangoJSONEncoder).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except OSError as exc:  # URLError and HTTPError (non-2xx) included
+            raise SinkError(f"POST {self.url} failed: {exc}") from exc
+
+
+class QueueSink:
+    """Hands messages to consumers in the same process through `events`."""
+    events = queue.Queue()
+
+    def send(self, messages):
+        for message in messages:
+            self.events.put(message)
+
+
+def get_sink(spec):
+    if spec == "queue":
+        return QueueSink()
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):])
+    if spec.startswith(("http://", "https://")):
+        return HTTPSink(spec)
+    raise ValueError(f"Unknown outbox sink {spec!r}")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Receiving end of HTTPSink: accepts JSON arrays and counts the events."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            received = len(json.loads(body))
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+        with self.server.lock:
+            self.server.received += received
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in(host="127.0.0.1", port=0):
+    """Serve StandInHandler on a daemon thread; returns the server (server.received counts events)."""
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.received = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,234 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from elkiss_project.testing import make_fund
+from funds.expiry import close_expired_batch
+from funds.models import Fund
+from funds.services import InsufficientFunds, donate, donate_batch
+from users.models import CustomUser
+from .models import OutboxEvent
+from .relay import relay_batch, relay_pending
+from .sinks import FileSink, HTTPSink, QueueSink, SinkError, get_sink, start_stand_in
+
+
+class ListSink:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def send(self, messages):
+        if self.fail:
+            raise SinkError("unavailable")
+        self.batches.append(messages)
+
+
+def topics():
+    return list(OutboxEvent.objects.order_by("pk").values_list("topic", "key"))
+
+
+class OutboxEventTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user(phone_number="+22260000001", password="secret")
+        self.donor = CustomUser.objects.create_user(phone_number="+22260000002", password="secret")
+        self.fund = make_fund(self.owner, target_amount=Decimal("500.00"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_donation_records_event(self):
+        donation = donate(self.donor, self.fund.pk, Decimal("10"))
+
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.topic, event.key), (OutboxEvent.DONATION_CREATED, donation.pk))
+        self.assertEqual(event.payload["cagnotte_id"], self.fund.pk)
+        self.assertEqual(event.payload["user_id"], self.donor.pk)
+        self.assertEqual((event.payload["amount"], event.payload["tax"]), ("10.00", "0.10"))
+
+    def test_failed_donation_records_nothing(self):
+        with self.assertRaises(InsufficientFunds):
+            donate(self.donor, self.fund.pk, Decimal("5000"))
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_batch_records_one_event_per_accepted_item(self):
+        other = make_fund(self.owner, status="closed")
+        results = donate_batch(self.donor, [
+            {"cagnotte_id": self.fund.pk, "amount": Decimal("10")},
+            {"cagnotte_id": other.pk, "amount": Decimal("10")},
+            {"cagnotte_id": self.fund.pk, "amount": Decimal("20")},
+        ], partial=True)
+
+        self.assertEqual(topics(), [
+            (OutboxEvent.DONATION_CREATED, results[0].pk),
+            (OutboxEvent.DONATION_CREATED, results[2].pk),
+        ])
+
+    def test_reaching_the_target_records_closure(self):
+        donation = donate(self.donor, self.fund.pk, Decimal("500"))
+
+        # The closing UPDATE runs before the Transaction INSERT
+        self.assertEqual(topics(), [
+            (OutboxEvent.FUND_CLOSED, self.fund.pk),
+            (OutboxEvent.DONATION_CREATED, donation.pk),
+        ])
+        payload = OutboxEvent.objects.get(topic=OutboxEvent.FUND_CLOSED).payload
+        self.assertEqual(payload["current_amount"], "500.00")
+        self.assertEqual(payload["target_amount"], "500.00")
+        self.assertEqual(payload["total_participants"], 1)
+        self.assertEqual(payload["deadline"], self.fund.deadline.isoformat())
+
+    def test_batch_reaching_the_target_records_closure(self):
+        donate_batch(self.donor, [{"cagnotte_id": self.fund.pk, "amount": Decimal("500")}])
+        self.assertEqual(OutboxEvent.objects.filter(topic=OutboxEvent.FUND_CLOSED).count(), 1)
+
+    def test_close_view_records_closure_once(self):
+        url = reverse("cagnotte-close", args=[self.fund.pk])
+        self.assertEqual(self.client.put(url).status_code, 200)
+        self.assertEqual(self.client.put(url).status_code, 400)
+        self.assertEqual(topics(), [(OutboxEvent.FUND_CLOSED, self.fund.pk)])
+
+    def test_expiry_records_closure(self):
+        expired = make_fund(self.owner, deadline=timezone.now().date() - timedelta(days=1))
+        close_expired_batch()
+        self.assertEqual(topics(), [(OutboxEvent.FUND_CLOSED, expired.pk)])
+
+    def test_other_updates_record_nothing(self):
+        Fund.objects.filter(pk=self.fund.pk).update(status="open", name="Renamed")
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_create_and_delete_record_events(self):
+        response = self.client.post(reverse("cagnotte-list-create"), {
+            "name": "New",
+            "phone_beneficiary": 22222222,
+            "target_amount": "500.00",
+            "description": "Created",
+            "deadline": (timezone.now().date() + timedelta(days=10)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 201)
+        fund_id = response.data["id"]
+        self.assertEqual(self.client.delete(reverse("cagnotte-detail", args=[fund_id])).status_code, 204)
+
+        self.assertEqual(topics(), [(OutboxEvent.FUND_CREATED, fund_id), (OutboxEvent.FUND_DELETED, fund_id)])
+        created = OutboxEvent.objects.get(topic=OutboxEvent.FUND_CREATED).payload
+        self.assertEqual((created["owner_id"], created["target_amount"]), (self.owner.pk, "500.00"))
+
+
+class RelayTests(TestCase):
+    def setUp(self):
+        self.events = [
+            OutboxEvent.objects.create(topic=OutboxEvent.FUND_CREATED, key=f"f{i}", payload={"n": i})
+            for i in range(5)
+        ]
+
+    def test_delivers_in_batches_in_order_and_deletes(self):
+        sink = ListSink()
+        delivered, batches, max_lag = relay_pending(sink, batch_size=2)
+
+        self.assertEqual((delivered, batches), (5, 3))
+        self.assertGreaterEqual(max_lag, 0)
+        self.assertEqual([[m["key"] for m in batch] for batch in sink.batches], [["f0", "f1"], ["f2", "f3"], ["f4"]])
+        self.assertEqual(sink.batches[0][0]["id"], self.events[0].pk)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_failed_batch_is_kept_and_redelivered(self):
+        with self.assertRaises(SinkError):
+            relay_batch(ListSink(fail=True), batch_size=2)
+        self.assertEqual(OutboxEvent.objects.count(), 5)
+
+        sink = ListSink()
+        relay_pending(sink)
+        self.assertEqual([m["key"] for m in sink.batches[0]], [f"f{i}" for i in range(5)])
+
+    def test_queue_sink(self):
+        relay_pending(get_sink("queue"))
+        received = [QueueSink.events.get_nowait()["key"] for _ in range(5)]
+        self.assertEqual(received, [f"f{i}" for i in range(5)])
+        self.assertTrue(QueueSink.events.empty())
+
+    def test_file_sink_appends_ndjson(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "events.ndjson")
+            relay_pending(FileSink(path), batch_size=3)
+            with open(path, encoding="utf-8") as handle:
+                lines = [json.loads(line) for line in handle]
+        self.assertEqual([line["payload"]["n"] for line in lines], list(range(5)))
+        self.assertEqual(lines[0]["topic"], OutboxEvent.FUND_CREATED)
+
+    def test_unwritable_file_sink_keeps_events(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for path in (os.path.join(directory, "missing", "events.ndjson"), directory):
+                with self.assertRaises(SinkError):
+                    relay_batch(FileSink(path))
+        self.assertEqual(OutboxEvent.objects.count(), 5)
+
+    def test_http_sink_posts_to_stand_in(self):
+        server = start_stand_in()
+        try:
+            relay_pending(get_sink(f"http://127.0.0.1:{server.server_address[1]}/events"), batch_size=2)
+        finally:
+            server.shutdown()
+        self.assertEqual(server.received, 5)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_unreachable_http_sink_keeps_events(self):
+        server = start_stand_in()
+        server.shutdown()
+        server.server_close()
+        with self.assertRaises(SinkError):
+            relay_batch(HTTPSink(f"http://127.0.0.1:{server.server_address[1]}/", timeout=1))
+        self.assertEqual(OutboxEvent.objects.count(), 5)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("relay_outbox", "--sink", "queue", "--batch-size", "2", stdout=out)
+        self.assertIn("Delivered 5 event(s) in 3 batch(es)", out.getvalue())
+        while not QueueSink.events.empty():
+            QueueSink.events.get_nowait()
+
+        with self.assertRaises(CommandError):
+            call_command("relay_outbox", "--sink", "ftp://nowhere")
+
+
+@skipUnless(connection.vendor == "postgresql", "needs real row-level locking")
+class ConcurrentRelayTests(TransactionTestCase):
+    def test_relays_skip_claimed_events(self):
+        for i in range(4):
+            OutboxEvent.objects.create(topic=OutboxEvent.FUND_CREATED, key=f"f{i}", payload={})
+        claimed, release = threading.Event(), threading.Event()
+        held = []
+
+        def claim_first_two():
+            try:
+                with transaction.atomic():
+                    held.extend(OutboxEvent.objects.select_for_update().order_by("pk")[:2])
+                    claimed.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=claim_first_two)
+        holder.start()
+        claimed.wait(10)
+        sink = ListSink()
+        try:
+            delivered, _, _ = relay_pending(sink)
+        finally:
+            release.set()
+            holder.join()
+
+        self.assertEqual(delivered, 2)
+        self.assertEqual([m["key"] for m in sink.batches[0]], ["f2", "f3"])
+        self.assertEqual(sorted(OutboxEvent.objects.values_list("key", flat=True)), ["f0", "f1"])
@@ -0,0 +1,7 @@
+from django.urls import path
+from .async_views import AsyncFundTransactionsView, AsyncUserTransactionsView
+
+urlpatterns = [
+    path("", AsyncUserTransactionsView.as_view(), name="async-user-transactions"),
+    path("cagnottes/<str:pk>/", AsyncFundTransactionsView.as_view(), name="async-cagnotte-transactions"),
+]
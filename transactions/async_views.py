@@ -0,0 +1,31 @@
+from elkiss_project.async_api import AsyncAPIView, json_response
+from elkiss_project.pagination import KeysetPagination
+from .models import Transaction
+from .serializers import TransactionSerializer
+
+
+class AsyncTransactionListView(AsyncAPIView):
+    async def get(self, request, **kwargs):
+        paginator = KeysetPagination()
+        queryset = TransactionSerializer.setup_queryset(self.get_queryset(request, **kwargs), request)
+        page = await paginator.apaginate_queryset(queryset, request, self)
+        data = TransactionSerializer(page, many=True, context={"request": request}).data
+        return json_response(paginator.get_paginated_data(data))
+
+
+class AsyncUserTransactionsView(AsyncTransactionListView):
+    """
+    GET /api/async/transactions -> list of current user's transactions, on the async path
+    """
+
+    def get_queryset(self, request):
+        return Transaction.objects.filter(user_id=request.user.pk)
+
+
+class AsyncFundTransactionsView(AsyncTransactionListView):
+    """
+    GET /api/async/transactions/cagnottes/{id} -> list transactions for cagnotte, on the async path
+    """
+
+    def get_queryset(self, request, pk):
+        return Transaction.objects.filter(cagnotte_id=pk)
@@ -0,0 +1,108 @@
+import resource
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from funds.models import Fund
+from transactions.models import Transaction
+from transactions.serializers import TransactionSerializer
+from transactions.views import FundTransactionsExportAPIView
+
+User = get_user_model()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the transactions of one large cagnotte through the streaming endpoint and, for "
+        "comparison, by serializing the whole queryset. Reports time to first byte, duration and "
+        "peak RSS. Creates and removes its own rows; PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transactions", type=int, default=1_000_000)
+        parser.add_argument(
+            "--skip-materialized", action="store_true",
+            help="Do not run the list-and-serialize comparison (it needs memory proportional to the rows)",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This benchmark needs PostgreSQL.")
+        prefix = f"+bench{int(time.time()) % 100000:05d}"
+        owner = User.objects.create(phone_number=f"{prefix}0000", name="Owner")
+        fund = Fund.objects.create(
+            owner=owner,
+            name="Export benchmark",
+            phone_beneficiary=0,
+            target_amount=Decimal("99999999"),
+            description="",
+            deadline=timezone.now().date() + timedelta(days=1),
+        )
+        try:
+            self.populate(owner, fund, options["transactions"])
+            self.stdout.write(f"{'export':<22} {'first byte ms':>14} {'first row ms':>13} {'seconds':>8} {'MB out':>7} {'peak RSS MB':>12}")
+            for fmt in ("csv", "ndjson"):
+                self.streamed(owner, fund, fmt)
+            if not options["skip_materialized"]:
+                self.materialized(fund)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {Transaction._meta.db_table} WHERE cagnotte_id = %s", [fund.pk])
+            owner.delete()
+
+    def populate(self, owner, fund, count):
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {Transaction._meta.db_table} (id, user_id, cagnotte_id, amount, note, created_at, tax)
+                SELECT 'x' || lpad(i::text, 9, '0'), %s, %s, 5 + i %% 500, 'Bon courage',
+                    now() - i * interval '1 second', 0.05
+                FROM generate_series(1, %s) AS i
+                """,
+                [owner.pk, fund.pk, count],
+            )
+            cursor.execute(f"ANALYZE {Transaction._meta.db_table}")
+        self.stdout.write(f"Inserted {count} transactions in {time.perf_counter() - started:.1f} s")
+
+    def streamed(self, owner, fund, fmt):
+        request = APIRequestFactory().get(f"/api/transactions/cagnottes/{fund.pk}/export/", {"format": fmt})
+        force_authenticate(request, user=owner)
+        started = time.perf_counter()
+        response = FundTransactionsExportAPIView.as_view()(request, pk=fund.pk)
+        first_byte = first_row = None
+        size = 0
+        for chunk in response.streaming_content:
+            now = time.perf_counter()
+            if first_byte is None:
+                first_byte = now
+            elif first_row is None:
+                first_row = now
+            size += len(chunk)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{'streamed ' + fmt:<22} {(first_byte - started) * 1000:>14.1f} {(first_row - started) * 1000:>13.1f} "
+            f"{elapsed:>8.1f} {size / 2 ** 20:>7.0f} {peak_rss_mb():>12.0f}"
+        )
+
+    def materialized(self, fund):
+        # What a non-paginated ListAPIView would do
+        started = time.perf_counter()
+        rows = list(Transaction.objects.filter(cagnotte_id=fund.pk).order_by("created_at", "id"))
+        body = JSONRenderer().render(TransactionSerializer(rows, many=True).data)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{'materialized json':<22} {elapsed * 1000:>14.1f} {elapsed * 1000:>13.1f} "
+            f"{elapsed:>8.1f} {len(body) / 2 ** 20:>7.0f} {peak_rss_mb():>12.0f}"
+        )
@@ -0,0 +1,91 @@
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from elkiss_project.pagination import KeysetPagination
+from funds.models import Fund
+from transactions.models import Transaction
+from transactions.views import FundTransactionsAPIView
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark /api/transactions/cagnottes/<pk>/ first and deep page latency as "
+        "the fund grows. Creates and removes its own rows; run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        user = User.objects.create(phone_number=f"+bench{int(time.time()) % 100000:05d}")
+        fund = Fund.objects.create(
+            owner=user,
+            name="Pagination benchmark",
+            phone_beneficiary=0,
+            target_amount=Decimal("99999999"),
+            description="",
+            deadline=timezone.now().date() + timedelta(days=1),
+        )
+        self.view = FundTransactionsAPIView.as_view()
+        self.factory = APIRequestFactory()
+        self.user = user
+        try:
+            self.stdout.write(f"{'rows':>10} {'first p50 ms':>13} {'first p99 ms':>13} {'deep p50 ms':>12} {'deep p99 ms':>12}")
+            seeded = 0
+            started_at = timezone.now() - timedelta(days=365)
+            for size in sorted(options["sizes"]):
+                while seeded < size:
+                    batch = min(options["batch_size"], size - seeded)
+                    Transaction.objects.bulk_create(
+                        Transaction(
+                            user=user,
+                            cagnotte=fund,
+                            amount=Decimal("5"),
+                            created_at=started_at + timedelta(seconds=seeded + i),
+                        )
+                        for i in range(batch)
+                    )
+                    seeded += batch
+
+                first = self.measure(fund.pk, None, options["repeat"])
+                middle = Transaction.objects.filter(cagnotte=fund).order_by("-created_at", "-id")[size // 2]
+                deep = self.measure(fund.pk, self.cursor_for(middle), options["repeat"])
+                self.stdout.write(
+                    f"{size:>10} {first[0]:>13.2f} {first[1]:>13.2f} {deep[0]:>12.2f} {deep[1]:>12.2f}"
+                )
+        finally:
+            Transaction.objects.filter(cagnotte=fund).delete()
+            user.delete()
+
+    def cursor_for(self, row):
+        paginator = KeysetPagination()
+        paginator.request = self.factory.get("/")
+        return parse_qs(urlparse(paginator.encode_cursor(row)).query)["cursor"][0]
+
+    def measure(self, fund_id, cursor, repeat):
+        path = f"/api/transactions/cagnottes/{fund_id}/"
+        data = {"cursor": cursor} if cursor else {}
+        timings = []
+        for _ in range(repeat):
+            request = self.factory.get(path, data)
+            force_authenticate(request, user=self.user)
+            started = time.perf_counter()
+            response = self.view(request, pk=fund_id)
+            response.render()
+            if response.status_code != 200:
+                raise CommandError(f"{path} answered {response.status_code}")
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
@@ -0,0 +1,125 @@
+import itertools
+import secrets
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from elkiss_project.ids import ID_LENGTH, generate_id
+
+# shortuuid's default alphabet, which the former random 10-character ids used
+LEGACY_ALPHABET = "23456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def legacy_id():
+    return "".join(secrets.choice(LEGACY_ALPHABET) for _ in range(10))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare insert throughput, WAL volume and index sizes of random 10-character ids, the "
+        "time-ordered ids of elkiss_project.ids and bigint ids: rows go into a table keyed by the "
+        "id and one entry per row into a table with an index on the referencing column, as "
+        "transactions and their ledger entries do. --legacy-rows first loads random 10-character "
+        "ids, as in a table created before the time-ordered ids. Creates and drops its own tables; "
+        "PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=100, help="Rows per INSERT and per commit")
+        parser.add_argument("--legacy-rows", type=int, default=0, help="Random ids loaded before the measure, not for bigint")
+        parser.add_argument("--schemes", nargs="+", choices=["random", "sortable", "bigint"],
+                            default=["random", "sortable", "bigint"])
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This benchmark needs PostgreSQL.")
+        schemes = {
+            # Collated like IdField columns, so that new ids sort after legacy ones
+            "random": ('varchar(10) COLLATE "C"', legacy_id),
+            "sortable": (f'varchar({ID_LENGTH}) COLLATE "C"', generate_id),
+            "bigint": ("bigint", itertools.count(1).__next__),
+        }
+        self.stdout.write(
+            f"{'ids':<9} {'rows/s':>8} {'last 10% rows/s':>16} {'WAL MB':>8} {'pk index +MB':>13} {'fk index +MB':>13}"
+        )
+        for name in options["schemes"]:
+            column_type, generate = schemes[name]
+            try:
+                self.create_tables(column_type)
+                if options["legacy_rows"] and name != "bigint":
+                    self.load_legacy(options["legacy_rows"])
+                self.run(name, generate, options["rows"], options["batch_size"])
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute("DROP TABLE IF EXISTS bench_pk_entry, bench_pk_row")
+
+    def create_tables(self, column_type):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE bench_pk_row (id {column_type} PRIMARY KEY, amount numeric(10, 2) NOT NULL, "
+                f"created_at timestamp with time zone NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE TABLE bench_pk_entry (id bigserial PRIMARY KEY, "
+                f"row_id {column_type} NOT NULL REFERENCES bench_pk_row (id))"
+            )
+            cursor.execute("CREATE INDEX bench_pk_entry_row_idx ON bench_pk_entry (row_id)")
+
+    def load_legacy(self, rows):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO bench_pk_row (id, amount, created_at)
+                SELECT string_agg(substr(%s, 1 + floor(random() * %s)::int, 1), ''), 10, now()
+                FROM generate_series(1, %s) AS i, generate_series(1, 10) AS c
+                GROUP BY i
+                ON CONFLICT DO NOTHING
+                """,
+                [LEGACY_ALPHABET, len(LEGACY_ALPHABET), rows],
+            )
+            cursor.execute("INSERT INTO bench_pk_entry (row_id) SELECT id FROM bench_pk_row")
+            cursor.execute("CHECKPOINT")
+
+    def run(self, name, generate, rows, batch_size):
+        sizes = self.index_sizes()
+        wal_start = self.wal_lsn()
+        started = time.perf_counter()
+        tail_from, tail_started = rows - rows // 10, None
+        inserted = 0
+        while inserted < rows:
+            if tail_started is None and inserted >= tail_from:
+                tail_started = time.perf_counter()
+            ids = [generate() for _ in range(min(batch_size, rows - inserted))]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO bench_pk_row (id, amount, created_at) VALUES "
+                    + ", ".join(["(%s, 10, now())"] * len(ids)),
+                    ids,
+                )
+                cursor.execute("INSERT INTO bench_pk_entry (row_id) VALUES " + ", ".join(["(%s)"] * len(ids)), ids)
+            inserted += len(ids)
+        finished = time.perf_counter()
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)", [wal_start])
+            wal_mb = cursor.fetchone()[0] / 2 ** 20
+        pk_mb, fk_mb = ((after - before) / 2 ** 20 for before, after in zip(sizes, self.index_sizes()))
+        tail_rate = (rows - tail_from) / (finished - (tail_started or started))
+        self.stdout.write(
+            f"{name:<9} {rows / (finished - started):>8.0f} {tail_rate:>16.0f} {wal_mb:>8.1f} "
+            f"{pk_mb:>13.1f} {fk_mb:>13.1f}"
+        )
+
+    def index_sizes(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_relation_size('bench_pk_row_pkey'), pg_relation_size('bench_pk_entry_row_idx')"
+            )
+            return cursor.fetchone()
+
+    def wal_lsn(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_current_wal_lsn()")
+            return cursor.fetchone()[0]
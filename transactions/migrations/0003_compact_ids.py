@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:34
+
+import elkiss_project.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0002_alter_transaction_cagnotte_alter_transaction_user_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='id',
+            field=models.CharField(default=elkiss_project.ids.generate_id, editable=False, max_length=15, primary_key=True, serialize=False, unique=True),
+        ),
+    ]
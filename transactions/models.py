@@ -1,17 +1,20 @@
 from django.db import models
 
 from elkiss_project import settings
+from elkiss_project.ids import ID_LENGTH, IdField, generate_id
 from funds.models import Fund
-import shortuuid
+
 
 def generate_short_uuid():
-    return shortuuid.ShortUUID().random(length=10)
+    # Only referenced by migration 0001: new ids come from elkiss_project.ids
+    return generate_id()
+
 
 class Transaction(models.Model):
-    id = models.CharField(
-        max_length=10, 
+    id = IdField(
+        max_length=ID_LENGTH, 
         primary_key=True, 
-        default=generate_short_uuid, 
+        default=generate_id, 
         editable=False, 
         unique=True
     )
@@ -19,11 +22,13 @@ class Transaction(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name="transactions",
+        db_index=False,  # covered by the (user, created_at) index
     )
     cagnotte = models.ForeignKey(
         Fund,
         on_delete=models.CASCADE,
         related_name="transactions",
+        db_index=False,  # covered by the (cagnotte, created_at) index
     )
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     note = models.TextField(blank=True, null=True)
@@ -32,5 +37,12 @@ class Transaction(models.Model):
     # Optional: You can store the tax or total paid if needed
     tax = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of a fund's / a user's transactions, newest first
+            models.Index(fields=["cagnotte", "created_at"], name="txn_cagnotte_created_idx"),
+            models.Index(fields=["user", "created_at"], name="txn_user_created_idx"),
+        ]
+
     def __str__(self):
         return f"Transaction {self.id} - {self.amount} MRU"
\ No newline at end of file
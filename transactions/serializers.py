@@ -1,7 +1,13 @@
 from rest_framework import serializers
+from elkiss_project.expand import ExpandableFieldsMixin
+from elkiss_project.metrics import TimedSerializerMixin
+from funds.serializers import FundSerializer
+from users.serializers import UserSummarySerializer
 from .models import Transaction
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(TimedSerializerMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    # ?expand=cagnotte,owner also inlines the owner of the expanded cagnotte
+    expandable_fields = {"user": UserSummarySerializer, "cagnotte": FundSerializer}
 
     class Meta:
         model = Transaction
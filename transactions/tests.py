@@ -1,3 +1,257 @@
+import csv
+import io
+import json
+import tracemalloc
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from elkiss_project import ids
+from elkiss_project.testing import QueryBudgetMixin, make_fund
+from users.models import CustomUser
+from .models import Transaction
+
+
+class TransactionTestMixin:
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user(phone_number="+22230000001", password="secret")
+        self.donor = CustomUser.objects.create_user(phone_number="+22230000002", password="secret")
+        self.fund = make_fund(self.owner, target_amount=Decimal("100000.00"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.donor)
+
+    def make_transactions(self, count, **kwargs):
+        return [
+            Transaction.objects.create(user=self.donor, cagnotte=self.fund, amount=Decimal("10"), **kwargs)
+            for _ in range(count)
+        ]
+
+
+class FundTransactionsPaginationTests(TransactionTestMixin, TestCase):
+    def test_cursor_walks_every_row_once_newest_first(self):
+        created = self.make_transactions(25)
+        url = reverse("cagnotte-transactions", args=[self.fund.pk]) + "?page_size=10"
+
+        seen, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            seen.extend(row["id"] for row in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual([len(page["results"]) for page in pages], [10, 10, 5])
+        self.assertIsNone(pages[0]["previous"])
+        expected = Transaction.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        self.assertEqual(seen, list(expected))
+        self.assertEqual(len(set(seen)), len(created))
+
+    def test_previous_link_returns_the_prior_page(self):
+        self.make_transactions(15)
+        url = reverse("cagnotte-transactions", args=[self.fund.pk]) + "?page_size=5"
+        first = self.client.get(url).data
+        second = self.client.get(first["next"]).data
+
+        back = self.client.get(second["previous"]).data
+
+        self.assertEqual(back["results"], first["results"])
+        self.assertIsNone(back["previous"])
+        self.assertEqual(back["next"].split("cursor=")[1], first["next"].split("cursor=")[1])
+
+    def test_ties_on_created_at_are_broken_by_id(self):
+        rows = self.make_transactions(6)
+        Transaction.objects.filter(pk__in=[row.pk for row in rows]).update(created_at=timezone.now())
+        url = reverse("cagnotte-transactions", args=[self.fund.pk]) + "?page_size=4"
+
+        first = self.client.get(url).data
+        second = self.client.get(first["next"]).data
+
+        ids = [row["id"] for row in first["results"] + second["results"]]
+        self.assertEqual(ids, sorted((row.pk for row in rows), reverse=True))
+
+    def test_invalid_cursor_is_not_found(self):
+        url = reverse("cagnotte-transactions", args=[self.fund.pk])
+        self.assertEqual(self.client.get(url + "?cursor=garbage").status_code, 404)
+        self.assertEqual(self.client.get(url + "?cursor=eyJ2IjpbIngiLCJ5Il19").status_code, 404)
+
+
+class TransactionQueryBudgetTests(TransactionTestMixin, QueryBudgetMixin, TestCase):
+    def test_fund_transactions_stay_at_one_query(self):
+        url = reverse("cagnotte-transactions", args=[self.fund.pk])
+        expanded = url + "?expand=user,cagnotte,owner"
+        self.make_transactions(1)
+        self.assertQueryBudget(1, url, items=1)
+        self.assertQueryBudget(1, expanded, items=1)
+
+        self.make_transactions(19)
+        self.assertQueryBudget(1, url, items=20)
+        response = self.assertQueryBudget(1, expanded, items=20)
+        row = response.data["results"][0]
+        self.assertEqual(row["user"]["id"], self.donor.pk)
+        self.assertEqual(row["cagnotte"]["id"], self.fund.pk)
+        self.assertEqual(row["cagnotte"]["owner"]["id"], self.owner.pk)
+
+    def test_user_transactions_stay_at_one_query(self):
+        url = reverse("user-transactions") + "?expand=cagnotte"
+        self.make_transactions(1)
+        self.assertQueryBudget(1, url, items=1)
+        self.make_transactions(9)
+        response = self.assertQueryBudget(1, url, items=10)
+        self.assertEqual(response.data["results"][0]["cagnotte"]["owner"], self.owner.pk)
+
+
+class AsyncTransactionViewsTests(TransactionTestMixin, TestCase):
+    async def test_fund_and_user_transactions(self):
+        await sync_to_async(self.make_transactions)(3)
+        auth = {"headers": {"Authorization": f"Bearer {AccessToken.for_user(self.donor)}"}}
+
+        response = await self.async_client.get(
+            reverse("async-cagnotte-transactions", args=[self.fund.pk]) + "?expand=user", **auth
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 3)
+        self.assertEqual(response.json()["results"][0]["user"]["id"], self.donor.pk)
+
+        response = await self.async_client.get(reverse("async-user-transactions"), **auth)
+        self.assertEqual([row["cagnotte"] for row in response.json()["results"]], [self.fund.pk] * 3)
+
+
+class FundTransactionsExportTests(TransactionTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.donor.name = "Ahmed"
+        self.donor.save(update_fields=["name"])
+        self.client.force_authenticate(self.owner)
+        self.url = reverse("cagnotte-transactions-export", args=[self.fund.pk])
+
+    def export(self, fmt, client=None):
+        response = (client or self.client).get(self.url, {"format": fmt})
+        return response, b"".join(response.streaming_content).decode() if response.streaming else None
+
+    def bulk_transactions(self, count):
+        Transaction.objects.bulk_create(
+            Transaction(id=f"t{i:09d}", user=self.donor, cagnotte=self.fund, amount=Decimal("10"), note="Bravo")
+            for i in range(count)
+        )
+
+    def test_csv_export(self):
+        created = self.make_transactions(3, note="Mabrouk, bravo")
+
+        response, body = self.export("csv")
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn(f'filename="cagnotte-{self.fund.pk}-transactions.csv"', response["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row["id"] for row in rows], [t.pk for t in sorted(created, key=lambda t: (t.created_at, t.pk))])
+        self.assertEqual(rows[0]["note"], "Mabrouk, bravo")
+        self.assertEqual((rows[0]["amount"], rows[0]["donor_name"]), ("10.00", "Ahmed"))
+
+    def test_ndjson_export(self):
+        self.make_transactions(2)
+
+        response, body = self.export("ndjson")
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual((rows[0]["donor_id"], rows[0]["amount"]), (self.donor.pk, "10.00"))
+
+    def test_only_the_owner_can_export(self):
+        donor = APIClient()
+        donor.force_authenticate(self.donor)
+
+        self.assertEqual(self.export("csv", client=donor)[0].status_code, 403)
+        missing = reverse("cagnotte-transactions-export", args=["missing"])
+        self.assertEqual(self.client.get(missing, {"format": "ndjson"}).status_code, 404)
+
+    def test_memory_does_not_grow_with_row_count(self):
+        def peak_memory(count):
+            Transaction.objects.all().delete()
+            self.bulk_transactions(count)
+            tracemalloc.start()
+            try:
+                response, body_size = self.client.get(self.url, {"format": "csv"}), 0
+                for chunk in response.streaming_content:
+                    body_size += len(chunk)
+                return tracemalloc.get_traced_memory()[1], body_size
+            finally:
+                tracemalloc.stop()
+
+        # Both span several cursor chunks, whose number is all that differs
+        small_peak, small_size = peak_memory(10_000)
+        large_peak, large_size = peak_memory(50_000)
+
+        self.assertGreater(large_size, 4 * small_size)
+        self.assertLess(large_peak, 1.5 * small_peak)
+
+    async def test_asgi_export_streams_asynchronously(self):
+        # Under ASGI a sync iterator would be read in full before the first byte is sent
+        auth = {"Authorization": f"Bearer {AccessToken.for_user(self.owner)}"}
+
+        async def peak_memory(count):
+            await Transaction.objects.all().adelete()
+            await sync_to_async(self.bulk_transactions)(count)
+            tracemalloc.start()
+            try:
+                response = await self.async_client.get(self.url, {"format": "ndjson"}, headers=auth)
+                self.assertTrue(response.is_async)
+                lines = 0
+                async for chunk in response.streaming_content:
+                    lines += chunk.count(b"\n")
+                return tracemalloc.get_traced_memory()[1], lines
+            finally:
+                tracemalloc.stop()
+
+        small_peak, small_lines = await peak_memory(10_000)
+        large_peak, large_lines = await peak_memory(50_000)
+
+        self.assertEqual((small_lines, large_lines), (10_000, 50_000))
+        self.assertLess(large_peak, 1.5 * small_peak)
+
+
+class TransactionIdTests(TransactionTestMixin, TestCase):
+    def test_ids_follow_creation_order(self):
+        created = [transaction.pk for transaction in self.make_transactions(50)]
+
+        self.assertEqual({len(pk) for pk in created}, {ids.ID_LENGTH})
+        self.assertEqual(list(Transaction.objects.order_by("pk").values_list("pk", flat=True)), created)
+
+    def test_ids_keep_increasing_within_a_millisecond_and_when_the_clock_goes_back(self):
+        now = (ids.EPOCH_MS + 10 ** 9) * 1_000_000
+        with mock.patch.object(ids, "_last", (0, 0)), \
+                mock.patch.object(ids.time, "time_ns", side_effect=[now, now, now - 5_000_000, now + 1_000_000]):
+            generated = [ids.generate_id() for _ in range(4)]
+
+        self.assertEqual(generated, sorted(set(generated)))
+        time_part = slice(len(ids.PREFIX), len(ids.PREFIX) + ids.TIME_LENGTH)
+        self.assertEqual({pk[time_part] for pk in generated[:3]}, {ids.encode(10 ** 9, ids.TIME_LENGTH)})
+        self.assertEqual(generated[3][time_part], ids.encode(10 ** 9 + 1, ids.TIME_LENGTH))
+
+    def test_new_ids_sort_after_legacy_ones(self):
+        for pk in ("zzzzzzzzzz", "ZZZZZZZZZZ", "Kx7pQ2mZb9", "22222222a2"):
+            Transaction.objects.create(id=pk, user=self.donor, cagnotte=self.fund, amount=Decimal("10"))
+        created = self.make_transactions(2)
+
+        self.assertEqual(
+            list(Transaction.objects.order_by("pk").values_list("pk", flat=True))[-2:],
+            [created[0].pk, created[1].pk],
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "SQLite always compares bytes")
+    def test_id_columns_compare_bytes(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT table_name, column_name FROM information_schema.columns "
+                "WHERE column_name IN ('id', 'user_id', 'owner_id', 'cagnotte_id') "
+                "AND table_name IN ('users_customuser', 'funds_fund', 'transactions_transaction') "
+                "AND collation_name IS DISTINCT FROM 'C'"
+            )
+            self.assertEqual(cursor.fetchall(), [])
 
-# Create your tests here.
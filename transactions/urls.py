@@ -4,4 +4,5 @@ from .views import *
 urlpatterns = [
     path("", UserTransactionsAPIView.as_view(), name="user-transactions"),
     path("cagnottes/<str:pk>/", FundTransactionsAPIView.as_view(), name="cagnotte-transactions"),
+    path("cagnottes/<str:pk>/export/", FundTransactionsExportAPIView.as_view(), name="cagnotte-transactions-export"),
 ]
\ No newline at end of file
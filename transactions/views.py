@@ -1,8 +1,43 @@
 
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from rest_framework import generics, permissions
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.views import APIView
+from elkiss_project.renderers import CSVRenderer, NDJSONRenderer
+from funds.models import Fund
 from .models import Transaction
 from .serializers import TransactionSerializer
 
+EXPORT_CHUNK_SIZE = 2000
+
+
+def stream_rows(queryset):
+    """Rows of `queryset` read through a server-side cursor, one chunk at a time."""
+    # In autocommit mode the cursor is declared WITH HOLD, which PostgreSQL
+    # materializes in full before returning a row; inside a transaction it is not.
+    with transaction.atomic():
+        yield from queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+async def stream_async(chunks):
+    """
+    `chunks` as an async iterator, for responses served under ASGI: Django
+    5.0 reads a sync streaming iterator there with sync_to_async(list), so
+    the whole export would be built in memory before the first byte is
+    sent. Each chunk is read in the request's sync thread, the one that
+    holds the cursor and its transaction.
+    """
+    next_chunk = sync_to_async(next)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Ends the transaction and closes the cursor when the client goes away
+        await sync_to_async(chunks.close)()
+
 
 class UserTransactionsAPIView(generics.ListAPIView):
     """
@@ -12,7 +47,8 @@ class UserTransactionsAPIView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user)
+        queryset = Transaction.objects.filter(user_id=self.request.user.pk)
+        return TransactionSerializer.setup_queryset(queryset, self.request)
 
 
 class FundTransactionsAPIView(generics.ListAPIView):
@@ -24,4 +60,40 @@ class FundTransactionsAPIView(generics.ListAPIView):
 
     def get_queryset(self):
         cagnotte_id = self.kwargs.get("pk")
-        return Transaction.objects.filter(cagnotte_id=cagnotte_id)
\ No newline at end of file
+        queryset = Transaction.objects.filter(cagnotte_id=cagnotte_id)
+        return TransactionSerializer.setup_queryset(queryset, self.request)
+
+
+class FundTransactionsExportAPIView(APIView):
+    """
+    GET /api/transactions/cagnottes/{id}/export?format=csv|ndjson -> every
+    transaction of a cagnotte you own, oldest first, streamed as the rows
+    are read from a server-side cursor.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+    columns = ["id", "created_at", "amount", "tax", "note", "user_id", "user__name"]
+    header = ["id", "created_at", "amount", "tax", "note", "donor_id", "donor_name"]
+
+    def get(self, request, pk):
+        owner_id = Fund.objects.filter(pk=pk).values_list("owner_id", flat=True).first()
+        if owner_id is None:
+            raise NotFound()
+        if owner_id != request.user.pk:
+            raise PermissionDenied("Only the owner can export the transactions of this cagnotte.")
+
+        # No tie-break on id: the (cagnotte, created_at) index then yields the
+        # rows in order, and the first ones are sent before the rest are read.
+        rows = stream_rows(
+            Transaction.objects.filter(cagnotte_id=pk).order_by("created_at").values_list(*self.columns)
+        )
+        renderer = request.accepted_renderer
+        chunks = renderer.stream(self.header, rows)
+        if isinstance(request._request, ASGIRequest):
+            chunks = stream_async(chunks)
+        response = StreamingHttpResponse(
+            chunks,
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response["Content-Disposition"] = f'attachment; filename="cagnotte-{pk}-transactions.{renderer.format}"'
+        return response
@@ -0,0 +1,62 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from rest_framework import exceptions
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from elkiss_project.async_api import AsyncAPIView, json_response
+from .hashers import amake_password, averify_password
+from .serializers import RegisterSerializer, login_phone_numbers, login_response
+
+User = get_user_model()
+
+NO_ACTIVE_ACCOUNT = "No active account found with the given credentials"
+
+
+class AsyncLoginView(AsyncAPIView):
+    """
+    POST /api/async/auth/login -> same payload as POST /api/auth/login, with
+    the password hashed in the hash thread pool instead of on the event loop
+    """
+    http_method_names = ["post"]
+    authentication_required = False
+
+    async def post(self, request):
+        missing = [field for field in ("phone_number", "password") if not request.data.get(field)]
+        if missing:
+            return json_response({field: ["This field is required."] for field in missing}, status=400)
+        password = request.data["password"]
+
+        candidates = login_phone_numbers(request.data["phone_number"])
+        users = {user.phone_number: user async for user in User.objects.filter(phone_number__in=candidates)}
+        user = next((users[number] for number in candidates if number in users), None)
+        if user is None:
+            # Hash anyway, so that unknown numbers answer as slowly as wrong passwords
+            await amake_password(password)
+            raise exceptions.AuthenticationFailed(NO_ACTIVE_ACCOUNT, "no_active_account")
+        valid, must_update = await averify_password(password, user.password)
+        if not valid or not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise exceptions.AuthenticationFailed(NO_ACTIVE_ACCOUNT, "no_active_account")
+        if must_update:
+            # Rewrite the hash with the current PASSWORD_HASH_POLICY, as check_password does
+            user.password = await amake_password(password)
+            await user.asave(update_fields=["password"])
+        return json_response(await sync_to_async(login_response)(user))
+
+
+class AsyncRegisterView(AsyncAPIView):
+    """
+    POST /api/async/auth/register -> same as POST /api/auth/register, with the
+    password hashed in the hash thread pool. Idempotency-Key is not replayed here.
+    """
+    http_method_names = ["post"]
+    authentication_required = False
+
+    async def post(self, request):
+        serializer = RegisterSerializer(data=request.data)
+        # The unique phone number check queries the database
+        if not await sync_to_async(serializer.is_valid)():
+            return json_response(serializer.errors, status=400)
+        # Hash here, then create the user as the sync view does
+        encoded_password = await amake_password(serializer.validated_data["password"])
+        registered = await sync_to_async(serializer.save)(encoded_password=encoded_password)
+        return json_response(registered, status=201)
@@ -0,0 +1,181 @@
+"""
+Stateless JWT authentication.
+
+Access tokens carry the claims that authorization needs (user id,
+is_active, is_staff), so authenticating a request reads no database row.
+Views that need the rest of the user, such as the balance, get it from
+ClaimsUser, which loads the CustomUser row on first use.
+
+Revocation: access tokens are short-lived (SIMPLE_JWT ACCESS_TOKEN_LIFETIME)
+and refreshing re-reads the user, so a deactivated user or a blacklisted
+refresh token is locked out within one lifetime. Tokens also carry the id
+of the login session they come from ("sid", kept across refreshes), and
+revoke_session() / revoke_user_tokens() reject a session's or a user's
+outstanding access tokens before then. Revocations are one list in the
+AUTH_REVOCATION_CACHE_ALIAS cache, which must be shared between processes
+(users.checks refuses a local-memory one), pruned to the last lifetime.
+Each process copies that list at most every AUTH_REVOCATION_POLL_SECONDS
+and checks tokens against its copy, so a request costs no cache read (with
+the database cache fallback, no query) however many revocations are in
+force. Other workers therefore reject a revoked token within the poll
+interval; the worker that revoked it, at once.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from elkiss_project import metrics
+
+CLAIMS = ("is_active", "is_staff")
+
+
+def add_user_claims(token, user):
+    for claim in CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+SESSION_CLAIM = "sid"
+REVOCATIONS_KEY = "auth:revocations"
+REVOCATIONS_LOCK_KEY = "auth:revocations:lock"
+
+
+def start_session(token):
+    """Mark a new login: the refresh token and every token it issues carry its jti as session id."""
+    token[SESSION_CLAIM] = token[api_settings.JTI_CLAIM]
+    return token
+
+
+def _session_key(session_id):
+    return f"session:{session_id}"
+
+
+def _user_key(user_id):
+    return f"user:{user_id}"
+
+
+def _cache():
+    return caches[getattr(settings, "AUTH_REVOCATION_CACHE_ALIAS", "default")]
+
+
+def poll_seconds():
+    return getattr(settings, "AUTH_REVOCATION_POLL_SECONDS", 1)
+
+
+class RevocationList:
+    """
+    This process's copy of the revocations made within the last access
+    token lifetime: {"session:<sid>" or "user:<id>": revoked at (unix time)}.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.entries, self.checked_at = {}, None
+
+    def current(self):
+        now = time.monotonic()
+        if self.checked_at is None or now - self.checked_at >= poll_seconds():
+            self.entries = _cache().get(REVOCATIONS_KEY) or {}
+            self.checked_at = now
+        return self.entries
+
+    def rejects(self, token, user_id):
+        entries = self.current()
+        if not entries:
+            return False
+        session_id = token.get(SESSION_CLAIM)
+        if session_id is not None and _session_key(session_id) in entries:
+            return True
+        revoked_at = entries.get(_user_key(user_id))
+        return revoked_at is not None and token.get("iat", 0) < revoked_at
+
+    def add(self, key, revoked_at):
+        """Add an entry to the shared list, then to this copy."""
+        cache, lifetime = _cache(), api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+        # Logouts are rare next to requests: serialize the read-modify-write
+        # rather than lose a concurrent revocation. The lock expires on its
+        # own if its holder dies.
+        while not cache.add(REVOCATIONS_LOCK_KEY, 1, timeout=5):
+            time.sleep(0.01)
+        try:
+            entries = {
+                name: at for name, at in (cache.get(REVOCATIONS_KEY) or {}).items() if at + lifetime >= revoked_at
+            }
+            entries[key] = revoked_at
+            cache.set(REVOCATIONS_KEY, entries, int(lifetime) + 1)
+        finally:
+            cache.delete(REVOCATIONS_LOCK_KEY)
+        self.entries = entries
+
+
+revocations = RevocationList()
+
+
+def revoke_session(session_id):
+    """Reject every access token of one login session, e.g. at logout."""
+    revocations.add(_session_key(session_id), int(time.time()))
+
+
+def revoke_user_tokens(user_id):
+    """Reject every access token issued to `user_id` until now, on every device."""
+    # Whole seconds, like the "iat" claim: a token issued later in this same
+    # second, e.g. by logging in again right away, stays valid.
+    revocations.add(_user_key(user_id), int(time.time()))
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user built from the access token claims. Attributes that are
+    not claims (solde, phone_number, ...) come from the CustomUser row,
+    loaded on first access.
+    """
+
+    @cached_property
+    def is_active(self):
+        return self.token.get("is_active", True)
+
+    @cached_property
+    def instance(self):
+        try:
+            return get_user_model().objects.get(pk=self.pk)
+        except get_user_model().DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+
+    def __getattr__(self, attr):
+        if attr.startswith("_") or attr in ("token", "instance"):
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.instance, attr)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the per-request user query. Tokens issued
+    without the claims, e.g. before this was enabled, still authenticate
+    against the database.
+    """
+
+    def authenticate(self, request):
+        with metrics.phase("auth"):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in CLAIMS):
+            return super().get_user(validated_token)
+
+        user = api_settings.TOKEN_USER_CLASS(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if revocations.rejects(validated_token, user.pk):
+            raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+        return user
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries only the process that wrote them can read
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches)
+def check_revocation_cache(app_configs, **kwargs):
+    """revoke_user_tokens() must reach every worker, not only the one that handled the logout."""
+    alias = getattr(settings, "AUTH_REVOCATION_CACHE_ALIAS", "default")
+    if alias not in settings.CACHES:
+        return [Error(f"AUTH_REVOCATION_CACHE_ALIAS {alias!r} is not in CACHES.", id="users.E001")]
+    backend = settings.CACHES[alias]["BACKEND"]
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            f"The {alias!r} cache ({backend}) is local to each process, so a token revoked by one "
+            f"worker would stay valid on the others.",
+            hint="Set AUTH_REVOCATION_CACHE_URL (or CACHE_URL) to a shared cache such as redis://, "
+                 "or leave both unset to use the database table created by migrate.",
+            id="users.E002",
+        )]
+    return []
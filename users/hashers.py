@@ -0,0 +1,98 @@
+"""
+Password hashing policy.
+
+PASSWORD_HASH_POLICY picks the hasher new passwords get: "pbkdf2",
+"scrypt" or "argon2" (needs argon2-cffi). The cost parameters of each come
+from settings, so they can be tuned without a code change. The other
+hashers stay in PASSWORD_HASHERS to verify existing hashes, and Django
+rewrites a hash on the next successful login when its algorithm or its
+parameters differ from the policy (check_password's setter).
+
+Hashing is CPU bound. The hash functions release the GIL, so the async
+endpoints run them in a pool of PASSWORD_HASH_THREADS threads per process
+instead of on the event loop.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return getattr(settings, "PASSWORD_PBKDF2_ITERATIONS", hashers.PBKDF2PasswordHasher.iterations)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return getattr(settings, "PASSWORD_SCRYPT_WORK_FACTOR", hashers.ScryptPasswordHasher.work_factor)
+
+    @property
+    def maxmem(self):
+        # scrypt needs 128 * r * N bytes; OpenSSL refuses more than 32 MiB unless told
+        return 2 * 128 * self.block_size * self.work_factor
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return getattr(settings, "PASSWORD_ARGON2_TIME_COST", hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return getattr(settings, "PASSWORD_ARGON2_MEMORY_COST", hashers.Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, "PASSWORD_ARGON2_PARALLELISM", hashers.Argon2PasswordHasher.parallelism)
+
+
+def hashers_for(policy):
+    """PASSWORD_HASHERS with the hasher of `policy` first."""
+    preferred = settings.PASSWORD_HASH_POLICIES[policy]
+    return [preferred] + [hasher for hasher in settings.PASSWORD_HASHERS if hasher != preferred]
+
+
+def verify_password(password, encoded):
+    """(is the password right, should the hash be rewritten with the policy)."""
+    if not password or not encoded:
+        return False, False
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False, False
+    if not hasher.verify(password, encoded):
+        return False, False
+    preferred = hashers.get_hasher("default")
+    return True, hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def hash_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "PASSWORD_HASH_THREADS", os.cpu_count() or 1),
+                thread_name_prefix="password-hash",
+            )
+    return _executor
+
+
+async def in_hash_pool(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(hash_executor(), func, *args)
+
+
+async def amake_password(password):
+    return await in_hash_pool(hashers.make_password, password)
+
+
+async def averify_password(password, encoded):
+    return await in_hash_pool(verify_password, password, encoded)
@@ -0,0 +1,84 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from funds.models import Fund
+from users.authentication import add_user_claims, revocations, revoke_session, revoke_user_tokens
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Count the queries of each API endpoint with a claims access token and with a token "
+        "authenticated from the database, then with the claims token while other revocations are "
+        "in force. Creates and removes its own rows; run it against a scratch database."
+    )
+
+    def handle(self, *args, **options):
+        user = User.objects.create(phone_number=f"+bench{int(time.time()) % 100000:05d}", is_staff=True)
+        fund = Fund.objects.create(
+            owner=user,
+            name="Auth benchmark",
+            phone_beneficiary=0,
+            target_amount=Decimal("99999999"),
+            description="",
+            deadline=timezone.now().date() + timedelta(days=1),
+        )
+        bystander = User.objects.create(phone_number=f"+bystd{int(time.time()) % 100000:05d}")
+        tokens = {
+            "database": AccessToken.for_user(user),
+            "claims": add_user_claims(AccessToken.for_user(user), user),
+        }
+        requests = [
+            ("GET", reverse("cagnotte-list-create"), None),
+            ("GET", reverse("cagnotte-detail", args=[fund.pk]), None),
+            ("GET", reverse("cagnotte-stats", args=[fund.pk]), None),
+            ("GET", reverse("user-transactions"), None),
+            ("GET", reverse("cagnotte-transactions", args=[fund.pk]), None),
+            ("GET", reverse("cagnotte-cache-stats"), None),
+            ("POST", reverse("donate"), {"cagnotte_id": fund.pk, "amount": "5"}),
+        ]
+        try:
+            self.stdout.write(f"{'endpoint':<48} {'database':>9} {'claims':>7} {'revoked':>8} {'saved':>6}")
+            saved = 0
+            # Uncached, so every request shows its real query count. A long
+            # poll interval keeps the once-a-second revocation poll out of the counts.
+            with override_settings(FUND_CACHE_TIMEOUT=0, ALLOWED_HOSTS=["testserver"], AUTH_REVOCATION_POLL_SECONDS=3600):
+                revocations.reset()
+                for method, path, data in requests:
+                    self.count(method, path, data, tokens["claims"])  # warm up: first donation creates the rollup rows
+                    counts = {mode: self.count(method, path, data, token) for mode, token in tokens.items()}
+                    # Someone else just logged out or was deactivated, as is always the case on a live deployment
+                    revoke_user_tokens(bystander.pk)
+                    revoke_session(f"bench-{time.monotonic()}")
+                    counts["revoked"] = self.count(method, path, data, tokens["claims"])
+                    saved += counts["database"] - counts["revoked"]
+                    self.stdout.write(
+                        f"{method + ' ' + path:<48} {counts['database']:>9} {counts['claims']:>7} "
+                        f"{counts['revoked']:>8} {counts['database'] - counts['revoked']:>6}"
+                    )
+                revocations.reset()
+            self.stdout.write(f"saved {saved} queries over {len(requests)} requests")
+        finally:
+            user.delete()
+            bystander.delete()
+
+    def count(self, method, path, data, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method.lower())(path, data, format="json")
+        if response.status_code >= 400:
+            raise CommandError(f"{method} {path} answered {response.status_code}")
+        return len(queries)
@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from ledger.models import LedgerEntry
+
+User = get_user_model()
+
+PREFIX = "+2224"  # Mauritanian numbers: +2224 and seven digits
+NAME = "Bench import"
+
+
+class Command(BaseCommand):
+    help = (
+        "Run import_users on generated NDJSON files: create --users users, --passwords of them "
+        "with a password to hash, then credit every one of them once with a single amount and "
+        "once with distinct amounts. Creates and removes its own rows; run it against a scratch "
+        "database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument("--passwords", type=int, default=200, help="Users imported with a password")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        if options["users"] > 10 ** 7:
+            raise CommandError("--users is at most 10000000")
+        phone_numbers = [f"{PREFIX}{i:07d}" for i in range(options["users"])]
+        self.stale().delete()
+        # With BALANCE_BACKEND=ledger the import appends entries; they are removed with the users
+        first_entry = (LedgerEntry.objects.order_by("-pk").values_list("pk", flat=True).first() or 0) + 1
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                runs = [
+                    ("create", [{"phone_number": phone_number, "name": NAME,
+                                 **({"password": "bench-password"} if i < options["passwords"] else {})}
+                                for i, phone_number in enumerate(phone_numbers)]),
+                    ("top-up, one amount", [{"phone_number": phone_number, "amount": "100"}
+                                            for phone_number in phone_numbers]),
+                    ("top-up, distinct amounts", [{"phone_number": phone_number, "amount": f"{1 + i % 5000}.50"}
+                                                  for i, phone_number in enumerate(phone_numbers)]),
+                ]
+                for name, rows in runs:
+                    path = os.path.join(directory, "rows.ndjson")
+                    with open(path, "w") as stream:
+                        stream.writelines(json.dumps(row) + "\n" for row in rows)
+                    self.stdout.write(name)
+                    call_command(
+                        "import_users", path, top_up=name != "create", batch_size=options["batch_size"],
+                        workers=options["workers"], stdout=self.stdout,
+                    )
+        finally:
+            LedgerEntry.objects.filter(pk__gte=first_entry).delete()
+            self.stale().delete()
+
+    def stale(self):
+        return User.objects.filter(phone_number__startswith=PREFIX, name=NAME)
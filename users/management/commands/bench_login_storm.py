@@ -0,0 +1,79 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from users.hashers import hashers_for
+from users.views import CustomTokenObtainPairView
+
+User = get_user_model()
+
+PASSWORD = "bench-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure logins/s, and logins/s per core, of POST /api/auth/login/ under each "
+        "PASSWORD_HASH_POLICY with the configured cost parameters. Creates and removes "
+        "its own rows; run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--policies", nargs="+", choices=sorted(settings.PASSWORD_HASH_POLICIES),
+                            default=list(settings.PASSWORD_HASH_POLICIES))
+        parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--duration", type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        threads = options["threads"]
+        cores = min(threads, os.cpu_count() or 1)
+        prefix = f"+bench{int(time.time()) % 100000:05d}"
+        self.view = CustomTokenObtainPairView.as_view()
+        self.factory = APIRequestFactory()
+        self.stdout.write(f"{'policy':<8} {'hash ms':>8} {'logins':>8} {'logins/s':>9} {'per core':>9}")
+        for index, policy in enumerate(options["policies"]):
+            with override_settings(PASSWORD_HASHERS=hashers_for(policy)):
+                try:
+                    started = time.perf_counter()
+                    hashed = make_password(PASSWORD)
+                    hash_ms = (time.perf_counter() - started) * 1000
+                except ValueError as exc:  # argon2-cffi not installed
+                    self.stdout.write(f"{policy:<8} skipped: {exc}")
+                    continue
+                users = User.objects.bulk_create(
+                    User(phone_number=f"{prefix}{index}{i:03d}", password=hashed) for i in range(threads)
+                )
+                try:
+                    logins = self.storm([user.phone_number for user in users], options["duration"])
+                finally:
+                    User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            rate = logins / options["duration"]
+            self.stdout.write(f"{policy:<8} {hash_ms:>8.1f} {logins:>8} {rate:>9.1f} {rate / cores:>9.1f}")
+
+    def storm(self, phone_numbers, duration):
+        stop_at = time.perf_counter() + duration
+
+        def client(phone_number):
+            logins = 0
+            try:
+                while time.perf_counter() < stop_at:
+                    request = self.factory.post(
+                        "/api/auth/login/", {"phone_number": phone_number, "password": PASSWORD}, format="json"
+                    )
+                    response = self.view(request)
+                    if response.status_code != 200:
+                        raise CommandError(f"benchmark login answered {response.status_code}")
+                    logins += 1
+            finally:
+                connection.close()
+            return logins
+
+        with ThreadPoolExecutor(max_workers=len(phone_numbers)) as pool:
+            return sum(pool.map(client, phone_numbers))
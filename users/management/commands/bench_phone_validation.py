@@ -0,0 +1,64 @@
+import random
+import time
+
+import phonenumbers
+import pycountry
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+
+from users import validators
+
+
+def legacy_validate(phone_number, country_code):
+    # validate_phone_number before the cached normalization: a pycountry lookup and a parse per call
+    if not pycountry.countries.get(alpha_2=country_code.upper()):
+        return False
+    try:
+        return phonenumbers.is_valid_number(phonenumbers.parse(phone_number, country_code.upper()))
+    except phonenumbers.NumberParseException:
+        return False
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare phone number validations/s of the former per-call validation, "
+        "normalize_phone_number with a cold and a warm cache, and the batch API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--numbers", type=int, default=5000, help="Distinct numbers")
+        parser.add_argument("--calls", type=int, default=50000, help="Validations, drawn among the numbers")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        spellings = ("+222{}", "{}", "00222{}", "+222 {} ")
+        numbers = [
+            rng.choice(spellings).format(f"{rng.choice('234')}{rng.randrange(10 ** 7):07d}")
+            for _ in range(options["numbers"])
+        ]
+        calls = rng.choices(numbers, k=options["calls"])
+
+        def run_each(validate):
+            for number in calls:
+                validate(number)
+
+        runs = [
+            ("legacy", lambda: run_each(lambda number: legacy_validate(number, "MR"))),
+            ("cold", lambda: (validators._parse.cache_clear(), run_each(self.normalize))),
+            ("warm", lambda: run_each(self.normalize)),
+            ("batch", lambda: (validators._parse.cache_clear(), validators.normalize_phone_numbers(calls, "MR"))),
+        ]
+        self.stdout.write(f"{'path':<8} {'validations/s':>14}")
+        for name, run in runs:
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{name:<8} {len(calls) / elapsed:>14.0f}")
+        self.stdout.write(f"parse cache: {validators._parse.cache_info()}")
+
+    def normalize(self, number):
+        try:
+            validators.normalize_phone_number(number, "MR")
+        except ValidationError:
+            pass
@@ -0,0 +1,272 @@
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from elkiss_project.ids import generate_id
+from ledger.models import LedgerEntry
+from ledger.services import ledger_enabled, lock_accounts, opening_entries
+from users.validators import normalize_phone_numbers
+
+User = get_user_model()
+
+MIN_PASSWORD_LENGTH = 6  # as RegisterSerializer
+ID_ATTEMPTS = 3  # inserts of a user whose generated id is taken
+CENT = Decimal("0.01")
+
+
+def parse(stream, fmt):
+    """(line number, row) pairs; row is None for a line that is not JSON."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def amount(value, allow_zero=False):
+    """Decimal of at most two decimal places, or None."""
+    try:
+        value = Decimal(str(value).strip())
+        if value.is_finite() and value == value.quantize(CENT) and (value > 0 or allow_zero and value == 0):
+            return value
+    except (InvalidOperation, ValueError):
+        pass
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users from a CSV or NDJSON file (columns phone_number, name, password, solde), "
+        "or with --top-up credit existing users (columns phone_number, amount). Rows are read "
+        "in batches: phone numbers are normalized per batch, passwords hashed in a process pool "
+        "(started by the first batch with passwords), "
+        "users inserted with bulk_create and balances credited with one UPDATE per batch. "
+        "Phone numbers that are already registered are skipped; rejected rows are listed. "
+        "Users without a password get an unusable one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='CSV or NDJSON file, "-" for stdin')
+        parser.add_argument("--format", choices=["csv", "ndjson"],
+                            help="Default: csv for a .csv file, ndjson otherwise")
+        parser.add_argument("--top-up", action="store_true", help="Credit balances instead of creating users")
+        parser.add_argument("--country", help="ISO alpha-2 country of numbers without a country prefix")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Password hashing processes")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or ("csv" if options["path"].endswith(".csv") else "ndjson")
+        if options["path"] == "-":
+            self.run(parse(sys.stdin, fmt), options)
+        else:
+            try:
+                stream = open(options["path"], newline="", encoding="utf-8")
+            except OSError as exc:
+                raise CommandError(exc)
+            with stream:
+                self.run(parse(stream, fmt), options)
+
+    def run(self, rows, options):
+        self.rejected = []
+        self.counts = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.seen = set()
+        self.workers = options["workers"]
+        self.pool = None
+        started = time.perf_counter()
+        try:
+            while True:
+                read_started = time.perf_counter()
+                batch = list(itertools.islice(rows, options["batch_size"]))
+                self.seconds["read"] += time.perf_counter() - read_started
+                if not batch:
+                    break
+                if options["top_up"]:
+                    self.top_up(batch, options["country"])
+                else:
+                    self.create(batch, options["country"])
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+        elapsed = time.perf_counter() - started
+
+        for line, message in sorted(self.rejected):
+            self.stdout.write(f"Rejected line {line}: {message}")
+        counts = self.counts
+        if options["top_up"]:
+            done = counts["credited"]
+            summary = f"Credited {done} user(s) with {counts['total']:.2f}"
+        else:
+            done = counts["created"]
+            summary = f"Created {done} user(s), skipped {counts['existing']} already registered"
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary}, rejected {len(self.rejected)} row(s) in {elapsed:.1f} s ({done / elapsed:.0f} users/s)"
+        ))
+        self.stdout.write("Seconds: " + ", ".join(f"{phase} {seconds:.2f}" for phase, seconds in self.seconds.items()))
+
+    def hash_passwords(self, passwords):
+        """make_password() of each password, in the process pool started by the first call."""
+        if not passwords:
+            return []
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        chunksize = max(1, len(passwords) // (4 * self.workers))
+        return self.pool.map(make_password, passwords, chunksize=chunksize)
+
+    def normalize(self, batch, country, columns):
+        """Rows of the batch with valid columns, keyed by E.164 phone number; rejects the others."""
+        started = time.perf_counter()
+        rows = []
+        for line, row in batch:
+            if not isinstance(row, dict):
+                self.rejected.append((line, "not a JSON object"))
+            elif not isinstance(row.get("phone_number"), str) or not row["phone_number"].strip():
+                self.rejected.append((line, "phone_number is required"))
+            else:
+                error = next((error for column, check, error in columns if not check(row.get(column))), None)
+                if error:
+                    self.rejected.append((line, error))
+                else:
+                    rows.append((line, row))
+        try:
+            valid, invalid = normalize_phone_numbers((row["phone_number"] for _, row in rows), country)
+        except ValidationError as exc:
+            raise CommandError(exc.messages[0])
+        normalized = {}
+        for line, row in rows:
+            if row["phone_number"] in invalid:
+                self.rejected.append((line, f"{row['phone_number']}: {invalid[row['phone_number']]}"))
+            else:
+                normalized.setdefault(valid[row["phone_number"]], []).append((line, row))
+        self.seconds["validate"] += time.perf_counter() - started
+        return normalized
+
+    def create(self, batch, country):
+        rows = self.normalize(batch, country, [
+            ("name", lambda name: name is None or isinstance(name, str) and len(name) <= 255,
+             "name must be text of at most 255 characters"),
+            ("password",
+             lambda password: not password or isinstance(password, str) and len(password) >= MIN_PASSWORD_LENGTH,
+             f"password must have at least {MIN_PASSWORD_LENGTH} characters"),
+            ("solde", lambda solde: solde in (None, "") or amount(solde, allow_zero=True) is not None,
+             "solde must be an amount of at least 0 with two decimal places at most"),
+        ])
+        existing = set(User.objects.filter(phone_number__in=rows).values_list("phone_number", flat=True))
+        new = []
+        for phone_number, matches in rows.items():
+            (line, row), duplicates = matches[0], matches[1:]
+            self.rejected += [(dup_line, f"{phone_number}: duplicate of line {line}") for dup_line, _ in duplicates]
+            if phone_number in self.seen:
+                self.rejected.append((line, f"{phone_number}: duplicate of an earlier line"))
+            elif phone_number in existing:
+                self.counts["existing"] += 1
+            else:
+                new.append((line, phone_number, row))
+            self.seen.add(phone_number)
+
+        started = time.perf_counter()
+        hashed = iter(self.hash_passwords([row["password"] for _, _, row in new if row.get("password")]))
+        users = []
+        for line, phone_number, row in new:
+            user = User(phone_number=phone_number, name=row.get("name") or None,
+                        password=next(hashed) if row.get("password") else make_password(None))
+            if row.get("solde") not in (None, ""):
+                user.solde = amount(row["solde"], allow_zero=True)
+            users.append((line, user))
+        self.seconds["hash"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            created = []
+            for _ in range(ID_ATTEMPTS):
+                inserted, users = self.insert(users)
+                created += inserted
+                if not users:
+                    break
+                # The rest lost their generated id to an existing row: retry them with new ones
+                for _, user in users:
+                    user.pk = generate_id()
+            self.rejected += [(line, f"{user.phone_number}: no free id after {ID_ATTEMPTS} attempts")
+                              for line, user in users]
+            if ledger_enabled():
+                LedgerEntry.objects.bulk_create(
+                    entry for user in created if user.solde for entry in opening_entries(user.pk, user.solde)
+                )
+        self.counts["created"] += len(created)
+        self.seconds["insert"] += time.perf_counter() - started
+
+    def insert(self, users):
+        """
+        bulk_create (line, user) pairs; returns the created users and the
+        pairs whose id was taken. A number registered since the check in
+        create() is skipped by the unique index, and so is a row whose id
+        collides: matching both columns tells them apart.
+        """
+        User.objects.bulk_create([user for _, user in users], ignore_conflicts=True)
+        stored = dict(User.objects.filter(pk__in=[user.pk for _, user in users]).values_list("pk", "phone_number"))
+        created = [user for _, user in users if stored.get(user.pk) == user.phone_number]
+        skipped = [(line, user) for line, user in users if stored.get(user.pk) != user.phone_number]
+        if not skipped:
+            return created, []
+        registered = set(
+            User.objects.filter(phone_number__in=[user.phone_number for _, user in skipped])
+            .values_list("phone_number", flat=True)
+        )
+        self.counts["existing"] += sum(user.phone_number in registered for _, user in skipped)
+        return created, [(line, user) for line, user in skipped if user.phone_number not in registered]
+
+    def top_up(self, batch, country):
+        rows = self.normalize(batch, country, [
+            ("amount", lambda value: amount(value) is not None,
+             "amount must be greater than 0 with two decimal places at most"),
+        ])
+        started = time.perf_counter()
+        users = dict(User.objects.filter(phone_number__in=rows).values_list("phone_number", "pk"))
+        credits = {}
+        for phone_number, matches in rows.items():
+            if phone_number in users:
+                credits[users[phone_number]] = sum(amount(row["amount"]) for _, row in matches)
+            else:
+                self.rejected += [(line, f"{phone_number}: no user with this phone number") for line, _ in matches]
+        with transaction.atomic():
+            if ledger_enabled():
+                lock_accounts(credits)
+                LedgerEntry.objects.bulk_create(
+                    entry for user_id, credit in credits.items() for entry in opening_entries(user_id, credit)
+                )
+            elif credits:
+                # One statement per batch, with one CASE branch per distinct amount
+                by_amount = defaultdict(list)
+                for user_id, credit in credits.items():
+                    by_amount[credit].append(user_id)
+                User.objects.filter(pk__in=credits).update(
+                    solde=F("solde") + Case(
+                        *(When(pk__in=user_ids, then=Value(credit)) for credit, user_ids in by_amount.items()),
+                        output_field=DecimalField(max_digits=10, decimal_places=2),
+                    ),
+                    updated_at=timezone.now(),
+                )
+        self.counts["credited"] += len(credits)
+        self.counts["total"] += sum(credits.values())
+        self.seconds["credit"] += time.perf_counter() - started
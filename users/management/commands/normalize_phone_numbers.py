@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.validators import normalize_phone_numbers
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrite the stored phone numbers to E.164. Numbers that are not valid, or whose "
+        "E.164 form another user already has, are left as they are and listed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        rewritten, skipped = 0, []
+        last_pk = ""
+        while True:
+            rows = list(
+                User.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", "phone_number")[:options["batch_size"]]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            valid, invalid = normalize_phone_numbers(phone_number for _, phone_number in rows)
+            skipped += [f"{phone_number}: {error}" for phone_number, error in invalid.items()]
+            changes = {pk: valid[phone_number] for pk, phone_number in rows
+                       if phone_number in valid and valid[phone_number] != phone_number}
+            taken = set(User.objects.filter(phone_number__in=changes.values()).values_list("phone_number", flat=True))
+            with transaction.atomic():
+                for pk, e164 in changes.items():
+                    if e164 in taken:
+                        skipped.append(f"{e164} (user {pk}): already used by another user")
+                        continue
+                    taken.add(e164)
+                    if not options["dry_run"]:
+                        User.objects.filter(pk=pk).update(phone_number=e164)
+                    rewritten += 1
+
+        for line in skipped:
+            self.stdout.write(f"Skipped {line}")
+        verb = "Would rewrite" if options["dry_run"] else "Rewrote"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {rewritten} phone number(s), skipped {len(skipped)}"))
@@ -0,0 +1,105 @@
+import json
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: what a gunicorn worker does before serving
+# its first request (settings, apps, middleware, URLconf with every view).
+CHILD = """
+import json, os, resource, sys, time
+started = time.perf_counter()
+trace = sys.argv[2] == "trace"
+if trace:
+    import tracemalloc
+    tracemalloc.start()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "elkiss_project.settings")
+if sys.argv[1] == "asgi":
+    from django.core.asgi import get_asgi_application as get_application
+else:
+    from django.core.wsgi import get_wsgi_application as get_application
+get_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+report = {
+    "seconds": time.perf_counter() - started,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+}
+if trace:
+    roots = sorted((os.path.abspath(path) for path in sys.path if path), key=len, reverse=True)
+    memory = {}
+    for stat in tracemalloc.take_snapshot().statistics("filename"):
+        filename = os.path.abspath(stat.traceback[0].filename)
+        root = next((root for root in roots if filename.startswith(root + os.sep)), None)
+        package = filename[len(root) + 1:].split(os.sep)[0].removesuffix(".py") if root else "<other>"
+        memory[package] = memory.get(package, 0) + stat.size
+    report["memory"] = memory
+print("AUDIT " + json.dumps(report))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the cold start of a worker process: wall time and peak RSS to load the project "
+        "(settings, apps, middleware, URLconf), and per top-level package the import time "
+        "(python -X importtime) and the memory allocated while loading (tracemalloc)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--server", choices=["wsgi", "asgi"], default="wsgi")
+        parser.add_argument("--repeat", type=int, default=5, help="Cold starts timed; the median is reported")
+        parser.add_argument("--top", type=int, default=15)
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        runs = [self.child(options["server"]) for _ in range(options["repeat"])]
+        timed = self.child(options["server"], importtime=True)
+        traced = self.child(options["server"], trace=True)
+
+        import_ms = defaultdict(float)
+        for line in timed["stderr"].splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_us, _, name = line[len("import time:"):].split("|")
+            import_ms[name.strip().split(".")[0]] += int(self_us) / 1000
+
+        report = {
+            "server": options["server"],
+            "cold_start_ms": round(statistics.median(run["seconds"] for run in runs) * 1000, 1),
+            "rss_mb": round(statistics.median(run["rss_kb"] for run in runs) / 1024, 1),
+            "modules": runs[-1]["modules"],
+            "traced_mb": round(sum(traced["memory"].values()) / 2 ** 20, 1),
+            "packages": {
+                package: {"import_ms": round(import_ms.get(package, 0), 1),
+                          "memory_kb": round(traced["memory"].get(package, 0) / 1024)}
+                for package in sorted(
+                    set(import_ms) | set(traced["memory"]),
+                    key=lambda package: import_ms.get(package, 0), reverse=True,
+                )[:options["top"]]
+            },
+        }
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{report['server']}: cold start {report['cold_start_ms']} ms (median of {options['repeat']}), "
+            f"peak RSS {report['rss_mb']} MB, {report['modules']} modules, {report['traced_mb']} MB allocated"
+        )
+        self.stdout.write(f"{'package':<32} {'import ms':>10} {'memory KB':>10}")
+        for package, row in report["packages"].items():
+            self.stdout.write(f"{package:<32} {row['import_ms']:>10} {row['memory_kb']:>10}")
+
+    def child(self, server, importtime=False, trace=False):
+        flags = ["-X", "importtime"] if importtime else []
+        result = subprocess.run(
+            [sys.executable, *flags, "-c", CHILD, server, "trace" if trace else "-"],
+            capture_output=True, text=True,
+        )
+        for line in result.stdout.splitlines():
+            if line.startswith("AUDIT "):
+                return dict(json.loads(line[len("AUDIT "):]), stderr=result.stderr)
+        raise CommandError(f"loading the project failed:\n{result.stderr[-2000:]}")
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:34
+
+import elkiss_project.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_alter_customuser_solde'),
+        ('outbox', '0003_compact_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='id',
+            field=models.CharField(default=elkiss_project.ids.generate_id, editable=False, max_length=15, primary_key=True, serialize=False, unique=True),
+        ),
+    ]
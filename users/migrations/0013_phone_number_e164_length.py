@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_revocation_cache_table'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='phone_number',
+            field=models.CharField(max_length=16, unique=True),
+        ),
+    ]
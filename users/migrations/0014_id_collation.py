@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:22
+
+import elkiss_project.ids
+from django.db import migrations
+
+
+class AlterIdCollation(migrations.AlterField):
+    """
+    Compare ids byte by byte, so new ids sort after the legacy ones (see
+    elkiss_project.ids). PostgreSQL only: SQLite already does, and rebuilding
+    its tables would drop the fund-closed trigger.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_phone_number_e164_length'),
+    ]
+
+    operations = [
+        AlterIdCollation(
+            model_name='customuser',
+            name='id',
+            field=elkiss_project.ids.IdField(default=elkiss_project.ids.generate_id, editable=False, max_length=15, primary_key=True, serialize=False, unique=True),
+        ),
+    ]
@@ -1,19 +1,25 @@
-import pycountry
-import shortuuid
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
 
+from elkiss_project.ids import ID_LENGTH, IdField, generate_id
+
+
 def generate_short_uuid():
-    return shortuuid.ShortUUID().random(length=10)
+    # Only referenced by migration 0001: new ids come from elkiss_project.ids
+    return generate_id()
 
 
 class CustomUserManager(BaseUserManager):
-    def create_user(self, phone_number, password=None, **extra_fields):
+    def create_user(self, phone_number, password=None, encoded_password=None, **extra_fields):
+        # encoded_password: `password` already hashed, e.g. by amake_password in the hash pool
         if not phone_number:
             raise ValueError("The Phone Number field is required")
         extra_fields.setdefault("is_active", True)
         user = self.model(phone_number=phone_number, **extra_fields)
-        user.set_password(password)
+        if encoded_password is None:
+            user.set_password(password)
+        else:
+            user.password = encoded_password
         user.save(using=self._db)
         return user
 
@@ -24,14 +30,14 @@ class CustomUserManager(BaseUserManager):
         return self.create_user(phone_number, password, **extra_fields)
 
 class CustomUser(AbstractBaseUser, PermissionsMixin):
-    id = models.CharField(
-        max_length=10, 
+    id = IdField(
+        max_length=ID_LENGTH, 
         primary_key=True, 
-        default=generate_short_uuid, 
+        default=generate_id, 
         editable=False, 
         unique=True
     )
-    phone_number = models.CharField(max_length=15, unique=True)
+    phone_number = models.CharField(max_length=16, unique=True)  # "+" and up to 15 digits (E.164)
     name = models.CharField(max_length=255, blank=True, null=True)
     solde = models.DecimalField(max_digits=10, decimal_places=2,default=1000)
     is_active = models.BooleanField(default=True)
@@ -1,15 +1,32 @@
-import pycountry
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.contrib.auth.models import update_last_login
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 
+from elkiss_project.metrics import TimedSerializerMixin
+from ledger.services import get_balance
+from users.authentication import add_user_claims, start_session
 from users.models import CustomUser
+from users.validators import normalize_phone_number
 from django.core.exceptions import ValidationError
 
 User = get_user_model()
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class UserSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Public view of a user, used when an owner or donor is expanded."""
+
+    class Meta:
+        model = CustomUser
+        fields = ["id", "name"]
+
+
+REGISTERED = {"message": "User registered successfully!"}
+
+
+class RegisterSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=6)
     confirm_password = serializers.CharField(write_only=True, min_length=6)
 
@@ -17,6 +34,20 @@ class RegisterSerializer(serializers.ModelSerializer):
         model = CustomUser
         fields = ["id", "phone_number", "name", "password", "confirm_password"]
 
+    def to_internal_value(self, data):
+        # Normalize to E.164 before the field validators run, so the unique
+        # check sees the stored form. An optional "country" (ISO alpha-2)
+        # reads numbers written without their country prefix.
+        phone_number, country = data.get("phone_number"), data.get("country")
+        if isinstance(phone_number, str):
+            try:
+                phone_number = normalize_phone_number(phone_number, country if isinstance(country, str) else None)
+            except ValidationError as exc:
+                raise serializers.ValidationError(exc.message_dict)
+            data = data.copy()
+            data["phone_number"] = phone_number
+        return super().to_internal_value(data)
+
     def validate(self, data):
         if data["password"] != data["confirm_password"]:
             raise serializers.ValidationError({"confirm_password": "Passwords do not match."})
@@ -27,7 +58,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         # Create the user
         CustomUser.objects.create_user(**validated_data)
         # Return a custom dict
-        return {"message": "User registered successfully!"}
+        return dict(REGISTERED)
 
     def to_representation(self, instance):
         # If instance is a dict, return it directly.
@@ -37,20 +68,76 @@ class RegisterSerializer(serializers.ModelSerializer):
         return super().to_representation(instance)
 
 
-class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+class CustomTokenObtainPairSerializer(TimedSerializerMixin, TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Claims are copied from the refresh token into every access token it issues.
+        return add_user_claims(start_session(super().get_token(user)), user)
+
     def validate(self, attrs):
-        data = super().validate(attrs)  # Get the default token response
+        candidates = login_phone_numbers(attrs[self.username_field])
+        if len(candidates) > 1:
+            stored = set(User.objects.filter(phone_number__in=candidates).values_list("phone_number", flat=True))
+            attrs[self.username_field] = next((number for number in candidates if number in stored), candidates[0])
+        else:
+            attrs[self.username_field] = candidates[0]
+        # TokenObtainSerializer.validate authenticates self.user; login_response issues the tokens
+        super(TokenObtainPairSerializer, self).validate(attrs)
+        return login_response(self.user)
+
 
-        user = self.user  # Get the authenticated user
+def login_phone_numbers(phone_number):
+    """
+    Forms a phone number typed at login may be stored under, preferred
+    first. Users registered with a local spelling ("3000 0004") keep
+    logging in with it through its E.164 form. Numbers stored before
+    normalization ("30000004", "12") are found as typed when no user has
+    the E.164 form.
+    """
+    if not isinstance(phone_number, str):
+        return [phone_number]
+    try:
+        normalized = normalize_phone_number(phone_number)
+    except ValidationError:
+        return [phone_number]
+    return [normalized] if normalized == phone_number else [normalized, phone_number]
 
-        # Add custom user data to the response
-        data["access_token"] = data.pop("access")  # Rename "access" to "access_token"
-        data["refresh_token"] = data.pop("refresh")  # Rename "refresh" to "refresh_token"
-        data["user"] = {
+
+def login_response(user):
+    """Token pair and user summary returned by the login endpoints."""
+    refresh = CustomTokenObtainPairSerializer.get_token(user)
+    if api_settings.UPDATE_LAST_LOGIN:
+        update_last_login(None, user)
+    return {
+        "access_token": str(refresh.access_token),
+        "refresh_token": str(refresh),
+        "user": {
             "id": str(user.id),  # Ensure UUID is converted to string
             "name": user.name,
             "phoneNumber": user.phone_number,
-            "solde": getattr(user, "solde", 0.00)  # Default to 0.00 if solde doesn't exist
-        }
+            "solde": get_balance(user),
+        },
+    }
+
 
-        return data
\ No newline at end of file
+class CustomTokenRefreshSerializer(TimedSerializerMixin, TokenRefreshSerializer):
+    def validate(self, attrs):
+        # TokenRefreshSerializer.validate, loading the user once and refusing
+        # deleted users instead of failing on User.DoesNotExist
+        refresh = self.token_class(attrs["refresh"])
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.payload.get(api_settings.USER_ID_CLAIM)}
+        ).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        # Re-read the claims, so a change of is_staff applies from the next refresh.
+        data = {"access": str(add_user_claims(refresh.access_token, user))}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION and hasattr(refresh, "blacklist"):
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+        return data
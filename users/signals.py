@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .authentication import revoke_user_tokens
+from .models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+def revoke_deactivated_user_tokens(sender, instance, created, **kwargs):
+    # Access tokens carry is_active, so deactivating (admin or API) must revoke them.
+    if not created and not instance.is_active:
+        revoke_user_tokens(instance.pk)
@@ -1,3 +1,412 @@
-from django.test import TestCase
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from elkiss_project.ids import generate_id
+from elkiss_project.testing import make_fund
+from ledger.services import get_balance
+from .authentication import (
+    REVOCATIONS_KEY, SESSION_CLAIM, ClaimsUser, _cache, revocations, revoke_session, revoke_user_tokens,
+)
+from .checks import check_revocation_cache
+from .hashers import hashers_for
+from .management.commands.import_users import Command as ImportUsersCommand
+from .models import CustomUser
+from .validators import normalize_phone_numbers
+
+
+@override_settings(FUND_CACHE_TIMEOUT=0)
+class StatelessJWTTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        revocations.reset()
+        _cache().clear()
+        self.user = CustomUser.objects.create_user(phone_number="+22230000001", password="secret1")
+        self.fund = make_fund(self.user)
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post(
+            reverse("token_obtain_pair"), {"phone_number": "+22230000001", "password": "secret1"}, format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def get(self, url, access):
+        return self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def count_queries(self, url, access):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(url, access).status_code, 200)
+        return len(queries)
+
+    def test_access_token_carries_claims(self):
+        token = AccessToken(self.login()["access_token"])
+
+        self.assertIs(token["is_active"], True)
+        self.assertIs(token["is_staff"], False)
+
+    @override_settings(AUTH_REVOCATION_POLL_SECONDS=60)
+    def test_claims_token_skips_the_user_query(self):
+        access = self.login()["access_token"]
+        legacy = AccessToken.for_user(self.user)  # no claims: authenticated from the database
+        self.get(reverse("cagnotte-list-create"), access)  # polls the database cache for revocations
+
+        for url in (reverse("cagnotte-list-create"), reverse("cagnotte-detail", args=[self.fund.pk])):
+            self.assertEqual(self.count_queries(url, access), self.count_queries(url, legacy) - 1)
+
+    @override_settings(AUTH_REVOCATION_POLL_SECONDS=60)
+    def test_revocations_in_force_cost_no_query(self):
+        access = self.login()["access_token"]
+        url = reverse("cagnotte-list-create")
+        self.get(url, access)
+        baseline = self.count_queries(url, access)
+        other = CustomUser.objects.create_user(phone_number="+22230000009", password="secret9")
+        revoke_user_tokens(other.pk)
+        revoke_session("another-session")
+
+        self.assertEqual(self.count_queries(url, access), baseline)
+
+    def test_full_user_is_loaded_lazily(self):
+        user = ClaimsUser(AccessToken(self.login()["access_token"]))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(user.solde, self.user.solde)
+            self.assertEqual(user.phone_number, "+22230000001")
+        self.assertFalse(user.is_staff)
+
+    def test_donation_with_claims_token(self):
+        access = self.login()["access_token"]
+        response = self.client.post(
+            reverse("donate"), {"cagnotte_id": self.fund.pk, "amount": "10.00"},
+            format="json", HTTP_AUTHORIZATION=f"Bearer {access}",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.solde, Decimal("989.90"))
+
+    def test_logout_revokes_the_session_only(self):
+        tokens, other_device = self.login(), self.login()
+        refreshed = self.client.post(reverse("token_refresh"), {"refresh": tokens["refresh_token"]}, format="json")
+        self.assertEqual(AccessToken(refreshed.data["access"])[SESSION_CLAIM],
+                         AccessToken(tokens["access_token"])[SESSION_CLAIM])
+
+        response = self.client.post(
+            reverse("logout"), {"refresh_token": refreshed.data["refresh"]},
+            format="json", HTTP_AUTHORIZATION=f"Bearer {tokens['access_token']}",
+        )
+        self.assertEqual(response.status_code, 205)
+
+        url = reverse("cagnotte-list-create")
+        self.assertEqual(self.get(url, tokens["access_token"]).status_code, 401)
+        self.assertEqual(self.get(url, refreshed.data["access"]).status_code, 401)
+        self.assertEqual(self.get(url, other_device["access_token"]).status_code, 200)
+        self.assertEqual(self.get(url, self.login()["access_token"]).status_code, 200)
+
+    def test_deactivation_revokes_access_tokens(self):
+        access = AccessToken(self.login()["access_token"])
+        access["iat"] -= 1
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.get(reverse("cagnotte-list-create"), access).status_code, 401)
+
+    def test_revocation_by_another_worker_is_seen_within_the_poll_interval(self):
+        access = AccessToken(self.login()["access_token"])
+        access["iat"] -= 1
+        url = reverse("cagnotte-list-create")
+        with override_settings(AUTH_REVOCATION_POLL_SECONDS=60):
+            self.assertEqual(self.get(url, access).status_code, 200)
+            # What revoke_session() writes, from another process
+            _cache().set(REVOCATIONS_KEY, {f"session:{access[SESSION_CLAIM]}": access["iat"]})
+            self.assertEqual(self.get(url, access).status_code, 200)
+        with override_settings(AUTH_REVOCATION_POLL_SECONDS=0):
+            self.assertEqual(self.get(url, access).status_code, 401)
+
+    def test_revocation_cache_is_shared_between_processes(self):
+        self.assertEqual(check_revocation_cache(None), [])
+        with self.settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+                           AUTH_REVOCATION_CACHE_ALIAS="default"):
+            self.assertEqual([error.id for error in check_revocation_cache(None)], ["users.E002"])
+        with self.settings(AUTH_REVOCATION_CACHE_ALIAS="missing"):
+            self.assertEqual([error.id for error in check_revocation_cache(None)], ["users.E001"])
+
+    def test_refresh_reads_current_claims(self):
+        refresh = self.login()["refresh_token"]
+        CustomUser.objects.filter(pk=self.user.pk).update(is_staff=True)
+
+        response = self.client.post(reverse("token_refresh"), {"refresh": refresh}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(AccessToken(response.data["access"])["is_staff"], True)
+        self.assertEqual(self.get(reverse("cagnotte-cache-stats"), response.data["access"]).status_code, 200)
+
+    def test_refresh_loads_the_user_once(self):
+        refresh = self.login()["refresh_token"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("token_refresh"), {"refresh": refresh}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        user_queries = [query["sql"] for query in queries if 'FROM "users_customuser"' in query["sql"]]
+        self.assertEqual(len(user_queries), 1)
+
+    def test_refresh_of_a_deleted_or_inactive_user_is_refused(self):
+        refresh = self.login()["refresh_token"]
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post(reverse("token_refresh"), {"refresh": refresh}, format="json")
+        self.assertEqual((response.status_code, response.data["detail"].code), (401, "no_active_account"))
+
+        CustomUser.objects.filter(pk=self.user.pk).delete()
+        response = self.client.post(reverse("token_refresh"), {"refresh": refresh}, format="json")
+        self.assertEqual((response.status_code, response.data["detail"].code), (401, "no_active_account"))
+
+
+FAST_HASHING = dict(PASSWORD_PBKDF2_ITERATIONS=1000, PASSWORD_SCRYPT_WORK_FACTOR=2 ** 8)
+
+
+@override_settings(**FAST_HASHING)
+class PasswordPolicyTests(TestCase):
+    def setUp(self):
+        with override_settings(PASSWORD_HASHERS=hashers_for("pbkdf2")):
+            self.user = CustomUser.objects.create_user(phone_number="+22230000002", password="secret2")
+        self.credentials = {"phone_number": "+22230000002", "password": "secret2"}
+
+    def password(self):
+        self.user.refresh_from_db()
+        return self.user.password
+
+    @override_settings(PASSWORD_HASHERS=hashers_for("scrypt"))
+    def test_login_rehashes_with_the_policy(self):
+        response = self.client.post(reverse("token_obtain_pair"), self.credentials, content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.password().startswith("scrypt$"))
+        self.assertTrue(self.user.check_password("secret2"))
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1200)
+    def test_cost_change_rehashes(self):
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+        response = self.client.post(reverse("token_obtain_pair"), self.credentials, content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.password().startswith("pbkdf2_sha256$1200$"))
+
+    @override_settings(PASSWORD_HASHERS=hashers_for("scrypt"))
+    async def test_async_login_matches_sync_login(self):
+        response = await self.async_client.post(
+            reverse("async-login"), self.credentials, content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(set(payload), {"access_token", "refresh_token", "user"})
+        self.assertEqual(payload["user"]["phoneNumber"], "+22230000002")
+        await self.user.arefresh_from_db()
+        self.assertTrue(self.user.password.startswith("scrypt$"))
+
+    async def test_async_login_rejects_bad_credentials(self):
+        for phone_number, password in (("+22230000002", "wrong"), ("+22239999999", "secret2")):
+            response = await self.async_client.post(
+                reverse("async-login"), {"phone_number": phone_number, "password": password},
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 401)
+
+    async def test_async_register(self):
+        with mock.patch.object(
+            CustomUser.objects, "create_user", wraps=CustomUser.objects.create_user
+        ) as create_user:
+            response = await self.async_client.post(
+                reverse("async-register"),
+                {"phone_number": "+22230000003", "password": "secret3", "confirm_password": "secret3"},
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"message": "User registered successfully!"})
+        create_user.assert_called_once()
+        user = await CustomUser.objects.aget(phone_number="+22230000003")
+        self.assertTrue(await user.acheck_password("secret3"))
+
+        duplicate = await self.async_client.post(
+            reverse("async-register"),
+            {"phone_number": "+22230000003", "password": "secret3", "confirm_password": "secret3"},
+            content_type="application/json",
+        )
+        self.assertEqual(duplicate.status_code, 400)
+
+
+class PhoneNumberTests(TestCase):
+    def register(self, phone_number, **extra):
+        payload = {"phone_number": phone_number, "password": "secret4", "confirm_password": "secret4", **extra}
+        return self.client.post(reverse("register"), payload, content_type="application/json")
+
+    def test_register_stores_e164(self):
+        self.assertEqual(self.register("3000 0004").status_code, 201)
+        self.assertTrue(CustomUser.objects.filter(phone_number="+22230000004").exists())
+
+        # Another spelling of the same line is caught by the unique check
+        response = self.register("+222 30-00-00-04")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("phone_number", response.json())
+
+    def test_longest_e164_numbers_fit(self):
+        self.assertEqual(self.register("+911861123456789").status_code, 201)
+        self.assertTrue(CustomUser.objects.filter(phone_number="+911861123456789").exists())
+
+    def test_register_with_country(self):
+        self.assertEqual(self.register("06 12 34 56 78", country="FR").status_code, 201)
+        self.assertTrue(CustomUser.objects.filter(phone_number="+33612345678").exists())
+
+    def test_register_rejects_invalid_numbers(self):
+        for phone_number, extra in (("12", {}), ("+22250000001", {}), ("30000004", {"country": "ZZ"})):
+            response = self.register(phone_number, **extra)
+            self.assertEqual(response.status_code, 400, phone_number)
+        self.assertFalse(CustomUser.objects.exists())
+
+    @override_settings(**FAST_HASHING)
+    def test_login_with_the_registered_spelling(self):
+        self.assertEqual(self.register("3000 0004").status_code, 201)
+        # A number stored before normalization, which does not parse, is looked up as typed
+        CustomUser.objects.create_user(phone_number="12", password="secret4")
+
+        for phone_number in ("3000 0004", "30000004", "+22230000004", "12"):
+            credentials = {"phone_number": phone_number, "password": "secret4"}
+            response = self.client.post(reverse("token_obtain_pair"), credentials, content_type="application/json")
+            self.assertEqual(response.status_code, 200, phone_number)
+        wrong = {"phone_number": "3000 0004", "password": "wrong"}
+        response = self.client.post(reverse("token_obtain_pair"), wrong, content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(**FAST_HASHING)
+    async def test_async_login_with_the_registered_spelling(self):
+        await sync_to_async(CustomUser.objects.create_user)(phone_number="+22230000004", password="secret4")
+
+        response = await self.async_client.post(
+            reverse("async-login"), {"phone_number": "3000 0004", "password": "secret4"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["phoneNumber"], "+22230000004")
+
+    @override_settings(**FAST_HASHING)
+    def test_login_with_a_number_stored_before_normalization(self):
+        # Both parse, but the users were stored as typed: found when their E.164 form is not
+        for phone_number in ("30000004", "22230000005"):
+            CustomUser.objects.create_user(phone_number=phone_number, password="secret4")
+            credentials = {"phone_number": phone_number, "password": "secret4"}
+            for url in (reverse("token_obtain_pair"), reverse("async-login")):
+                response = self.client.post(url, credentials, content_type="application/json")
+                self.assertEqual(response.status_code, 200, (url, phone_number))
+
+        # The E.164 form wins when both are stored
+        CustomUser.objects.create_user(phone_number="+22230000004", password="other")
+        credentials = {"phone_number": "30000004", "password": "other"}
+        for url in (reverse("token_obtain_pair"), reverse("async-login")):
+            response = self.client.post(url, credentials, content_type="application/json")
+            self.assertEqual(response.json()["user"]["phoneNumber"], "+22230000004")
+
+    def test_batch_normalization(self):
+        valid, invalid = normalize_phone_numbers(["30000005", "+22230000005", "nope", "30000005"])
+
+        self.assertEqual(valid, {"30000005": "+22230000005", "+22230000005": "+22230000005"})
+        self.assertEqual(list(invalid), ["nope"])
+
+
+@override_settings(**FAST_HASHING)
+class ImportUsersTests(TestCase):
+    def setUp(self):
+        CustomUser.objects.create_user(phone_number="+22230000006", password="secret6")
+
+    def run_import(self, content, suffix=".csv", **options):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, "w") as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+        out = StringIO()
+        self.command = ImportUsersCommand()
+        call_command(self.command, path, workers=1, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_creates_users(self):
+        out = self.run_import(
+            "phone_number,name,password,solde\n"
+            "30000007,Aicha,secret7,250\n"
+            "+222 30 00 00 08,,,\n"
+            "+22230000007,Again,,\n"
+            "30000006,Known,,\n"
+            "12,Invalid,,\n"
+            "30000009,Short,123,\n"
+        )
+
+        self.assertIn("Created 2 user(s), skipped 1 already registered, rejected 3 row(s)", out)
+        self.assertIn("Rejected line 4: +22230000007: duplicate of line 2", out)
+        self.assertIn("Rejected line 6: 12: Invalid phone number format for the selected country.", out)
+        self.assertIn("Rejected line 7: password must have at least 6 characters", out)
+        aicha = CustomUser.objects.get(phone_number="+22230000007")
+        self.assertEqual((aicha.name, aicha.solde), ("Aicha", Decimal("250")))
+        self.assertTrue(aicha.check_password("secret7"))
+        self.assertFalse(CustomUser.objects.get(phone_number="+22230000008").has_usable_password())
+
+    def test_import_longest_e164_numbers(self):
+        out = self.run_import("phone_number\n+911861123456789\n")
+
+        self.assertIn("Created 1 user(s)", out)
+        self.assertTrue(CustomUser.objects.filter(phone_number="+911861123456789").exists())
+
+    def test_top_up_credits_balances(self):
+        self.run_import("phone_number\n30000007\n30000008\n")
+        out = self.run_import(
+            '{"phone_number": "30000006", "amount": "10.50"}\n'
+            '{"phone_number": "+22230000007", "amount": 25}\n'
+            '{"phone_number": "30000006", "amount": "4.50"}\n'
+            '{"phone_number": "30000009", "amount": "1"}\n'
+            '{"phone_number": "30000008", "amount": "-5"}\n',
+            suffix=".ndjson", top_up=True,
+        )
+
+        self.assertIn("Credited 2 user(s) with 40.00, rejected 2 row(s)", out)
+        self.assertIsNone(self.command.pool)
+        self.assertIn("Rejected line 4: +22230000009: no user with this phone number", out)
+        balances = dict(CustomUser.objects.values_list("phone_number", "solde"))
+        self.assertEqual(balances, {
+            "+22230000006": Decimal("1015.00"), "+22230000007": Decimal("1025.00"), "+22230000008": Decimal("1000.00"),
+        })
+
+    def test_id_collisions_are_retried_then_rejected(self):
+        taken = CustomUser.objects.get(phone_number="+22230000006").pk
+        ids = iter([taken])
+        with mock.patch.object(CustomUser._meta.pk, "_get_default", lambda: next(ids, None) or generate_id()):
+            out = self.run_import("phone_number\n30000007\n")
+        self.assertIn("Created 1 user(s), skipped 0 already registered, rejected 0 row(s)", out)
+        self.assertNotEqual(CustomUser.objects.get(phone_number="+22230000007").pk, taken)
+
+        with mock.patch.object(CustomUser._meta.pk, "_get_default", lambda: taken), \
+                mock.patch("users.management.commands.import_users.generate_id", lambda: taken):
+            out = self.run_import("phone_number\n30000008\n")
+        self.assertIn("Created 0 user(s), skipped 0 already registered, rejected 1 row(s)", out)
+        self.assertIn("Rejected line 2: +22230000008: no free id after 3 attempts", out)
+        self.assertFalse(CustomUser.objects.filter(phone_number="+22230000008").exists())
+
+    @override_settings(BALANCE_BACKEND="ledger")
+    def test_ledger_backend(self):
+        self.run_import("phone_number,solde\n30000007,300\n")
+        self.run_import("phone_number,amount\n30000007,20\n", top_up=True)
+
+        user = CustomUser.objects.get(phone_number="+22230000007")
+        self.assertEqual(get_balance(user), Decimal("320"))
+        self.assertEqual(user.solde, Decimal("300"))  # the column is no longer maintained
\ No newline at end of file
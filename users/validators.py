@@ -1,24 +1,100 @@
-import phonenumbers
+"""
+Phone number validation and normalization.
+
+Phone numbers are stored in E.164 ("+22230000001"), so that the unique
+index on CustomUser.phone_number sees a single spelling per line. Numbers
+without a country prefix are read in PHONE_DEFAULT_REGION, or the country
+given.
+
+Parsing with phonenumbers is the costly part. Its results are kept in an
+LRU cache, since registrations and imports see the same numbers again
+(retries, duplicates), and the countries are looked up in a dict built
+once instead of through pycountry on every call.
+
+Both libraries are imported on first use rather than with this module:
+the URLconf imports it through the serializers, and a worker would
+otherwise load phonenumbers' metadata before it sees any phone number.
+"""
+from functools import lru_cache
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
-import pycountry
 
-def validate_phone_number(phone_number, country_code):
-    """Validate phone number using phonenumbers package based on country ISO code."""
-    if not country_code:
-        raise ValidationError({"country": "Country selection is required."})
+PARSE_CACHE_SIZE = 8192
+
+INVALID_COUNTRY = "Invalid country code."
+INVALID_NUMBER = "Invalid phone number format."
+INVALID_FOR_COUNTRY = "Invalid phone number format for the selected country."
 
-    try:
-        # Ensure the country exists
-        if not pycountry.countries.get(alpha_2=country_code.upper()):
-            raise ValidationError({"country": "Invalid country code."})
 
-        # Parse and validate the phone number
-        parsed_number = phonenumbers.parse(phone_number, country_code.upper())
+@lru_cache(maxsize=None)
+def calling_codes():
+    """Country calling code of every ISO alpha-2 country phonenumbers knows."""
+    import phonenumbers
+    import pycountry
 
-        if not phonenumbers.is_valid_number(parsed_number):
-            raise ValidationError({"phone_number": "Invalid phone number format for the selected country."})
+    countries = {country.alpha_2 for country in pycountry.countries}
+    return {
+        region: phonenumbers.country_code_for_region(region)
+        for region in phonenumbers.SUPPORTED_REGIONS
+        if region in countries
+    }
 
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(phone_number, region):
+    # (E.164, None) or (None, error): exceptions would not be cached
+    import phonenumbers
+
+    try:
+        parsed = phonenumbers.parse(phone_number, region)
     except phonenumbers.NumberParseException:
-        raise ValidationError({"phone_number": "Invalid phone number format."})
+        return None, INVALID_NUMBER
+    if not phonenumbers.is_valid_number(parsed):
+        return None, INVALID_FOR_COUNTRY
+    return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164), None
 
+
+def _region(country_code):
+    region = (country_code or getattr(settings, "PHONE_DEFAULT_REGION", "MR")).upper()
+    if region not in calling_codes():
+        raise ValidationError({"country": INVALID_COUNTRY})
+    return region
+
+
+def _normalize(phone_number, region):
+    phone_number = phone_number.strip()
+    # The region does not matter for international numbers: share their cache entries
+    return _parse(phone_number, None if phone_number.startswith("+") else region)
+
+
+def normalize_phone_number(phone_number, country_code=None):
+    """E.164 form of `phone_number`; raises ValidationError if it is not a valid number."""
+    e164, error = _normalize(phone_number, _region(country_code))
+    if error:
+        raise ValidationError({"phone_number": error})
+    return e164
+
+
+def normalize_phone_numbers(phone_numbers, country_code=None):
+    """
+    Batch form of normalize_phone_number, for imports: returns
+    ({number: E.164}, {number: error}) over the distinct numbers given.
+    """
+    region = _region(country_code)
+    valid, invalid = {}, {}
+    for phone_number in dict.fromkeys(phone_numbers):
+        e164, error = _normalize(phone_number, region)
+        if error:
+            invalid[phone_number] = error
+        else:
+            valid[phone_number] = e164
+    return valid, invalid
+
+
+def validate_phone_number(phone_number, country_code):
+    """Validate phone number using phonenumbers package based on country ISO code."""
+    if not country_code:
+        raise ValidationError({"country": "Country selection is required."})
+    normalize_phone_number(phone_number, country_code)
     return phone_number
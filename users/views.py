@@ -1,21 +1,23 @@
-import pycountry
 from rest_framework import generics, status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
 
-from .serializers import CustomTokenObtainPairSerializer, RegisterSerializer
+from idempotency.mixins import IdempotentMixin
+from .authentication import SESSION_CLAIM, revoke_session
+from .serializers import CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer, RegisterSerializer
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 
 User = get_user_model()
 
-class RegisterView(generics.CreateAPIView):
+class RegisterView(IdempotentMixin, generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = [AllowAny]
     serializer_class = RegisterSerializer
+    idempotency_scope = "register"
 
 class LogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -28,6 +30,8 @@ class LogoutView(APIView):
             
             token = RefreshToken(refresh_token)
             token.blacklist()  # Blacklist the refresh token
+            if SESSION_CLAIM in token:
+                revoke_session(token[SESSION_CLAIM])  # and the access tokens it issued, on this device only
 
             return Response({"message": "Logout successful"}, status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
@@ -37,3 +41,7 @@ class LogoutView(APIView):
 # Custom Login View
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+
+
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer